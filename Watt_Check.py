@@ -1,17 +1,23 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-import pytz
-import hashlib
-import secrets
 import time
 import os
-import sqlite3
 import logging
-import threading
-import json
-from decimal import Decimal, getcontext
-from contextlib import contextmanager
+import copy
+from decimal import getcontext
+from streamlit.errors import StreamlitAPIException
+from wattcheck import admin, imports, metriques
+from wattcheck.backup import SauvegardeAuto, instantanes, restaurer
+from wattcheck.config import BACKUP_DIR, DB_FILE, EXPORT_DIR, FUSEAU, METRIQUES_FILE
+from wattcheck.core import (DUREES_LICENCE, MAX_LOT_LICENCES, act_licence, ajouter_appareil, change_password, charger_utilisateur, check_pro_status, create_user,
+                            db_lecture, etat_recharges, gen_licences, get_pool, initialiser, lire_historique, login_user,
+                            maj_heures_appareils, recharger, ref_token, supprimer_appareil, synthese_mensuelle, update_profile)
+from wattcheck.export import FORMATS, Exports
+from wattcheck.retention import periode
+from wattcheck.simulation import grille_facteurs, simuler
+from wattcheck.tarifs import determiner_cat
 
 # --- 0. CONFIGURATION SYSTÈME & BRANDING ---
 VERSION = "v1.1" # Version Sauvegarde
@@ -27,10 +33,16 @@ st.set_page_config(
 
 logging.getLogger('streamlit').setLevel(logging.ERROR)
 getcontext().prec = 28
-FUSEAU = pytz.timezone('Africa/Douala')
-DB_FILE = 'watt_check_saas.db'
-SALT_FILE = ".watt_salt"
-DB_LOCK = threading.Lock()
+T_RERUN = time.perf_counter()
+
+def section(nom): return metriques.chrono("wattcheck_page_secondes", section=nom)
+
+def fin_rerun(): metriques.observer("wattcheck_page_secondes", time.perf_counter() - T_RERUN, section="rerun")
+
+def relancer_fragment():
+    # Rerun du seul fragment appelant ; rerun complet si on n'est pas dans un rerun de fragment (1er rendu, AppTest)
+    try: st.rerun(scope="fragment")
+    except StreamlitAPIException: st.rerun()
 
 # --- 1. DESIGN SYSTEM (CORRECTIF LISIBILITÉ HYBRIDE) ---
 @st.cache_resource
@@ -91,102 +103,32 @@ def load_css():
     """
 st.markdown(load_css(), unsafe_allow_html=True)
 
-# --- 2. FONCTIONS SYSTÈME (SECU & DB) ---
-def get_salt():
-    if not os.path.exists(SALT_FILE):
-        with open(SALT_FILE, "w") as f: f.write(secrets.token_hex(32))
-    with open(SALT_FILE, "r") as f: return f.read().strip()
-SALT = get_salt()
-
-def hash_pass(password): return hashlib.sha256(f"{SALT}{password}".encode()).hexdigest()
-
-@contextmanager
-def db_connection():
-    with DB_LOCK:
-        conn = sqlite3.connect(DB_FILE, timeout=30.0, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL")
-        try: yield conn
-        except Exception as e: conn.rollback(); raise e
-        finally: conn.close()
+# --- 2. RESSOURCES DU PROCESSUS (logique métier : wattcheck.core) ---
+@st.cache_resource
+def get_sauvegardes():
+    # Un instantané toutes les 6 h, 14 conservés (≈ 3,5 jours)
+    s = SauvegardeAuto(DB_FILE, BACKUP_DIR, intervalle=6 * 3600, garder=14); s.start()
+    return s
+
+@st.cache_resource
+def get_exports(): return Exports(get_pool(), EXPORT_DIR)
+
+@st.cache_resource
+def get_metriques():
+    # Fichier Prometheus pour le textfile collector, si WATTCHECK_METRIQUES est défini
+    if not METRIQUES_FILE: return None
+    e = metriques.Exportateur(METRIQUES_FILE); e.start()
+    return e
 
 @st.cache_resource
-def init_schema():
-    with db_connection() as conn:
-        conn.execute('''CREATE TABLE IF NOT EXISTS users 
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                      username TEXT UNIQUE, password TEXT, 
-                      first_name TEXT, last_name TEXT, phone TEXT, meter_number TEXT,
-                      is_pro BOOLEAN DEFAULT 0, is_admin BOOLEAN DEFAULT 0, 
-                      pro_expiration_date TEXT, created_at TEXT)''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS profils (user_id INTEGER PRIMARY KEY, budget REAL, conso_jour REAL, label TEXT, config_json TEXT)''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS etats_mensuels (user_id INTEGER, mois TEXT, cumul REAL, PRIMARY KEY (user_id, mois))''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS historique (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, date TEXT, montant REAL, kwh REAL, token_ref TEXT, cumul_apres REAL)''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS licences (code TEXT PRIMARY KEY, created_by INTEGER, used_by INTEGER, created_at TEXT, used_at TEXT, duree_jours INTEGER DEFAULT 365)''')
-
-def create_admin():
-    h_pass = hash_pass("admin123")
-    with db_connection() as conn:
-        if not conn.execute("SELECT 1 FROM users WHERE username='admin'").fetchone():
-            conn.execute("INSERT INTO users (username, password, is_pro, is_admin, created_at) VALUES (?, ?, 1, 1, ?)", ("admin", h_pass, datetime.now().isoformat()))
-            conn.commit()
-
-init_schema(); create_admin()
-
-# --- 3. LOGIQUE MÉTIER ---
-def login_user(u, p):
-    h = hash_pass(p)
-    with db_connection() as conn: return conn.execute("SELECT * FROM users WHERE username=? AND password=?", (u, h)).fetchone()
-
-def create_user(u, p):
-    h = hash_pass(p)
-    try:
-        with db_connection() as conn:
-            conn.execute("INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)", (u, h, datetime.now().isoformat()))
-            conn.commit(); return True
-    except: return False
-
-def update_profile(uid, fname, lname, phone, meter):
-    with db_connection() as conn:
-        conn.execute("UPDATE users SET first_name=?, last_name=?, phone=?, meter_number=? WHERE id=?", 
-                  (fname, lname, phone, meter, uid))
-        conn.commit()
-    return True
-
-def change_password(uid, old_p, new_p):
-    h_old = hash_pass(old_p)
-    with db_connection() as conn:
-        user = conn.execute("SELECT * FROM users WHERE id=? AND password=?", (uid, h_old)).fetchone()
-        if user:
-            h_new = hash_pass(new_p)
-            conn.execute("UPDATE users SET password=? WHERE id=?", (h_new, uid))
-            conn.commit()
-            return True
-    return False
-
-def check_pro_status(user):
-    if not user['is_pro']: return False, None
-    if user['is_admin'] or not user['pro_expiration_date']: return True, "Illimité"
-    exp = datetime.fromisoformat(user['pro_expiration_date'])
-    if datetime.now(FUSEAU).replace(tzinfo=None) > exp.replace(tzinfo=None): return False, "Expiré"
-    return True, exp.strftime("%d/%m/%Y")
-
-def act_licence(uid, code):
-    with db_connection() as conn:
-        row = conn.execute("SELECT * FROM licences WHERE code=? AND used_by IS NULL", (code,)).fetchone()
-        if row:
-            fin = datetime.now(FUSEAU) + timedelta(days=row['duree_jours'])
-            conn.execute("UPDATE licences SET used_by=?, used_at=? WHERE code=?", (uid, datetime.now().isoformat(), code))
-            conn.execute("UPDATE users SET is_pro=1, pro_expiration_date=? WHERE id=?", (fin.isoformat(), uid))
-            conn.commit(); return True, fin.strftime("%d/%m/%Y")
-        return False, None
-
-def gen_licence(admin_id, j=365):
-    code = f"PRO-{datetime.now().year}-{secrets.token_hex(4).upper()}"
-    with db_connection() as conn:
-        conn.execute("INSERT INTO licences (code, created_by, created_at, duree_jours) VALUES (?, ?, ?, ?)", (code, admin_id, datetime.now().isoformat(), j))
-        conn.commit(); return code
+def demarrer(): initialiser()
 
+demarrer(); get_metriques()
+# Sauvegardes par fichier : selon le pool (SQLite oui, PostgreSQL non : pg_dump côté serveur)
+SAUVEGARDES = get_pool().sauvegardes_fichier
+if SAUVEGARDES: get_sauvegardes()
+
+# --- 3. CATALOGUE ---
 @st.cache_data
 def get_catalogue_pareto():
     return {
@@ -196,41 +138,60 @@ def get_catalogue_pareto():
         "MAISON": {"Fer à repasser": 1200, "Mixeur": 350, "Micro-ondes": 1000, "Chauffe-eau": 2000, "Machine laver": 500}
     }
 
-def get_coeff_simultaneite(p):
-    if p < 3000: return 0.8
-    if p < 6000: return 0.7
-    if p < 12000: return 0.6
-    return 0.5
+# --- CACHE DE SESSION (USER, PROFIL, CUMUL) ---
+CACHE_TTL = 300  # secondes : user, profil, inventaire (écrits surtout par cette session, qui invalide)
+CACHE_TTL_RECHARGES = 10  # cumul et dernière recharge : aussi écrits par l'API et les autres appareils
 
-@st.cache_data
-def get_tranches_decimal():
-    return {
-        "0-110": [(Decimal('0'), Decimal('110'), Decimal('50'), False), (Decimal('110'), Decimal('220'), Decimal('94'), False), (Decimal('220'), Decimal('Infinity'), Decimal('94'), True)],
-        "111-220": [(Decimal('0'), Decimal('220'), Decimal('79'), False), (Decimal('220'), Decimal('400'), Decimal('79'), True), (Decimal('400'), Decimal('Infinity'), Decimal('99'), True)],
-        "221-400": [(Decimal('0'), Decimal('220'), Decimal('79'), True), (Decimal('220'), Decimal('400'), Decimal('79'), True), (Decimal('400'), Decimal('Infinity'), Decimal('99'), True)],
-        "401+": [(Decimal('0'), Decimal('220'), Decimal('94'), True), (Decimal('220'), Decimal('800'), Decimal('94'), True), (Decimal('800'), Decimal('Infinity'), Decimal('99'), True)]
-    }
+def charger_donnees(uid):
+    mois = datetime.now(FUSEAU).strftime("%Y-%m")
+    c = st.session_state.get('_donnees'); now = time.monotonic()
+    if c and c['uid'] == uid and c['mois'] == mois and now - c['t'] < CACHE_TTL:
+        if now - c['t_recharges'] >= CACHE_TTL_RECHARGES: c.update(etat_recharges(uid, mois)); c['t_recharges'] = now
+        return c
+    c = charger_utilisateur(uid, mois); c['t'] = c['t_recharges'] = now
+    st.session_state._donnees = c
+    return c
+
+def invalider_donnees(): st.session_state.pop('_donnees', None)
+
+EXPORT_ACTIF = ("en attente", "en cours")
 
-def determiner_cat(cj):
-    k = cj * 30
-    if k <= 110: return "0-110"
-    elif k <= 220: return "111-220"
-    elif k <= 400: return "221-400"
-    else: return "401+"
-
-def calcul_kwh(m, c, cat):
-    if m <= 0: return Decimal('0'), False, Decimal('0')
-    arg = Decimal(str(m)); k_tot = Decimal('0'); tva = False; curs = Decimal(str(c)); p_u = Decimal('0')
-    for bi, bs, px, at in get_tranches_decimal().get(cat):
-        if arg < 0.1: break
-        if curs >= bs: continue
-        esp = bs - max(curs, bi); tx = Decimal('1.1925') if at else Decimal('1')
-        ck = px * tx; p_u = ck; 
-        if at: tva = True
-        ct = esp * ck
-        if arg >= ct: k_tot += esp; arg -= ct; curs += esp
-        else: k_tot += arg / ck; arg = 0; break
-    return k_tot, tva, p_u
+def afficher_export(cle, t):
+    if t['etat'] in EXPORT_ACTIF: st.info(f"⏳ Export {t['fmt'].upper()} {t['etat']} : {t['lignes']:,} lignes...")
+    elif t['etat'] == "échec": st.error(f"Export en échec : {t['erreur']}")
+    else:
+        def contenu(chemin=t['chemin']):
+            with open(chemin, "rb") as f: return f.read()
+        st.download_button(f"📥 Télécharger {t['nom']} ({t['lignes']:,} lignes)", data=contenu, file_name=t['nom'], mime=FORMATS[t['fmt']], key=f"{cle}_dl")
+
+@st.fragment(run_every=2)
+def suivi_export(cle):
+    # Rendu seulement pendant l'export : à la fin, une relance de la page passe à l'affichage statique
+    t = get_exports().tache(st.session_state.get(cle))
+    if not t or t['etat'] not in EXPORT_ACTIF: st.rerun()
+    afficher_export(cle, t)
+
+def lancer_export(cle, uid, prefixe):
+    c1, c2 = st.columns([1, 2])
+    fmt = c1.selectbox("Format", list(FORMATS), format_func=str.upper, key=f"{cle}_fmt", label_visibility="collapsed")
+    if c2.button("📤 Préparer l'export", key=f"{cle}_go"): st.session_state[cle] = get_exports().soumettre(fmt, uid, prefixe)
+    t = get_exports().tache(st.session_state[cle]) if st.session_state.get(cle) else None
+    if not t: return
+    if t['etat'] in EXPORT_ACTIF: suivi_export(cle)  # seul cas qui se rafraîchit toutes les 2 s
+    else: afficher_export(cle, t)
+
+def grille_paginee(cle, filtres, charger):
+    # Pagination par clé : pile des curseurs visités, remise à zéro si les filtres changent.
+    # Appelée dans un fragment : changer de page ne relance que la grille
+    etat = st.session_state.get(cle)
+    if not etat or etat['filtres'] != filtres: etat = st.session_state[cle] = {'filtres': filtres, 'pile': [None]}
+    pile = etat['pile']
+    with db_lecture() as conn: rows, suivant = charger(conn, pile[-1])
+    b1, b2, b3 = st.columns([1, 2, 1])
+    if b1.button("◀ Précédent", key=f"{cle}_prec", disabled=len(pile) == 1): pile.pop(); relancer_fragment()
+    b2.caption(f"Page {len(pile)}")
+    if b3.button("Suivant ▶", key=f"{cle}_suiv", disabled=suivant is None): pile.append(suivant); relancer_fragment()
+    return pd.DataFrame(rows)
 
 # --- 4. INTERFACE GRAPHIQUE ---
 
@@ -257,8 +218,8 @@ if not st.session_state.user:
             st.markdown("##### Créer un compte")
             with st.form("sign"):
                 nu = st.text_input("Choisir un Identifiant")
-                np = st.text_input("Choisir un Mot de passe", type="password")
-                npc = st.text_input("Confirmer le Mot de passe", type="password")
+                mdp = st.text_input("Choisir un Mot de passe", type="password")
+                mdpc = st.text_input("Confirmer le Mot de passe", type="password")
                 
                 st.markdown("---")
                 with st.expander("📜 Lire les Conditions Générales (CGU)"):
@@ -267,30 +228,24 @@ if not st.session_state.user:
                 
                 if st.form_submit_button("Créer mon Compte", use_container_width=True): 
                     if not accept_cgu: st.error("🛑 Acceptez les CGU.")
-                    elif np != npc: st.error("🛑 Les mots de passe ne correspondent pas.")
+                    elif mdp != mdpc: st.error("🛑 Les mots de passe ne correspondent pas.")
                     elif len(nu) < 3: st.error("Identifiant trop court.")
-                    elif create_user(nu, np): 
+                    elif create_user(nu, mdp): 
                         st.success("Compte créé !"); time.sleep(1)
                         st.info("Allez dans l'onglet Connexion.")
                     else: st.error("Identifiant déjà pris.")
-    st.stop()
+    fin_rerun(); st.stop()
 
 # B. DASHBOARD PRINCIPAL
 user = st.session_state.user; IS_ADMIN = user['is_admin']; USER_ID = user['id']
 est_pro, date_fin = check_pro_status(user)
 
-with db_connection() as conn:
-    user_fresh = conn.execute("SELECT * FROM users WHERE id=?", (USER_ID,)).fetchone()
-    st.session_state.user = dict(user_fresh) if user_fresh else None
-    if st.session_state.user is None: st.rerun() # Securité si user supprimé
-    prof = dict(conn.execute("SELECT * FROM profils WHERE user_id=?", (USER_ID,)).fetchone() or {})
-    inv = json.loads(prof.get('config_json', '[]')) if prof else []
-    mois = datetime.now(FUSEAU).strftime("%Y-%m")
-    cumul = conn.execute("SELECT cumul FROM etats_mensuels WHERE user_id=? AND mois=?", (USER_ID, mois)).fetchone()
-    cumul_val = cumul['cumul'] if cumul else 0.0
+with section("chargement"): donnees = charger_donnees(USER_ID)
+st.session_state.user = donnees['user']
+if st.session_state.user is None: invalider_donnees(); st.rerun() # Securité si user supprimé
 
 # SIDEBAR
-with st.sidebar:
+with st.sidebar, section("sidebar"):
     st.markdown(f"### ⚡ {APP_NAME} <span style='font-size:10px'>{VERSION}</span>", unsafe_allow_html=True)
     st.write(f"Bonjour, **{st.session_state.user['username']}**")
     
@@ -320,195 +275,347 @@ with st.sidebar:
             k = st.text_input("Saisir le Code Licence", placeholder="Ex: PRO-2026-...")
             if st.button("ACTIVER LA LICENCE", type="primary", use_container_width=True):
                 ok, d = act_licence(USER_ID, k.strip())
-                if ok: st.balloons(); st.rerun()
+                if ok: invalider_donnees(); st.balloons(); st.rerun()
                 else: st.error("Code invalide ou déjà utilisé.")
     
     st.markdown("---")
-    if st.button("Déconnexion", use_container_width=True): st.session_state.user = None; st.rerun()
+    if st.button("Déconnexion", use_container_width=True): st.session_state.user = None; invalider_donnees(); st.rerun()
     st.markdown(f"<div style='text-align: center; color: #64748B; font-size: 12px; margin-top: 20px;'>Développé par<br><b style='color: #D97706'>{COMPANY_NAME}</b></div>", unsafe_allow_html=True)
 
 # HEADER
-st.markdown(f"<h1>Tableau de Bord Énergétique</h1>", unsafe_allow_html=True)
+st.markdown("<h1>Tableau de Bord Énergétique</h1>", unsafe_allow_html=True)
 
 tabs_titles = ["🔮 ORACLE", "📜 HISTORIQUE", "⚙️ AUDIT & CONFIG", "👤 PROFIL"]
 if IS_ADMIN: tabs_titles.append("🛠️ ADMIN")
-tabs = st.tabs(tabs_titles)
+tabs = st.tabs(tabs_titles, key="onglet", on_change="rerun")
 
 # TAB 1: ORACLE
-with tabs[0]:
-    if not prof: st.warning("👋 Bienvenue ! Commencez par faire votre **Audit Énergétique** dans l'onglet ⚙️ AUDIT.")
-    else:
-        c1, c2 = st.columns([1, 1])
-        with c1:
-            st.markdown("### 🔌 Nouvelle Recharge")
-            with st.form("oracle"):
-                m = st.number_input("Montant (FCFA)", 500, 500000, 5000, step=500)
-                t = st.text_input("Code Token", type="password")
-                if st.form_submit_button("CALCULER", use_container_width=True):
-                    cat = determiner_cat(prof['conso_jour'])
-                    kwh, tva, prix = calcul_kwh(m, cumul_val, cat)
-                    with db_connection() as conn:
-                        new_c = cumul_val + float(kwh)
-                        conn.execute("INSERT OR REPLACE INTO etats_mensuels VALUES (?, ?, ?)", (USER_ID, mois, new_c))
-                        ht = "REF-" + hashlib.sha256(f"{SALT}{t}".encode()).hexdigest()[:8] if t else "N/A"
-                        conn.execute("INSERT INTO historique (user_id, date, montant, kwh, token_ref, cumul_apres) VALUES (?, ?, ?, ?, ?, ?)",
-                                  (USER_ID, datetime.now(FUSEAU).strftime("%d/%m %H:%M"), m, float(kwh), ht, new_c))
-                        conn.commit()
-                    st.success(f"✅ +{kwh:.1f} kWh"); time.sleep(1); st.rerun()
-        with c2:
-            st.markdown("### 📊 État Actuel")
-            st.markdown(f"""<div class="oracle-box"><span style="color:#CBD5E1">CUMUL DU MOIS</span><br><span class="big-font">{cumul_val:.1f} kWh</span><br><span style="font-size:12px; color:#93C5FD">Tranche : {determiner_cat(prof['conso_jour'])}</span></div>""", unsafe_allow_html=True)
-            if est_pro:
-                jours = 5 
-                st.info(f"🔮 **PRO :** Coupure estimée le **{(datetime.now(FUSEAU)+timedelta(days=jours)).strftime('%d/%m à %Hh')}**")
-            else: st.warning("🔮 Autonomie env. **5 jours**")
+@st.fragment
+def onglet_oracle():
+    # Fragment : la saisie d'une recharge ne relance que cet onglet
+    with section("oracle"):
+        d = charger_donnees(USER_ID); prof = d['prof']; cumul_val = d['cumul']
+        if not prof: st.warning("👋 Bienvenue ! Commencez par faire votre **Audit Énergétique** dans l'onglet ⚙️ AUDIT.")
+        else:
+            c1, c2 = st.columns([1, 1])
+            with c1:
+                st.markdown("### 🔌 Nouvelle Recharge")
+                with st.form("oracle"):
+                    m = st.number_input("Montant (FCFA)", 500, 500000, 5000, step=500)
+                    t = st.text_input("Code Token", type="password")
+                    if st.form_submit_button("CALCULER", use_container_width=True):
+                        # Transaction atomique : cumul relu et incrémenté en base, pas celui affiché au chargement
+                        kwh, tva, prix, new_c = recharger(USER_ID, m, t, d['mois'])
+                        invalider_donnees(); d = charger_donnees(USER_ID); cumul_val = new_c
+                        st.success(f"✅ +{kwh:.1f} kWh")
+            with c2:
+                st.markdown("### 📊 État Actuel")
+                st.markdown(f"""<div class="oracle-box"><span style="color:#CBD5E1">CUMUL DU MOIS</span><br><span class="big-font">{cumul_val:.1f} kWh</span><br><span style="font-size:12px; color:#93C5FD">Tranche : {determiner_cat(prof['conso_jour'])}</span></div>""", unsafe_allow_html=True)
+                conso = float(simuler(d['inv'])['conso_jour'][0]) if d['inv'] else 0.0
+                derniere = d['derniere']
+                if not derniere or conso <= 0: st.info("🔮 Autonomie : enregistrez une recharge et vos heures d'usage.")
+                else:
+                    jours = derniere['kwh'] / conso
+                    if est_pro and derniere['ts'] is not None:
+                        # ts (epoch) : date complète de la recharge, année comprise
+                        coupure = datetime.fromtimestamp(derniere['ts'], FUSEAU) + timedelta(days=jours)
+                        st.info(f"🔮 **PRO :** Coupure estimée le **{coupure.strftime('%d/%m à %Hh')}**")
+                    else: st.warning(f"🔮 Autonomie env. **{jours:.0f} jours**")
+
 
 # TAB 2: HISTORIQUE
-with tabs[1]:
-    lim = 100 if est_pro else 3
-    with db_connection() as conn: 
-        df = pd.read_sql("SELECT date as 'Date', montant as 'Montant', kwh as 'kWh', token_ref as 'Ref' FROM historique WHERE user_id=? ORDER BY id DESC LIMIT ?", conn, params=(USER_ID, lim))
-    if not df.empty: st.dataframe(df, use_container_width=True, hide_index=True)
-    else: st.info("Vide.")
-    if not est_pro: st.warning("🔒 Historique limité. Passez PRO.")
+def onglet_historique():
+    with section("historique"):
+        lim = 100 if est_pro else 3
+        # Période (PRO) : requête sur l'index (user_id, ts)
+        n_mois = {"Tout": None, "Ce mois": 1, "3 derniers mois": 3, "12 derniers mois": 12}[
+            st.selectbox("Période", ["Tout", "Ce mois", "3 derniers mois", "12 derniers mois"], key="histo_periode")] if est_pro else None
+        debut, fin = periode(n_mois) if n_mois else (None, None)
+        df = pd.DataFrame(lire_historique(USER_ID, lim, debut, fin), columns=['date', 'montant', 'kwh', 'token_ref'])
+        df.columns = ['Date', 'Montant', 'kWh', 'Ref']
+        if not df.empty: st.dataframe(df, use_container_width=True, hide_index=True)
+        else: st.info("Vide.")
+        if not est_pro: st.warning("🔒 Historique limité. Passez PRO.")
+        else:
+            with st.expander("📅 Synthèse mensuelle (12 mois)"):
+                syn = pd.DataFrame(synthese_mensuelle(USER_ID, 12), columns=['mois', 'nb', 'montant', 'kwh'])
+                syn.columns = ['Mois', 'Recharges', 'Montant', 'kWh']
+                if syn.empty: st.info("Vide.")
+                else: st.dataframe(syn, use_container_width=True, hide_index=True)
+            st.markdown("##### 📤 Export de l'historique complet")
+            lancer_export("exp_user", USER_ID, f"historique_{st.session_state.user['username']}")
+
+        with st.expander("📥 Importer des recharges (CSV / Excel)"):
+            st.caption("Colonnes : **date** (jj/mm/aaaa hh:mm), **montant** (FCFA), token ou ref (optionnel)"
+                       + (", **utilisateur** (identifiant du client)" if IS_ADMIN else "") + ". Séparateur ; ou ,")
+            fichier = st.file_uploader("Fichier de reçus", type=["csv", "txt", "xlsx"], key="imp_fichier")
+            if fichier is not None and st.button("IMPORTER", key="imp_go"):
+                with st.spinner("Import en cours..."):
+                    try: rap = imports.importer(get_pool(), fichier, fichier.name, uid=USER_ID, multi_utilisateurs=IS_ADMIN, hash_token=ref_token)
+                    except ValueError as e: st.error(str(e)); rap = None
+                if rap:
+                    invalider_donnees()
+                    st.success(f"✅ {rap['importees']} recharges importées ({rap['doublons']} doublons ignorés, {rap['mois']} mois recalculés).")
+                    if rap['nb_erreurs']:
+                        st.warning(f"{rap['nb_erreurs']} lignes rejetées.")
+                        st.dataframe(pd.DataFrame(rap['erreurs'], columns=["Ligne", "Erreur"]), hide_index=True)
+
 
 # TAB 3: AUDIT & CONFIG
-with tabs[2]:
-    st.write("### 🏗️ Parc Électrique")
-    cat_dict = get_catalogue_pareto()
-    c1, c2, c3, c4 = st.columns([2, 2, 1, 1])
-    with c1: cat = st.selectbox("Catégorie", list(cat_dict.keys()))
-    with c2: 
-        opts = list(cat_dict[cat].keys()); 
-        if est_pro: opts.append("➕ Créer")
-        item = st.selectbox("Appareil", opts)
-    nom=item; p_def=cat_dict[cat].get(item,0)
-    if item=="➕ Créer": nom=st.text_input("Nom"); p_def=st.number_input("W",1,9999,100)
-    with c3: pa = st.number_input("Puissance (Watts)", value=int(p_def), disabled=not est_pro)
-    with c4: 
-        q = st.number_input("Qté", 1, 20, 1)
-        if st.button("Ajouter", use_container_width=True):
-            inv.append({"nom": nom, "p": pa, "q": q, "h": 5.0})
-            with db_connection() as conn: conn.execute("INSERT OR REPLACE INTO profils (user_id, budget, conso_jour, label, config_json) VALUES (?, 0, 0, 'Auto', ?)", (USER_ID, json.dumps(inv))); conn.commit()
-            st.rerun()
-    st.divider()
-    if inv:
-        tp=0; tk=0
-        for i, it in enumerate(inv):
-            cc1, cc2, cc3, cc4 = st.columns([3, 2, 2, 1])
-            with cc1: st.write(f"**{it['nom']}** (x{it['q']})")
-            with cc2: st.write(f"{it['p']} W")
-            with cc3: it['h'] = st.slider(f"Heures", 0., 24., float(it['h']), 0.5, key=f"h_{i}", label_visibility="collapsed")
-            with cc4: 
-                if st.button("🗑️", key=f"d_{i}"):
-                    del inv[i]; 
-                    with db_connection() as conn: conn.execute("UPDATE profils SET config_json=? WHERE user_id=?", (json.dumps(inv), USER_ID)); conn.commit()
-                    st.rerun()
-            tp+=it['p']*it['q']; tk+=(it['p']*it['q']*it['h'])/1000
-        if st.button("💾 Mettre à jour"):
-             with db_connection() as conn: conn.execute("UPDATE profils SET config_json=?, conso_jour=? WHERE user_id=?", (json.dumps(inv), tk, USER_ID)); conn.commit()
-             st.rerun()
-        st.markdown("---")
-        st.metric("Puissance Installée (kW)", f"{tp/1000:.2f} kW")
+@st.fragment
+def onglet_audit():
+    # Fragment : sliders, ajouts et simulateur ne relancent que cet onglet
+    with section("audit"):
+        d = charger_donnees(USER_ID); prof = d['prof']; cumul_val = d['cumul']
+        inv = copy.deepcopy(d['inv'])  # les sliders modifient la copie, pas le cache
+        st.write("### 🏗️ Parc Électrique")
+        cat_dict = get_catalogue_pareto()
+        c1, c2, c3, c4 = st.columns([2, 2, 1, 1])
+        with c1: cat = st.selectbox("Catégorie", list(cat_dict.keys()))
+        with c2: 
+            opts = list(cat_dict[cat].keys()); 
+            if est_pro: opts.append("➕ Créer")
+            item = st.selectbox("Appareil", opts)
+        nom=item; p_def=cat_dict[cat].get(item,0)
+        if item=="➕ Créer": nom=st.text_input("Nom"); p_def=st.number_input("W",1,9999,100)
+        with c3: pa = st.number_input("Puissance (Watts)", value=int(p_def), disabled=not est_pro)
+        with c4: 
+            q = st.number_input("Qté", 1, 20, 1)
+            if st.button("Ajouter", use_container_width=True):
+                ajouter_appareil(USER_ID, nom, pa, q)
+                invalider_donnees(); relancer_fragment()
+        st.divider()
+        if inv:
+            for it in inv:
+                cc1, cc2, cc3, cc4 = st.columns([3, 2, 2, 1])
+                with cc1: st.write(f"**{it['nom']}** (x{it['q']})")
+                with cc2: st.write(f"{it['p']:g} W")
+                with cc3: it['h'] = st.slider("Heures", 0., 24., float(it['h']), 0.5, key=f"h_{it['id']}", label_visibility="collapsed")
+                with cc4: 
+                    if st.button("🗑️", key=f"d_{it['id']}"):
+                        supprimer_appareil(USER_ID, it['id'])
+                        invalider_donnees(); relancer_fragment()
+            if st.button("💾 Mettre à jour"):
+                 # Seules les lignes dont les heures ont bougé sont réécrites
+                 avant = {it['id']: it['h'] for it in d['inv']}
+                 modifs = {it['id']: it['h'] for it in inv if it['h'] != avant.get(it['id'])}
+                 maj_heures_appareils(USER_ID, modifs)
+                 invalider_donnees(); relancer_fragment()
+            st.markdown("---")
+            st.metric("Puissance Installée (kW)", f"{(prof.get('puissance_w') or 0)/1000:.2f} kW")
+
+            # SIMULATEUR : toutes les heures ci-dessus × un facteur, évalué d'un coup
+            st.write("### 🔮 Simulateur de Facture")
+            s1, s2 = st.columns(2)
+            with s1: m_sim = st.number_input("Recharge simulée (FCFA)", 0, 500000, 5000, step=500, key="sim_m")
+            with s2: f_min, f_max = st.slider("Variation des heures d'usage", 0.25, 2.0, (0.5, 1.5), 0.05, key="sim_f")
+            facteurs = np.unique(np.round(np.append(np.linspace(f_min, f_max, 101), 1.0), 4))
+            sim = grille_facteurs(inv, facteurs, montants=m_sim, cumuls=cumul_val, debut=datetime.now(FUSEAU).replace(tzinfo=None))
+            i1 = int(np.argmin(np.abs(facteurs - 1.0)))
+            r1, r2, r3 = st.columns(3)
+            r1.metric("Conso / jour", f"{sim['conso_jour'][i1]:.1f} kWh")
+            r2.metric("Facture du mois projetée", f"{sim['cout_mois'][i1]:,.0f} FCFA")
+            r3.metric("Puissance appelée", f"{sim['puissance_appelee'][i1]/1000:.2f} kW")
+            if np.isnan(sim['coupure_jour'][i1]): st.success(f"✅ {m_sim:,} FCFA couvrent la fin du mois ({sim['autonomie_jours'][i1]:.0f} jours d'autonomie).")
+            else: st.warning(f"⚠️ Coupure estimée le **{int(sim['coupure_jour'][i1])}** du mois ({sim['autonomie_jours'][i1]:.1f} jours d'autonomie).")
+            bornes = [f"{int(j)}" for j in sim['franchissements'][i1] if not np.isnan(j)]
+            if bornes: st.caption("Changement de tranche prévu le(s) jour(s) : " + ", ".join(bornes))
+            st.line_chart(pd.DataFrame({"Facture du mois (FCFA)": sim['cout_mois']}, index=pd.Index(facteurs, name="Facteur d'heures")))
+
 
 # TAB 4: PROFIL
-with tabs[3]:
-    st.write("### 👤 Mes Informations")
-    st.caption("Ces informations nous aident à sécuriser votre compte.")
-    curr_u = st.session_state.user
-    with st.form("profil_form"):
-        col_p1, col_p2 = st.columns(2)
-        with col_p1:
-            new_fname = st.text_input("Nom", value=curr_u['first_name'] or "")
-            new_phone = st.text_input("Téléphone", value=curr_u['phone'] or "")
-        with col_p2:
-            new_lname = st.text_input("Prénom", value=curr_u['last_name'] or "")
-            new_meter = st.text_input("Numéro de Compteur", value=curr_u['meter_number'] or "")
-        if st.form_submit_button("💾 ENREGISTRER MES INFOS", use_container_width=True):
-            if update_profile(USER_ID, new_fname, new_lname, new_phone, new_meter):
-                st.success("Profil mis à jour !"); time.sleep(1); st.rerun()
-            else: st.error("Erreur.")
-    st.markdown("---")
-    with st.expander("🔒 Modifier mon Mot de passe"):
-        with st.form("pwd_change"):
-            old = st.text_input("Ancien mot de passe", type="password")
-            n1 = st.text_input("Nouveau mot de passe", type="password")
-            n2 = st.text_input("Confirmer le nouveau", type="password")
-            if st.form_submit_button("Changer le mot de passe"):
-                if n1 != n2: st.error("Les mots de passe ne correspondent pas.")
-                elif len(n1) < 4: st.error("Trop court.")
-                elif change_password(USER_ID, old, n1):
-                    st.success("Mot de passe changé ! Reconnexion requise."); time.sleep(2)
-                    st.session_state.user = None; st.rerun()
-                else: st.error("Ancien mot de passe incorrect.")
+def onglet_profil():
+    with section("profil"):
+        st.write("### 👤 Mes Informations")
+        st.caption("Ces informations nous aident à sécuriser votre compte.")
+        curr_u = st.session_state.user
+        with st.form("profil_form"):
+            col_p1, col_p2 = st.columns(2)
+            with col_p1:
+                new_fname = st.text_input("Nom", value=curr_u['first_name'] or "")
+                new_phone = st.text_input("Téléphone", value=curr_u['phone'] or "")
+            with col_p2:
+                new_lname = st.text_input("Prénom", value=curr_u['last_name'] or "")
+                new_meter = st.text_input("Numéro de Compteur", value=curr_u['meter_number'] or "")
+            if st.form_submit_button("💾 ENREGISTRER MES INFOS", use_container_width=True):
+                if update_profile(USER_ID, new_fname, new_lname, new_phone, new_meter):
+                    invalider_donnees(); st.success("Profil mis à jour !"); time.sleep(1); st.rerun()
+                else: st.error("Erreur.")
+        st.markdown("---")
+        with st.expander("🔒 Modifier mon Mot de passe"):
+            with st.form("pwd_change"):
+                old = st.text_input("Ancien mot de passe", type="password")
+                n1 = st.text_input("Nouveau mot de passe", type="password")
+                n2 = st.text_input("Confirmer le nouveau", type="password")
+                if st.form_submit_button("Changer le mot de passe"):
+                    if n1 != n2: st.error("Les mots de passe ne correspondent pas.")
+                    elif len(n1) < 4: st.error("Trop court.")
+                    elif change_password(USER_ID, old, n1):
+                        st.success("Mot de passe changé ! Reconnexion requise."); time.sleep(2)
+                        st.session_state.user = None; invalider_donnees(); st.rerun()
+                    else: st.error("Ancien mot de passe incorrect.")
+
 
 # TAB 5: ADMIN (AVEC SYSTEME DE SAUVEGARDE)
-if IS_ADMIN:
-    with tabs[4]:
+@st.fragment
+def admin_users():
+    # Fragment : filtres et pagination ne relancent que la grille
+    with section("admin_users"):
+        st.subheader("📋 Base Utilisateurs")
+        f1, f2, f3 = st.columns(3)
+        q_user = f1.text_input("Recherche", placeholder="Identifiant, nom, téléphone", key="adm_q")
+        f_pro = {"Tous": None, "PRO": True, "Gratuit": False}[f2.selectbox("Statut", ["Tous", "PRO", "Gratuit"], key="adm_pro")]
+        f_exp = {"—": None, "7 jours": 7, "30 jours": 30, "90 jours": 90}[f3.selectbox("Expire sous", ["—", "7 jours", "30 jours", "90 jours"], key="adm_exp")]
+        inscrits = st.date_input("Inscrits entre", value=(), key="adm_periode")
+        du, au = (inscrits + (None, None))[:2] if inscrits else (None, None)
+        filtres = dict(recherche=q_user.strip() or None, pro=f_pro, expire_sous_jours=f_exp, cree_du=du, cree_au=au)
+        users_df = grille_paginee("adm_users", filtres, lambda conn, cur: admin.page_users(conn, cur, **filtres))
+        if not users_df.empty:
+            st.dataframe(
+                users_df[['username', 'phone', 'is_pro', 'created_at']], 
+                use_container_width=True,
+                column_config={"is_pro": st.column_config.CheckboxColumn("PRO ?"), "created_at": "Date"}
+            )
+        else:
+            st.info("Aucun utilisateur.")
+
+
+@st.fragment
+def admin_licences():
+    with section("admin_licences"):
+        l1, l2 = st.columns(2)
+        q_lic = l1.text_input("Code", key="adm_lic_q")
+        f_used = {"Toutes": None, "Utilisées": True, "Libres": False}[l2.selectbox("État", ["Toutes", "Utilisées", "Libres"], key="adm_lic_etat")]
+        f_lic = dict(recherche=q_lic.strip() or None, utilisee=f_used)
+        lic_df = grille_paginee("adm_lic", f_lic, lambda conn, cur: admin.page_licences(conn, cur, **f_lic))
+        st.dataframe(lic_df.drop(columns=['rid'], errors='ignore'), use_container_width=True)
+
+
+@st.fragment
+def admin_generation():
+    # Un lot = une transaction ; le CSV n'est construit qu'au clic de téléchargement
+    qte = {}
+    for col, (j, titre) in zip(st.columns(len(DUREES_LICENCE)), DUREES_LICENCE.items()):
+        qte[j] = col.number_input(titre, 0, MAX_LOT_LICENCES, 1 if j == 365 else 0, key=f"adm_gen_{j}")
+    if st.button("✨ CRÉER LES CODES", disabled=not any(qte.values())):
+        try: lot, codes = gen_licences(USER_ID, qte)
+        except ValueError as e: st.error(str(e))
+        else:
+            st.session_state.adm_lot = lot
+            if len(codes) == 1: st.success(codes[0]); st.info("Copiez et envoyez au client.")
+            else: st.success(f"{len(codes)} codes créés (lot {lot}).")
+    with db_lecture() as conn: lots = admin.lots_licences(conn)
+    if lots:
+        noms = [l['lot'] for l in lots]; infos = {l['lot']: l for l in lots}
+        if st.session_state.get("adm_lot") not in noms: st.session_state.adm_lot = noms[0]
+        lot = st.selectbox("Lot", noms, key="adm_lot",
+                           format_func=lambda l: f"{l} : {infos[l]['codes']} codes, {infos[l]['libres']} libres ({infos[l]['durees']} j)")
+
+        def csv_lot():
+            with db_lecture() as conn: return admin.csv_lot(conn, lot)
+        st.download_button("📥 CSV DU LOT", data=csv_lot, file_name=f"licences_{lot}.csv", mime="text/csv", key="adm_lot_csv")
+
+
+def onglet_admin():
+    with section("admin"):
         st.header("🛠️ Cockpit de Pilotage")
-        
-        # --- NOUVEAU : SYSTEME DE SAUVEGARDE ---
-        st.error("🚨 ZONE DE DANGER : SAUVEGARDE DES DONNÉES")
-        st.caption("Le serveur Cloud Gratuit efface les données au redémarrage. SAUVEGARDEZ TOUS LES SOIRS.")
-        
-        col_save1, col_save2 = st.columns(2)
-        with col_save1:
-            # BOUTON DOWNLOAD
-            with open(DB_FILE, "rb") as f:
-                btn = st.download_button(
-                    label="📥 TÉLÉCHARGER LA BASE DE DONNÉES (BACKUP)",
-                    data=f,
-                    file_name=f"backup_wattcheck_{datetime.now().strftime('%Y%m%d_%H%M')}.db",
-                    mime="application/x-sqlite3",
-                    type="primary"
-                )
-        with col_save2:
-            # UPLOAD RESTAURATION
-            uploaded_db = st.file_uploader("📤 RESTAURER UNE SAUVEGARDE", type=["db"])
-            if uploaded_db is not None:
-                if st.button("⚠️ CONFIRMER LA RESTAURATION"):
-                    with open(DB_FILE, "wb") as f:
-                        f.write(uploaded_db.getbuffer())
-                    st.success("Base de données restaurée !"); time.sleep(1); st.rerun()
-        
-        st.divider()
-        
-        with db_connection() as conn:
-            users_df = pd.read_sql("SELECT id, username, first_name, last_name, phone, is_pro, created_at FROM users WHERE username != 'admin'", conn)
-            lic_df = pd.read_sql("SELECT * FROM licences", conn)
-        
-        total_inscrits = len(users_df)
-        total_pro = len(users_df[users_df['is_pro'] == 1])
-        ca_estime = total_pro * 5000
-        
-        k1, k2, k3 = st.columns(3)
-        k1.metric("👥 Total Inscrits", total_inscrits)
-        k2.metric("💎 Abonnés PRO", total_pro)
-        k3.metric("💰 CA Estimé", f"{ca_estime:,} FCFA")
-        
-        st.divider()
-
-        c1, c2 = st.columns([1, 2])
-        with c1:
-            st.subheader("🔑 Générer Licence")
-            if st.button("✨ CRÉER UN CODE (1 AN)"):
-                code = gen_licence(USER_ID)
-                st.success(code)
-                st.info("Copiez et envoyez au client.")
-        
-        with c2:
-            st.subheader("📋 Base Utilisateurs")
-            if not users_df.empty:
-                st.dataframe(
-                    users_df[['username', 'phone', 'is_pro', 'created_at']], 
-                    use_container_width=True,
-                    column_config={"is_pro": st.column_config.CheckboxColumn("PRO ?"), "created_at": "Date"}
-                )
-            else:
-                st.info("Aucun utilisateur.")
-        
-        st.markdown("---")
-        with st.expander("📂 Voir l'historique des Licences"):
-            st.dataframe(lic_df)
+        adm_tabs = st.tabs(["🧭 Pilotage", "📈 Métriques"], key="onglet_admin", on_change="rerun")
+        if adm_tabs[0].open:
+            with adm_tabs[0]:
+
+                # --- NOUVEAU : SYSTEME DE SAUVEGARDE ---
+                st.error("🚨 ZONE DE DANGER : SAUVEGARDE DES DONNÉES")
+                if SAUVEGARDES:
+                    st.caption("Le serveur Cloud Gratuit efface les données au redémarrage. SAUVEGARDEZ TOUS LES SOIRS.")
+
+                    col_save1, col_save2 = st.columns(2)
+                    with col_save1:
+                        # BOUTON DOWNLOAD : instantané à chaud généré au clic, hors du thread de la page
+                        def instantane_download():
+                            with open(get_sauvegardes().instantane(), "rb") as f: return f.read()
+                        st.download_button(
+                            label="📥 TÉLÉCHARGER LA BASE DE DONNÉES (BACKUP)",
+                            data=instantane_download,
+                            file_name=f"backup_wattcheck_{datetime.now().strftime('%Y%m%d_%H%M')}.db",
+                            mime="application/x-sqlite3",
+                            type="primary"
+                        )
+                        sauv = get_sauvegardes(); dispo = instantanes(BACKUP_DIR)
+                        st.caption(f"Sauvegardes auto : {len(dispo)} sur le serveur" + (f", dernière : {os.path.basename(dispo[0])}" if dispo else ""))
+                        if sauv.erreur: st.warning(f"Dernière sauvegarde auto en échec : {sauv.erreur}")
+                    with col_save2:
+                        # UPLOAD RESTAURATION
+                        uploaded_db = st.file_uploader("📤 RESTAURER UNE SAUVEGARDE", type=["db"])
+                        if uploaded_db is not None:
+                            if st.button("⚠️ CONFIRMER LA RESTAURATION"):
+                                try: restaurer(get_pool(), uploaded_db, BACKUP_DIR)
+                                except ValueError as e: st.error(f"Restauration refusée : {e}")
+                                else:
+                                    # La base restaurée peut ne pas avoir de compte admin : initialiser() est rejoué à la relance
+                                    demarrer.clear(); invalider_donnees(); st.success("Base de données restaurée !"); time.sleep(1); st.rerun()
+                else: st.info("Base PostgreSQL : sauvegardes et restauration par pg_dump / pg_restore, côté serveur.")
+
+                st.divider()
+
+                with db_lecture() as conn: kpi = admin.kpis(conn)
+
+                k1, k2, k3 = st.columns(3)
+                k1.metric("👥 Total Inscrits", kpi['total_inscrits'])
+                k2.metric("💎 Abonnés PRO", kpi['total_pro'])
+                k3.metric("💰 CA Estimé", f"{kpi['ca_estime']:,} FCFA")
+
+                st.divider()
+
+                c1, c2 = st.columns([1, 2])
+                with c1:
+                    st.subheader("🔑 Générer des Licences")
+                    admin_generation()
+
+                with c2:
+                    admin_users()
 
+                st.markdown("---")
+                with st.expander("📤 Export global de l'historique (tous les clients)"):
+                    lancer_export("exp_admin", None, "historique_global")
+
+                with st.expander("📂 Voir l'historique des Licences"):
+                    # Chargé seulement à la demande
+                    if st.toggle("Charger les licences", key="adm_lic_on"): admin_licences()
+
+        if adm_tabs[1].open:
+            with adm_tabs[1]:
+                st.caption(f"Processus de la page, depuis le {datetime.fromtimestamp(metriques.REGISTRE.debut, FUSEAU).strftime('%d/%m %H:%M')}. "
+                           f"Requêtes lentes : ≥ {metriques.REGISTRE.seuil_lent * 1000:.0f} ms, {metriques.REGISTRE.echantillon:.0%} journalisées.")
+                met = pd.DataFrame(metriques.REGISTRE.lignes())
+                if met.empty: st.info("Aucune mesure pour l'instant.")
+                else:
+                    met['etiquette'] = met['etiquettes'].map(lambda e: ", ".join(f"{v}" for v in e.values()))
+                    cols = ['etiquette', 'n', 'moy_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'total_s']
+                    fmt = {c: "{:.2f}" for c in cols[2:]}
+                    for titre, nom in (("⏱️ Reruns et sections de la page", "wattcheck_page_secondes"), ("🧩 Fonctions du noyau", "wattcheck_core_secondes"),
+                                       ("🔒 Pool : attente / tenue", None), ("🗄️ Requêtes SQL (par temps total)", "wattcheck_requete_secondes")):
+                        st.markdown(f"##### {titre}")
+                        if nom is None:
+                            d = met[met['nom'].isin(["wattcheck_pool_attente_secondes", "wattcheck_pool_tenue_secondes"])].copy()
+                            d['etiquette'] = d['nom'].str.replace("wattcheck_pool_", "").str.replace("_secondes", "") + " " + d['etiquette']
+                        else: d = met[met['nom'] == nom]
+                        st.dataframe(d.sort_values('total_s', ascending=False)[cols].style.format(fmt), use_container_width=True, hide_index=True)
+                lentes = list(metriques.REGISTRE.lentes)
+                st.markdown(f"##### 🐢 Requêtes lentes échantillonnées ({len(lentes)})")
+                if lentes:
+                    df_l = pd.DataFrame(lentes[::-1])
+                    df_l['ts'] = df_l['ts'].map(lambda t: datetime.fromtimestamp(t, FUSEAU).strftime('%d/%m %H:%M:%S'))
+                    st.dataframe(df_l, use_container_width=True, hide_index=True)
+                m1, m2 = st.columns(2)
+                m1.download_button("📥 Export Prometheus (texte)", data=metriques.prometheus, file_name="wattcheck.prom", mime="text/plain")
+                if m2.button("🔄 Remettre les compteurs à zéro"): metriques.REGISTRE.reinitialiser(); st.rerun()
+                if METRIQUES_FILE: st.caption(f"Fichier Prometheus : {METRIQUES_FILE} (réécrit toutes les 15 s)")
+
+
+# Seul l'onglet ouvert est exécuté : le coût d'une interaction est celui de cet onglet
+for onglet, rendre in zip(tabs, [onglet_oracle, onglet_historique, onglet_audit, onglet_profil, onglet_admin]):
+    if onglet.open:
+        with onglet: rendre()
+
+fin_rerun()
 st.markdown(f"<div class='branding-footer'>© 2026 <span class='company-name'>{COMPANY_NAME}</span> | {APP_NAME} {VERSION}</div>", unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""Suite complète : tarifs, import, base, charge concurrente, stress des recharges, licences, API et page, dans un seul JSON.
+
+Usage : python -m benchmarks [--base BASE] [--generer USERS,RECHARGES] [--sans page,charge]
+        [--rapide] [--json FICHIER]
+
+Sans --base, une base temporaire est générée (benchmarks.donnees). Deux
+fichiers JSON se comparent avec python -m benchmarks.comparer.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks import bench_api, bench_db, bench_import, bench_page, bench_tarifs, charge, concurrence, licences
+from benchmarks.commun import ecrire_json
+from benchmarks.donnees import generer
+from wattcheck import core
+
+ETAPES = ("tarifs", "import", "db", "charge", "concurrence", "licences", "api", "page")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks")
+    ap.add_argument("--base"); ap.add_argument("--generer", default="2000,200000", help="USERS,RECHARGES si --base est omise")
+    ap.add_argument("--sans", default="", help=f"étapes à sauter parmi {','.join(ETAPES)}")
+    ap.add_argument("--rapide", action="store_true", help="tailles réduites (contrôle rapide)")
+    ap.add_argument("--threads", type=int, default=16); ap.add_argument("--json", default="-")
+    a = ap.parse_args(argv)
+    sans = {s.strip() for s in a.sans.split(",") if s.strip()}
+    k = 10 if a.rapide else 1
+    r = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        base = a.base
+        if not base and not sans.issuperset({"db", "charge", "api", "page"}):
+            u, h = map(int, a.generer.split(","))
+            base = os.path.join(tmp, "bench.db")
+            r["donnees"] = generer(base, u, h, nb_licences=u // 5, log=lambda *x: print(*x, file=sys.stderr))
+        if "tarifs" not in sans: r["tarifs"] = bench_tarifs.mesurer(100_000 // k, 2000 // k)
+        if "import" not in sans: r["import"] = bench_import.mesurer(max(3, 10 // k))
+        if "db" not in sans: r["db"] = bench_db.mesurer(base, 500 // k, 200 // k)
+        if "charge" not in sans: r["charge"] = charge.lancer(base, a.threads, 30 / k)
+        if "concurrence" not in sans: r["concurrence"] = concurrence.lancer(os.path.join(tmp, "stress.db"), recharges=200 // k)
+        if "licences" not in sans: r["licences"] = licences.lancer(os.path.join(tmp, "licences.db"), taille=1000 // k, codes=500 // k)
+        if "api" not in sans: core.get_pool().fermer(); r["api"] = bench_api.lancer(base, a.threads, 20 / k)
+        if "page" not in sans: r["page"] = bench_page.mesurer(base, max(3, 20 // k))
+        core.get_pool().fermer()
+    ecrire_json(a.json, "suite", vars(a), r)
+    if a.json != "-": print(f"résultats écrits dans {a.json}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
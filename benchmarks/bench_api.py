@@ -0,0 +1,125 @@
+"""Test de charge local de l'API HTTP (wattcheck.api) : débit et latences par route.
+
+Lance le serveur uvicorn dans un sous-processus sur une base générée (ou
+fournie), obtient des jetons pour quelques comptes « benchN », puis N
+threads clients (connexions HTTP/1.1 persistantes) rejouent un mélange de
+requêtes : tarif unitaire, tarif en lot, recharge et historique.
+
+Usage : python -m benchmarks.bench_api [BASE] [--threads 16] [--duree 20] [--lot 100]
+        [--generer USERS,RECHARGES] [--json FICHIER]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.bench_db import comptes_bench
+from benchmarks.commun import RACINE, afficher, ecrire_json, resume
+from benchmarks.donnees import MOT_DE_PASSE, generer
+from wattcheck import core
+
+MELANGE = (("tarif", 40), ("tarif[lot]", 10), ("recharge", 20), ("historique", 30))
+
+
+def _port_libre():
+    with socket.socket() as s: s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+
+def _requete(conn, methode, chemin, corps=None, jeton=None):
+    entetes = {"Content-Type": "application/json"}
+    if jeton: entetes["Authorization"] = f"Bearer {jeton}"
+    conn.request(methode, chemin, body=json.dumps(corps) if corps is not None else None, headers=entetes)
+    r = conn.getresponse(); data = r.read()
+    return r.status, json.loads(data) if data else None
+
+
+def demarrer(base, port):
+    env = dict(os.environ, PYTHONPATH=RACINE, WATTCHECK_SALT=base + ".salt")
+    proc = subprocess.Popen([sys.executable, "-m", "wattcheck.api", "--base", base, "--port", str(port)], env=env, cwd=RACINE)
+    for _ in range(200):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            if _requete(conn, "GET", "/v1/sante")[0] == 200: conn.close(); return proc
+        except OSError: time.sleep(0.05)
+    proc.terminate(); raise RuntimeError("le serveur API n'a pas démarré")
+
+
+def lancer(base, threads=16, duree=20.0, lot=100, comptes=50, seed=0):
+    core.configurer(base, base + ".salt"); core.initialiser()
+    premier, dernier = comptes_bench(core.get_pool())
+    core.get_pool().fermer()
+    port = _port_libre(); proc = demarrer(base, port)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        rng = random.Random(seed)
+        jetons = [_requete(conn, "POST", "/v1/jetons", {"username": f"bench{uid}", "password": MOT_DE_PASSE, "libelle": "bench"})[1]["jeton"]
+                  for uid in rng.sample(range(premier, dernier + 1), min(comptes, dernier - premier + 1))]
+        conn.close()
+        durees = defaultdict(list); erreurs = Counter(); fin = time.perf_counter() + duree
+        noms = [n for n, _ in MELANGE]; poids = [p for _, p in MELANGE]
+        depart = threading.Barrier(threads)
+
+        def client(i):
+            r = random.Random(seed * 1000 + i); local = defaultdict(list)
+            c = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            depart.wait()
+            while time.perf_counter() < fin:
+                nom = r.choices(noms, poids)[0]; j = r.choice(jetons)
+                if nom == "tarif": args = ("POST", "/v1/tarif", {"montant": r.choice((2000, 5000, 10000)), "cumul": r.uniform(0, 500), "conso_jour": r.uniform(1, 20)})
+                elif nom == "tarif[lot]": args = ("POST", "/v1/tarif", [{"montant": r.choice((2000, 5000, 10000)), "cumul": r.uniform(0, 500), "conso_jour": r.uniform(1, 20)} for _ in range(lot)])
+                elif nom == "recharge": args = ("POST", "/v1/recharges", {"montant": r.choice((2000, 5000, 10000)), "token": f"T{r.getrandbits(40)}"})
+                else: args = ("GET", "/v1/historique?limite=100", None)
+                t0 = time.perf_counter()
+                try:
+                    statut, _ = _requete(c, *args, jeton=j)
+                    if statut >= 400: erreurs[f"{nom} HTTP {statut}"] += 1
+                except (OSError, http.client.HTTPException) as e:
+                    erreurs[f"{nom} {type(e).__name__}"] += 1; c.close(); c = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                local[nom].append(time.perf_counter() - t0)
+            c.close()
+            for nom, l in local.items(): durees[nom].extend(l)
+
+        ts = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+        t0 = time.perf_counter()
+        for t in ts: t.start()
+        for t in ts: t.join()
+        ecoule = time.perf_counter() - t0
+    finally:
+        proc.terminate(); proc.wait(10)
+    n = sum(len(l) for l in durees.values())
+    return {"duree_s": ecoule, "requetes": n, "requetes_par_s": n / ecoule,
+            "tarifs_par_s": (len(durees["tarif"]) + lot * len(durees["tarif[lot]"])) / ecoule,
+            "recharges_par_s": len(durees["recharge"]) / ecoule, "erreurs": dict(erreurs),
+            "latences": {nom: resume(l) for nom, l in sorted(durees.items())}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.bench_api")
+    ap.add_argument("base", nargs="?"); ap.add_argument("--threads", type=int, default=16); ap.add_argument("--duree", type=float, default=20)
+    ap.add_argument("--lot", type=int, default=100)
+    ap.add_argument("--generer", default="2000,200000", help="USERS,RECHARGES si BASE est omise"); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = a.base
+        if not base:
+            u, h = map(int, a.generer.split(","))
+            base = os.path.join(tmp, "bench.db"); generer(base, u, h, nb_licences=u // 5, log=lambda *_: None); core.get_pool().fermer()
+        r = lancer(base, a.threads, a.duree, a.lot)
+    print(f"{a.threads} clients, {r['duree_s']:.1f} s : {r['requetes']:,} requêtes ({r['requetes_par_s']:,.0f}/s), "
+          f"{r['tarifs_par_s']:,.0f} tarifs/s, {r['recharges_par_s']:,.0f} recharges/s, {sum(r['erreurs'].values())} erreurs")
+    for nom, l in r["latences"].items(): afficher(nom, l)
+    if r["erreurs"]: print(r["erreurs"])
+    if a.json: ecrire_json(a.json, "api", vars(a), r)
+    return 1 if r["erreurs"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Benchmark : latences (p50/p90/p95/p99) de chaque fonction d'accès à la base.
+
+Sur une base remplie par benchmarks.donnees (comptes « benchN »), ou sur une
+base temporaire générée à la volée avec --generer. Les recharges écrites par
+--ecritures restent dans la base.
+
+Usage : python -m benchmarks.bench_db [BASE] [--n 500] [--ecritures 200] [--generer USERS,RECHARGES] [--json FICHIER]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from benchmarks.commun import afficher, chronometrer, ecrire_json
+from benchmarks.donnees import MOT_DE_PASSE, generer
+from wattcheck import admin, core, retention
+from wattcheck.export import lots
+
+
+def comptes_bench(pool):
+    with pool.lecture() as conn:
+        r = conn.execute("SELECT MIN(id), MAX(id) FROM users WHERE username LIKE 'bench%'").fetchone()
+    if r[0] is None: raise SystemExit("Aucun compte benchN dans la base : lancer d'abord python -m benchmarks.donnees")
+    return r[0], r[1]
+
+
+def lecture(fn):
+    def f(*a, **kw):
+        with core.db_lecture() as conn: return fn(conn, *a, **kw)
+    return f
+
+
+def scenarios(premier, dernier, rng):
+    """{nom: appel sans argument} ; chaque appel tire un compte au hasard."""
+    uid = lambda: rng.randint(premier, dernier)
+    kpis, users, lic = lecture(admin.kpis), lecture(admin.page_users), lecture(admin.page_licences)
+    trois_mois = retention.periode(3)
+    return {
+        "login_user": lambda: core.login_user(f"bench{uid()}", MOT_DE_PASSE),
+        "charger_utilisateur": lambda: core.charger_utilisateur(uid()),
+        "lire_historique[3]": lambda: core.lire_historique(uid(), 3),
+        "lire_historique[100]": lambda: core.lire_historique(uid(), 100),
+        "lire_historique[3 mois]": lambda: core.lire_historique(uid(), 100, *trois_mois),
+        "synthese_mensuelle[12]": lambda: core.synthese_mensuelle(uid(), 12),
+        "export.lots[1er lot]": lambda: next(lots(core.get_pool(), uid()), None),
+        "admin.kpis": kpis,
+        "admin.page_users": lambda: users(),
+        "admin.page_users[pro, exp 30j]": lambda: users(pro=True, expire_sous_jours=30),
+        "admin.page_users[recherche]": lambda: users(recherche=f"6{rng.randint(0, 99):02d}"),
+        "admin.page_licences[libres]": lambda: lic(utilisee=False),
+    }
+
+
+def mesurer(base, n=500, ecritures=200, seed=0):
+    core.configurer(base, base + ".salt"); core.initialiser()
+    premier, dernier = comptes_bench(core.get_pool())
+    rng = random.Random(seed)
+    r = {nom: chronometrer(fn, n) for nom, fn in scenarios(premier, dernier, rng).items()}
+    if ecritures:
+        mois = core.mois_courant()
+
+        def recharge():  # transaction complète de l'Oracle (lecture du cumul, tarif, écriture)
+            core.recharger(rng.randint(premier, dernier), rng.choice((2000, 5000, 10000)), "BENCH", mois)
+        r["recharger"] = chronometrer(recharge, ecritures)
+    return {"comptes": dernier - premier + 1, "latences": r, "pool": core.get_pool().stats()}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.bench_db")
+    ap.add_argument("base", nargs="?"); ap.add_argument("--n", type=int, default=500); ap.add_argument("--ecritures", type=int, default=200)
+    ap.add_argument("--generer", default="2000,200000", help="USERS,RECHARGES si BASE est omise"); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = a.base
+        if not base:
+            u, h = map(int, a.generer.split(","))
+            base = os.path.join(tmp, "bench.db"); generer(base, u, h, nb_licences=u // 5, log=lambda *_: None)
+        r = mesurer(base, a.n, a.ecritures)
+        core.get_pool().fermer()
+    print(f"comptes : {r['comptes']:,}")
+    for nom, l in r["latences"].items(): afficher(nom, l)
+    if a.json: ecrire_json(a.json, "db", vars(a), r)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
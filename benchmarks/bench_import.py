@@ -0,0 +1,51 @@
+"""Benchmark : import à froid de wattcheck.core (sans Streamlit, pandas ni numpy).
+
+Chaque mesure lance un interpréteur neuf dans un dossier temporaire vide et
+vérifie qu'aucun fichier (base, sel) n'y a été créé par l'import.
+
+Usage : python -m benchmarks.bench_import [N] [--json FICHIER]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.commun import RACINE, ecrire_json, resume
+
+SONDE = ("import sys, time; t0 = time.perf_counter(); import wattcheck.core; "
+         "print(time.perf_counter() - t0, *[m for m in ('streamlit', 'pandas', 'numpy') if m in sys.modules])")
+
+
+def _une(dossier):
+    env = dict(os.environ, PYTHONPATH=RACINE, PYTHONDONTWRITEBYTECODE="1")
+    t0 = time.perf_counter()
+    sortie = subprocess.run([sys.executable, "-c", SONDE], cwd=dossier, env=env, capture_output=True, text=True, check=True).stdout.split()
+    return time.perf_counter() - t0, float(sortie[0]), sortie[1:]
+
+
+def mesurer(n=10):
+    with tempfile.TemporaryDirectory() as d:
+        mesures = [_une(d) for _ in range(n)]
+        crees = os.listdir(d)
+    return {"processus": resume([m[0] for m in mesures]), "import_core": resume([m[1] for m in mesures]),
+            "modules_lourds": sorted({x for m in mesures for x in m[2]}), "fichiers_crees": crees}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.bench_import")
+    ap.add_argument("n", nargs="?", type=int, default=10); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    r = mesurer(a.n)
+    print(f"N={a.n}")
+    print(f"processus complet  : médiane {r['processus']['p50_ms']:.0f} ms")
+    print(f"import wattcheck.core : médiane {r['import_core']['p50_ms']:.1f} ms, max {r['import_core']['max_ms']:.1f} ms")
+    print(f"modules lourds chargés : {', '.join(r['modules_lourds']) or 'aucun'}")
+    print(f"fichiers créés à l'import : {', '.join(r['fichiers_crees']) or 'aucun'}")
+    if a.json: ecrire_json(a.json, "import", vars(a), r)
+    return 0 if not r["modules_lourds"] and not r["fichiers_crees"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Benchmark : temps d'exécution du script Streamlit (un rerun complet) via AppTest.
+
+Mesure l'écran de connexion, le tableau de bord d'un compte (premier rendu
+puis rerun avec le cache de session chaud) et le tableau de bord admin.
+Les comptes « benchN » viennent de benchmarks.donnees.
+
+Usage : python -m benchmarks.bench_page [BASE] [--n 20] [--generer USERS,RECHARGES] [--json FICHIER]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_db import comptes_bench
+from benchmarks.commun import RACINE, afficher, ecrire_json, resume
+from benchmarks.donnees import generer
+from wattcheck import config, core
+
+PAGE = os.path.join(RACINE, "Watt_Check.py")
+
+
+def _rendu(at):
+    t0 = time.perf_counter(); at.run(); d = time.perf_counter() - t0
+    if at.exception: raise RuntimeError(at.exception[0].value)
+    return d
+
+
+def _session(user=None):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(PAGE, default_timeout=120)
+    if user: at.session_state["user"] = user
+    return at
+
+
+def mesurer(base, n=20, seed=0):
+    core.configurer(base, base + ".salt"); core.initialiser()
+    config.BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(base)), "backups")
+    config.EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(base)), "exports")
+    premier, dernier = comptes_bench(core.get_pool())
+    rng = random.Random(seed)
+    premier_rendu = _rendu(_session())  # imports et caches de processus inclus
+    connexion = [_rendu(_session()) for _ in range(n)]
+    froid, chaud = [], []
+    for _ in range(n):
+        at = _session(core.charger_utilisateur(rng.randint(premier, dernier))['user'])
+        froid.append(_rendu(at)); chaud.append(_rendu(at))
+    with core.db_lecture() as conn: adm = dict(conn.execute("SELECT * FROM users WHERE username='admin'").fetchone())
+    admin = [_rendu(_session(adm)) for _ in range(max(1, n // 4))]
+    return {"premier_rendu_ms": premier_rendu * 1000,
+            "latences": {"connexion": resume(connexion), "tableau_de_bord[froid]": resume(froid),
+                         "tableau_de_bord[chaud]": resume(chaud), "tableau_de_bord[admin]": resume(admin)}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.bench_page")
+    ap.add_argument("base", nargs="?"); ap.add_argument("--n", type=int, default=20)
+    ap.add_argument("--generer", default="2000,200000", help="USERS,RECHARGES si BASE est omise"); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = a.base
+        if not base:
+            u, h = map(int, a.generer.split(","))
+            base = os.path.join(tmp, "bench.db"); generer(base, u, h, nb_licences=u // 5, log=lambda *_: None)
+        r = mesurer(base, a.n)
+        core.get_pool().fermer()
+    print(f"premier rendu : {r['premier_rendu_ms']:.0f} ms")
+    for nom, l in r["latences"].items(): afficher(nom, l)
+    if a.json: ecrire_json(a.json, "page", vars(a), r)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Benchmark : boucle calcul_kwh (Decimal) contre calcul_kwh_batch (numpy), plus latences unitaires.
+
+Usage : python -m benchmarks.bench_tarifs [N] [--json FICHIER]
+"""
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.commun import afficher, chronometrer, ecrire_json
+from wattcheck.tarifs import calcul_kwh, determiner_cat, get_tranches_decimal
+from wattcheck.tarifs_batch import TOLERANCE_KWH, calcul_kwh_batch
+
+
+def generer(n, seed=0):
+    rng = np.random.default_rng(seed)
+    montants = rng.choice(np.arange(500, 100001, 500), n).astype(np.float64)
+    cumuls = rng.uniform(0, 900, n).round(1)
+    cats = rng.choice(list(get_tranches_decimal()), n)
+    return montants, cumuls, cats
+
+
+def mesurer(n=100_000, n_micro=2000):
+    montants, cumuls, cats = generer(n)
+    m, c, k = montants.tolist(), cumuls.tolist(), cats.tolist()
+
+    t0 = time.perf_counter()
+    ref = [calcul_kwh(a, b, cat) for a, b, cat in zip(m, c, k)]
+    t_boucle = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    kwh, tva, prix = calcul_kwh_batch(montants, cumuls, cats)
+    t_batch = time.perf_counter() - t0
+
+    ecart = max(abs(float(q) - kwh[i]) for i, (q, _, _) in enumerate(ref))
+    diff_tva = sum(t != tva[i] for i, (_, t, _) in enumerate(ref))
+
+    # Latences unitaires (un appel = une saisie dans l'Oracle)
+    it = itertools.count()
+    def un_calcul(): i = next(it) % n; calcul_kwh(m[i], c[i], k[i])
+    micro = {"calcul_kwh": chronometrer(un_calcul, n_micro),
+             "determiner_cat": chronometrer(lambda: determiner_cat(c[next(it) % n] / 30), n_micro)}
+    for taille in (1, 100, 10_000):
+        micro[f"calcul_kwh_batch[{taille}]"] = chronometrer(lambda: calcul_kwh_batch(montants[:taille], cumuls[:taille], cats[:taille]), max(20, n_micro // 10))
+    return {"n": n, "boucle_s": t_boucle, "batch_s": t_batch, "boucle_par_s": n / t_boucle, "batch_par_s": n / t_batch,
+            "acceleration": t_boucle / t_batch, "ecart_max_kwh": ecart, "tva_divergentes": int(diff_tva),
+            "ok": bool(ecart <= TOLERANCE_KWH and diff_tva == 0), "latences": micro}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.bench_tarifs")
+    ap.add_argument("n", nargs="?", type=int, default=100_000); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    r = mesurer(a.n)
+    print(f"N={r['n']}")
+    print(f"boucle calcul_kwh : {r['boucle_s']:.3f} s ({r['boucle_par_s']:,.0f} calculs/s)")
+    print(f"calcul_kwh_batch  : {r['batch_s']:.4f} s ({r['batch_par_s']:,.0f} calculs/s)")
+    print(f"accélération      : x{r['acceleration']:.0f}")
+    print(f"écart max kWh     : {r['ecart_max_kwh']:.2e} (tolérance {TOLERANCE_KWH:.0e}), TVA divergentes : {r['tva_divergentes']}")
+    for nom, l in r["latences"].items(): afficher(nom, l)
+    if a.json: ecrire_json(a.json, "tarifs", vars(a), r)
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
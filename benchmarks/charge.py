@@ -0,0 +1,98 @@
+"""Générateur de charge : sessions concurrentes (threads) sur le noyau et le pool.
+
+Chaque thread enchaîne des sessions : connexion, chargement du tableau de
+bord, historique, puis avec une probabilité donnée une recharge (écriture)
+ou une consultation du cockpit admin. Les latences sont relevées par
+opération, avec le débit, les erreurs et l'attente du verrou d'écriture.
+
+Usage : python -m benchmarks.charge [BASE] [--threads 16] [--duree 30] [--ecriture 0.2]
+        [--admin 0.02] [--pause 0] [--generer USERS,RECHARGES] [--json FICHIER]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.bench_db import comptes_bench
+from benchmarks.commun import afficher, ecrire_json, resume
+from benchmarks.donnees import MOT_DE_PASSE, generer
+from wattcheck import admin, core
+
+
+def _session(rng, premier, dernier, p_ecriture, p_admin, mesurer):
+    uid = rng.randint(premier, dernier)
+    mesurer("login_user", core.login_user, f"bench{uid}", MOT_DE_PASSE)
+    d = mesurer("charger_utilisateur", core.charger_utilisateur, uid)
+    mesurer("lire_historique", core.lire_historique, uid, 3)
+    if rng.random() < p_ecriture:
+        mesurer("recharger", core.recharger, uid, rng.choice((2000, 5000, 10000)), "CHARGE", d['mois'])
+        mesurer("charger_utilisateur", core.charger_utilisateur, uid)
+    if rng.random() < p_admin:
+        with core.db_lecture() as conn:
+            mesurer("admin.kpis", admin.kpis, conn)
+            mesurer("admin.page_users", admin.page_users, conn)
+
+
+def lancer(base, threads=16, duree=30.0, p_ecriture=0.2, p_admin=0.02, pause=0.0, seed=0):
+    core.configurer(base, base + ".salt"); core.initialiser()
+    premier, dernier = comptes_bench(core.get_pool())
+    durees = defaultdict(list); erreurs = Counter(); sessions = [0] * threads
+    fin = time.perf_counter() + duree
+    depart = threading.Barrier(threads)
+
+    def travailleur(i):
+        rng = random.Random(seed * 1000 + i); local = defaultdict(list)
+
+        def mesurer(nom, fn, *a):
+            t0 = time.perf_counter()
+            try: return fn(*a)
+            finally: local[nom].append(time.perf_counter() - t0)
+
+        depart.wait()
+        while time.perf_counter() < fin:
+            try: _session(rng, premier, dernier, p_ecriture, p_admin, mesurer); sessions[i] += 1
+            except Exception as e: erreurs[type(e).__name__ + ": " + str(e)[:80]] += 1
+            if pause: time.sleep(rng.expovariate(1 / pause))
+        for nom, l in local.items(): durees[nom].extend(l)  # list.extend est atomique sous le GIL
+
+    ts = [threading.Thread(target=travailleur, args=(i,), name=f"charge-{i}") for i in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts: t.start()
+    for t in ts: t.join()
+    ecoule = time.perf_counter() - t0
+    ops = sum(len(l) for l in durees.values())
+    return {"duree_s": ecoule, "sessions": sum(sessions), "sessions_par_s": sum(sessions) / ecoule, "operations": ops,
+            "operations_par_s": ops / ecoule, "ecritures_par_s": len(durees["recharger"]) / ecoule,
+            "erreurs": dict(erreurs), "latences": {nom: resume(l) for nom, l in sorted(durees.items())}, "pool": core.get_pool().stats()}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.charge")
+    ap.add_argument("base", nargs="?"); ap.add_argument("--threads", type=int, default=16); ap.add_argument("--duree", type=float, default=30)
+    ap.add_argument("--ecriture", type=float, default=0.2); ap.add_argument("--admin", type=float, default=0.02)
+    ap.add_argument("--pause", type=float, default=0.0, help="temps de réflexion moyen (s) entre deux sessions")
+    ap.add_argument("--generer", default="2000,200000", help="USERS,RECHARGES si BASE est omise"); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = a.base
+        if not base:
+            u, h = map(int, a.generer.split(","))
+            base = os.path.join(tmp, "bench.db"); generer(base, u, h, nb_licences=u // 5, log=lambda *_: None)
+        r = lancer(base, a.threads, a.duree, a.ecriture, a.admin, a.pause)
+        core.get_pool().fermer()
+    print(f"{a.threads} threads, {r['duree_s']:.1f} s : {r['sessions']:,} sessions ({r['sessions_par_s']:,.0f}/s), "
+          f"{r['operations_par_s']:,.0f} op/s, {r['ecritures_par_s']:,.0f} écritures/s, {sum(r['erreurs'].values())} erreurs")
+    for nom, l in r["latences"].items(): afficher(nom, l)
+    p = r["pool"]
+    print(f"verrou d'écriture : attente moy {p['attente_ecriture']['moy_ms']:.3f} ms (max {p['attente_ecriture']['max_ms']:.1f}), "
+          f"tenue moy {p['tenue_ecriture']['moy_ms']:.3f} ms")
+    if a.json: ecrire_json(a.json, "charge", vars(a), r)
+    return 1 if r["erreurs"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
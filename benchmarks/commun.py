@@ -0,0 +1,58 @@
+"""Outils partagés des benchmarks : percentiles, métadonnées d'exécution et sortie JSON."""
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 90, 95, 99)
+
+
+def resume(durees):
+    """Durées (s) -> {n, moy_ms, p50_ms, p90_ms, p95_ms, p99_ms, max_ms}."""
+    d = sorted(durees); n = len(d)
+    if not n: return {"n": 0}
+    r = {"n": n, "moy_ms": sum(d) / n * 1000}
+    for p in PERCENTILES: r[f"p{p}_ms"] = d[min(n - 1, int(n * p / 100))] * 1000
+    r["max_ms"] = d[-1] * 1000
+    return r
+
+
+def sel(base):
+    """Fichier de sel d'une base de test : à côté du fichier SQLite, ou dans le dossier temporaire pour une URL."""
+    return os.path.join(tempfile.gettempdir(), "wattcheck_bench.salt") if "://" in base else base + ".salt"
+
+
+def chronometrer(fn, n, prechauffe=3):
+    """Appelle `fn()` n fois (après `prechauffe` appels ignorés) et résume les latences."""
+    for _ in range(prechauffe): fn()
+    durees = []
+    for _ in range(n):
+        t0 = time.perf_counter(); fn(); durees.append(time.perf_counter() - t0)
+    return resume(durees)
+
+
+def meta():
+    try: rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RACINE, capture_output=True, text=True).stdout.strip() or None
+    except OSError: rev = None
+    return {"date": datetime.now().isoformat(timespec="seconds"), "commit": rev, "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version, "plateforme": platform.platform(), "cpus": os.cpu_count()}
+
+
+def ecrire_json(chemin, nom, parametres, resultats):
+    """Écrit {benchmark, meta, parametres, resultats} dans `chemin` ('-' = stdout)."""
+    doc = {"benchmark": nom, "meta": meta(), "parametres": parametres, "resultats": resultats}
+    if chemin == "-": json.dump(doc, sys.stdout, indent=2, ensure_ascii=False); print()
+    else:
+        with open(chemin, "w", encoding="utf-8") as f: json.dump(doc, f, indent=2, ensure_ascii=False)
+    return doc
+
+
+def afficher(nom, r):
+    if "p50_ms" in r:
+        print(f"{nom:<32} n={r['n']:<6} moy {r['moy_ms']:8.3f}  p50 {r['p50_ms']:8.3f}  p95 {r['p95_ms']:8.3f}  p99 {r['p99_ms']:8.3f}  max {r['max_ms']:8.3f} ms")
@@ -0,0 +1,54 @@
+"""Compare deux résultats JSON de benchmarks et signale les régressions.
+
+Sont comparées les mesures dont la clé finit par « _ms » ou « _s » (plus bas
+= mieux) et « _par_s » (plus haut = mieux), hors maxima trop bruités. Code de
+sortie 1 si une mesure se dégrade de plus de --seuil pour cent.
+
+Usage : python -m benchmarks.comparer AVANT.json APRES.json [--seuil 10] [--tout]
+"""
+import argparse
+import json
+import sys
+
+IGNORES = ("pool", "meta", "parametres", "duree_s", "max_ms")
+
+
+def aplatir(d, prefixe=""):
+    for k, v in d.items():
+        if k in IGNORES: continue
+        cle = f"{prefixe}{k}"
+        if isinstance(v, dict): yield from aplatir(v, cle + ".")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool) and (k.endswith("_ms") or k.endswith("_s")): yield cle, float(v)
+
+
+def comparer(avant, apres, seuil=10.0):
+    """Retourne [(mesure, avant, après, variation %, régression)] pour les mesures communes."""
+    a = dict(aplatir(avant.get("resultats", avant))); b = dict(aplatir(apres.get("resultats", apres)))
+    lignes = []
+    for cle in sorted(a.keys() & b.keys()):
+        va, vb = a[cle], b[cle]
+        if not va: continue
+        var = (vb - va) / va * 100
+        pire = -var if cle.endswith("_par_s") else var
+        lignes.append((cle, va, vb, var, pire > seuil))
+    return lignes
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.comparer")
+    ap.add_argument("avant"); ap.add_argument("apres"); ap.add_argument("--seuil", type=float, default=10.0)
+    ap.add_argument("--tout", action="store_true", help="afficher aussi les mesures stables")
+    a = ap.parse_args(argv)
+    with open(a.avant, encoding="utf-8") as f: avant = json.load(f)
+    with open(a.apres, encoding="utf-8") as f: apres = json.load(f)
+    lignes = comparer(avant, apres, a.seuil)
+    for cle, va, vb, var, regression in lignes:
+        if a.tout or abs(var) > a.seuil:
+            print(f"{'RÉGRESSION' if regression else '':<10} {cle:<60} {va:12.3f} -> {vb:12.3f}  ({var:+.1f} %)")
+    n = sum(l[4] for l in lignes)
+    print(f"{len(lignes)} mesures comparées, {n} régression(s) au-delà de {a.seuil:g} %")
+    return 1 if n else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Test de stress des recharges concurrentes : aucune mise à jour perdue.
+
+P processus × T threads enchaînent des recharges sur quelques comptes (forte
+contention), chacun avec son propre pool : les threads d'un processus se
+partagent le verrou d'écriture, les processus le verrou de fichier SQLite.
+Toutes les recharges visent un mois témoin vide (MOIS). À la fin, pour chaque
+compte, etats_mensuels doit valoir la somme des kWh insérés, chaque
+cumul_apres doit prolonger le précédent et la re-tarification séquentielle
+doit redonner les mêmes kWh.
+
+--ancien rejoue l'ancien chemin (cumul lu, tarifé puis écrit par INSERT OR
+REPLACE hors transaction) pour comparaison : il perd des mises à jour.
+
+`base` peut être une URL postgresql:// (base vide ou déjà migrée).
+
+Usage : python -m benchmarks.concurrence [--processus 4] [--threads 4] [--recharges 200]
+        [--comptes 4] [--ancien] [--json FICHIER]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.commun import afficher, ecrire_json, resume, sel
+from wattcheck import core
+from wattcheck.tarifs import calcul_kwh, determiner_cat
+
+MOIS = "1999-12"
+MONTANTS = (1000, 2000, 5000, 10000)
+
+
+def _ancien(uid, montant, token, mois):
+    # Chemin d'avant l'UPSERT : le cumul lu peut être périmé au moment d'écrire
+    cumul, conso = core.etat_compteur(uid, mois)
+    kwh, _, _ = calcul_kwh(montant, cumul, determiner_cat(conso or 0))
+    with core.db_connection() as conn:
+        conn.execute("INSERT INTO etats_mensuels VALUES (?, ?, ?) ON CONFLICT (user_id, mois) DO UPDATE SET cumul = excluded.cumul",
+                     (uid, mois, cumul + float(kwh)))
+        conn.execute("INSERT INTO historique (user_id, date, montant, kwh, token_ref, cumul_apres, ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (uid, "01/12 00:00", montant, float(kwh), core.ref_token(token), cumul + float(kwh), int(time.time())))
+        conn.commit()
+
+
+def _processus(base, uids, threads, n, token, ancien, seed):
+    core.configurer(base, sel(base))
+    fn = _ancien if ancien else core.recharger
+    durees = []; erreurs = Counter()
+
+    def travailleur(i):
+        rng = random.Random(seed * 1000 + i); local = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            try: fn(rng.choice(uids), rng.choice(MONTANTS), token, MOIS)
+            except Exception as e: erreurs[type(e).__name__ + ": " + str(e)[:80]] += 1
+            local.append(time.perf_counter() - t0)
+        durees.extend(local)
+
+    ts = [threading.Thread(target=travailleur, args=(i,)) for i in range(threads)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    stats = core.get_pool().stats(); core.get_pool().fermer()
+    return durees, dict(erreurs), stats["tenue_ecriture"]
+
+
+def preparer(base, comptes):
+    """Crée `comptes` comptes avec profil (tranche sociale à 3 kWh/jour). Retourne leurs ids."""
+    core.configurer(base, sel(base)); core.initialiser()
+    uids = []
+    with core.db_connection() as conn:
+        for i in range(comptes):
+            uid = conn.execute("INSERT INTO users (username, password, is_pro, created_at) VALUES (?, ?, 0, ?) RETURNING id",
+                               (f"stress{os.getpid()}_{i}_{random.getrandbits(32)}", "x", "2026-01-01T00:00:00")).fetchone()[0]
+            conn.execute("INSERT INTO profils (user_id, conso_jour, puissance_w) VALUES (?, ?, ?)", (uid, 3.0, 500))
+            uids.append(uid)
+        conn.commit()
+    return uids
+
+
+def verifier(uids, token):
+    """Compare etats_mensuels, la chaîne des cumul_apres et une re-tarification séquentielle."""
+    ref = core.ref_token(token); r = {"recharges": 0, "perdues_kwh": 0.0, "comptes_incoherents": 0, "chaines_rompues": 0, "kwh_differents": 0}
+    with core.db_lecture() as conn:
+        for uid in uids:
+            rows = conn.execute("SELECT montant, kwh, cumul_apres FROM historique WHERE user_id=? AND token_ref=? ORDER BY id", (uid, ref)).fetchall()
+            em = conn.execute("SELECT cumul FROM etats_mensuels WHERE user_id=? AND mois=?", (uid, MOIS)).fetchone()
+            total = sum(x['kwh'] for x in rows); cumul = em['cumul'] if em else 0.0
+            r["recharges"] += len(rows); r["perdues_kwh"] += total - cumul
+            if abs(total - cumul) > 1e-6: r["comptes_incoherents"] += 1
+            attendu = 0.0
+            for x in rows:
+                kwh = float(calcul_kwh(x['montant'], attendu, determiner_cat(3.0))[0])
+                if abs(kwh - x['kwh']) > 1e-6: r["kwh_differents"] += 1
+                if abs(attendu + x['kwh'] - x['cumul_apres']) > 1e-6: r["chaines_rompues"] += 1
+                attendu = x['cumul_apres']
+    return r
+
+
+def lancer(base, processus=4, threads=4, recharges=200, comptes=4, ancien=False, seed=0):
+    uids = preparer(base, comptes); core.get_pool().fermer()
+    token = f"STRESS-{os.getpid()}-{seed}"
+    ctx = multiprocessing.get_context("spawn")
+    t0 = time.perf_counter()
+    with ctx.Pool(processus) as p:
+        res = p.starmap(_processus, [(base, uids, threads, recharges, token, ancien, seed * 100 + i) for i in range(processus)])
+    ecoule = time.perf_counter() - t0
+    durees = [d for r in res for d in r[0]]; erreurs = Counter()
+    for r in res: erreurs.update(r[1])
+    tenue = [r[2] for r in res]
+    n_tenue = sum(t["n"] for t in tenue)
+    core.configurer(base, sel(base))
+    v = verifier(uids, token); core.get_pool().fermer()
+    return {"duree_s": ecoule, "tentees": len(durees), "recharges_par_s": len(durees) / ecoule, "erreurs": dict(erreurs),
+            "verification": v, "latence": resume(durees),
+            "tenue_ecriture": {"n": n_tenue, "moy_ms": sum(t["total_s"] for t in tenue) / n_tenue * 1000 if n_tenue else 0.0,
+                               "max_ms": max((t["max_ms"] for t in tenue), default=0.0)}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.concurrence")
+    ap.add_argument("base", nargs="?"); ap.add_argument("--processus", type=int, default=4); ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--recharges", type=int, default=200, help="recharges par thread"); ap.add_argument("--comptes", type=int, default=4)
+    ap.add_argument("--ancien", action="store_true", help="ancien chemin lecture puis écriture, pour comparaison"); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        r = lancer(a.base or os.path.join(tmp, "stress.db"), a.processus, a.threads, a.recharges, a.comptes, a.ancien)
+    v = r["verification"]; t = r["tenue_ecriture"]
+    print(f"{a.processus} processus × {a.threads} threads, {a.comptes} comptes{' (ancien chemin)' if a.ancien else ''} : "
+          f"{r['tentees']:,} recharges en {r['duree_s']:.1f} s ({r['recharges_par_s']:,.0f}/s), {sum(r['erreurs'].values())} erreurs")
+    afficher("recharge", r["latence"])
+    print(f"verrou d'écriture tenu : moy {t['moy_ms']:.3f} ms, max {t['max_ms']:.1f} ms")
+    print(f"en base : {v['recharges']:,} recharges, {v['comptes_incoherents']} comptes incohérents ({v['perdues_kwh']:.1f} kWh perdus), "
+          f"{v['chaines_rompues']} cumul_apres rompus, {v['kwh_differents']} kWh mal tarifés")
+    if r["erreurs"]: print(r["erreurs"])
+    if a.json: ecrire_json(a.json, "concurrence", vars(a), r)
+    ok = not r["erreurs"] and v["recharges"] == r["tentees"] and not (v["comptes_incoherents"] or v["chaines_rompues"] or v["kwh_differents"])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Générateur de données synthétiques : utilisateurs, profils, appareils, historique et licences.
+
+Remplit une base (neuve ou existante, par ajout) à des volumes réalistes,
+par lots insérés via le pool (le verrou d'écriture est relâché entre deux
+lots). Les kWh de l'historique sont tarifés mois par mois avec le moteur
+vectorisé, dans l'ordre chronologique de chaque compteur ; etats_mensuels
+reçoit le cumul de fin de mois. Tous les comptes ont le mot de passe
+MOT_DE_PASSE.
+
+Usage : python -m benchmarks.donnees BASE [--users 100000] [--recharges 10000000]
+        [--licences 20000] [--appareils 4] [--mois 12] [--seed 0] [--json FICHIER]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.commun import ecrire_json
+from wattcheck import core
+from wattcheck.config import FORMAT_DATE_HISTO, FUSEAU
+from wattcheck.tarifs_batch import calcul_kwh_batch, determiner_cat_batch
+
+MOT_DE_PASSE = "bench"
+TAILLE_LOT = 50_000
+MONTANTS = np.array([1000, 2000, 2500, 3000, 5000, 7500, 10000, 15000, 20000, 25000, 50000], dtype=np.float64)
+P_MONTANTS = np.array([8, 14, 6, 10, 22, 5, 16, 7, 6, 4, 2], dtype=np.float64) / 100
+APPAREILS = [("Ampoule LED", 9), ("Ampoule Jaune", 75), ("Tube Néon", 36), ("Ventilateur", 70), ("Frigo Standard", 150),
+             ("Congélateur", 200), ("Clim 1 CV", 900), ("Chargeur Tél", 10), ("Laptop", 65), ("TV LED 32", 50),
+             ("Wifi", 15), ("Fer à repasser", 1200), ("Micro-ondes", 1000), ("Machine laver", 500)]
+P_APPAREILS = np.array([20, 8, 6, 14, 10, 4, 2, 12, 6, 8, 4, 2, 2, 2], dtype=np.float64) / 100
+PRENOMS = ["Jean", "Marie", "Paul", "Aïcha", "Emmanuel", "Brigitte", "Samuel", "Fatou", "Serge", "Nadège"]
+NOMS = ["Mbarga", "Ngo", "Fotso", "Tchoua", "Abena", "Nkodo", "Bello", "Kamga", "Essomba", "Djoumessi"]
+
+
+def _lots(lignes, taille=TAILLE_LOT):
+    lot = []
+    for l in lignes:
+        lot.append(l)
+        if len(lot) >= taille: yield lot; lot = []
+    if lot: yield lot
+
+
+def _inserer(pool, sql, lignes):
+    n = 0
+    for lot in _lots(lignes):
+        with pool.ecriture() as conn: conn.executemany(sql, lot); conn.commit()
+        n += len(lot)
+    return n
+
+
+def _bornes_mois(n, maintenant):
+    """Les n derniers mois (mois courant inclus) : [(\"AAAA-MM\", debut_ts, fin_ts)], du plus ancien au plus récent."""
+    a, m = maintenant.year, maintenant.month
+    mois = []
+    for _ in range(n):
+        debut = FUSEAU.localize(datetime(a, m, 1)); fin = FUSEAU.localize(datetime(a + (m == 12), m % 12 + 1, 1))
+        mois.append((f"{a:04d}-{m:02d}", int(debut.timestamp()), min(int(fin.timestamp()), int(maintenant.timestamp()))))
+        a, m = (a, m - 1) if m > 1 else (a - 1, 12)
+    return mois[::-1]
+
+
+def utilisateurs(pool, rng, n, premier, maintenant, appareils):
+    """Insère users, profils et appareils ; retourne la conso_jour de chaque compte (kWh/j)."""
+    h = core.hash_pass(MOT_DE_PASSE)
+    anciennete = rng.uniform(0, 730, n); pro = rng.random(n) < 0.2; fin_pro = rng.uniform(-60, 365, n)
+    prenoms = rng.integers(0, len(PRENOMS), n); noms = rng.integers(0, len(NOMS), n); tel = rng.integers(0, 10**8, n)
+
+    def lignes():
+        for i in range(n):
+            uid = premier + i
+            yield (uid, f"bench{uid}", h, PRENOMS[prenoms[i]], NOMS[noms[i]], f"6{tel[i]:08d}", f"CM{uid:09d}", int(pro[i]),
+                   (maintenant + timedelta(days=float(fin_pro[i]))).isoformat() if pro[i] else None,
+                   (maintenant - timedelta(days=float(anciennete[i]))).isoformat())
+    _inserer(pool, """INSERT INTO users (id, username, password, first_name, last_name, phone, meter_number, is_pro, pro_expiration_date, created_at)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", lignes())
+    budgets = rng.choice(MONTANTS[3:9], n)
+    _inserer(pool, "INSERT OR IGNORE INTO profils (user_id, budget, conso_jour, label, puissance_w) VALUES (?, ?, 0, 'Bench', 0)",
+             ((premier + i, float(budgets[i])) for i in range(n)))
+
+    # Appareils : les triggers tiennent profils.puissance_w / conso_jour à jour
+    par_user = rng.poisson(appareils, n); total = int(par_user.sum())
+    proprio = np.repeat(np.arange(premier, premier + n), par_user)
+    types = rng.choice(len(APPAREILS), total, p=P_APPAREILS); qty = rng.integers(1, 5, total); heures = rng.integers(1, 13, total).astype(np.float64)
+    _inserer(pool, "INSERT INTO appareils (user_id, nom, watts, qty, heures) VALUES (?, ?, ?, ?, ?)",
+             ((int(proprio[k]), APPAREILS[types[k]][0], APPAREILS[types[k]][1], int(qty[k]), float(heures[k])) for k in range(total)))
+    watts = np.array([w for _, w in APPAREILS], dtype=np.float64)[types]
+    return np.bincount(proprio - premier, weights=watts * qty * heures / 1000.0, minlength=n), total
+
+
+def historique(pool, rng, n, premier, conso, nb_mois, maintenant):
+    """Insère n recharges réparties sur nb_mois et les cumuls mensuels ; retourne le nombre de mois-compteurs."""
+    nu = len(conso)
+    cats = determiner_cat_batch(conso)
+    activite = rng.lognormal(0, 1, nu); activite /= activite.sum()  # quelques gros consommateurs
+    decalage = int(FUSEAU.utcoffset(maintenant.replace(tzinfo=None)).total_seconds())
+    epoque = datetime(1970, 1, 1)
+    etats = 0
+    mois = _bornes_mois(nb_mois, maintenant)
+    for k, (mo, debut, fin) in enumerate(mois):
+        nm = n // nb_mois + (k < n % nb_mois)
+        if not nm: continue
+        users = rng.choice(nu, nm, p=activite)
+        ts = rng.integers(debut, fin, nm)
+        montants = rng.choice(MONTANTS, nm, p=P_MONTANTS)
+        # Cumul par compteur dans l'ordre chronologique : kWh achetés depuis le 1er du mois
+        ordre = np.lexsort((ts, users)); u = users[ordre]
+        nouveau = np.r_[True, u[1:] != u[:-1]]
+        cs = np.cumsum(montants[ordre]); cs -= np.maximum.accumulate(np.where(nouveau, cs - montants[ordre], 0))
+        apres = calcul_kwh_batch(cs, 0.0, cats[u])[0]
+        kwh = apres - np.where(nouveau, 0.0, np.r_[0.0, apres[:-1]])
+        fin_groupe = np.r_[nouveau[1:], True]
+        etats += _inserer(pool, "INSERT OR REPLACE INTO etats_mensuels (user_id, mois, cumul) VALUES (?, ?, ?)",
+                          ((int(premier + x), mo, float(c)) for x, c in zip(u[fin_groupe], apres[fin_groupe])))
+
+        chrono = np.argsort(ts[ordre], kind="stable")
+        cols = [x[chrono].tolist() for x in (premier + u, montants[ordre], kwh, rng.integers(0, 2**32, nm), apres, ts[ordre])]
+        minutes = {}
+
+        def lignes():
+            for uid, m, q, ref, c, t in zip(*cols):
+                d = minutes.get(t // 60)
+                if d is None: d = minutes[t // 60] = (epoque + timedelta(seconds=t // 60 * 60 + decalage)).strftime(FORMAT_DATE_HISTO)
+                yield (uid, d, m, q, f"REF-{ref:08x}", c, t)
+        _inserer(pool, "INSERT INTO historique (user_id, date, montant, kwh, token_ref, cumul_apres, ts) VALUES (?, ?, ?, ?, ?, ?, ?)", lignes())
+    return etats
+
+
+def licences(pool, rng, n, premier, nu, admin_id, maintenant):
+    codes = set()
+    while len(codes) < n: codes.update(f"PRO-{maintenant.year}-{x:08X}" for x in rng.integers(0, 2**32, n - len(codes)))
+    age = rng.uniform(0, 540, n); utilisee = rng.random(n) < 0.6; par = rng.integers(premier, premier + max(nu, 1), n)
+
+    def lignes():
+        for i, code in enumerate(codes):
+            cree = maintenant - timedelta(days=float(age[i]))
+            yield (code, admin_id, int(par[i]) if utilisee[i] and nu else None, cree.isoformat(),
+                   (cree + timedelta(days=float(age[i]) / 2)).isoformat() if utilisee[i] and nu else None, 365)
+    return _inserer(pool, "INSERT OR IGNORE INTO licences (code, created_by, used_by, created_at, used_at, duree_jours) VALUES (?, ?, ?, ?, ?, ?)", lignes())
+
+
+def generer(db_file, users=100_000, recharges=10_000_000, nb_licences=20_000, appareils=4, mois=12, seed=0, log=print):
+    """Remplit `db_file` et retourne {volumes, durees_s}."""
+    core.configurer(db_file, db_file + ".salt")
+    core.initialiser()
+    pool = core.get_pool(); rng = np.random.default_rng(seed)
+    maintenant = datetime.now(FUSEAU)
+    with pool.lecture() as conn:
+        premier = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
+        admin_id = conn.execute("SELECT id FROM users WHERE username='admin'").fetchone()[0]
+    durees = {}
+
+    t0 = time.perf_counter()
+    conso, nb_app = utilisateurs(pool, rng, users, premier, maintenant, appareils)
+    durees["users"] = time.perf_counter() - t0; log(f"users     : {users:,} (+{nb_app:,} appareils) en {durees['users']:.1f} s")
+
+    t0 = time.perf_counter()
+    etats = historique(pool, rng, recharges, premier, conso, mois, maintenant) if users else 0
+    durees["historique"] = time.perf_counter() - t0; log(f"historique: {recharges if users else 0:,} recharges, {etats:,} mois-compteurs en {durees['historique']:.1f} s")
+
+    t0 = time.perf_counter()
+    nl = licences(pool, rng, nb_licences, premier, users, admin_id, maintenant)
+    durees["licences"] = time.perf_counter() - t0; log(f"licences  : {nl:,} en {durees['licences']:.1f} s")
+
+    t0 = time.perf_counter()
+    with pool.ecriture() as conn: conn.execute("ANALYZE"); conn.commit()
+    durees["analyze"] = time.perf_counter() - t0
+    return {"volumes": {"users": users, "appareils": nb_app, "historique": recharges if users else 0, "etats_mensuels": etats, "licences": nl,
+                        "premier_id": premier, "dernier_id": premier + users - 1},
+            "durees_s": durees}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.donnees", description="Remplit une base WATT-CHECK de données synthétiques.")
+    ap.add_argument("base"); ap.add_argument("--users", type=int, default=100_000); ap.add_argument("--recharges", type=int, default=10_000_000)
+    ap.add_argument("--licences", type=int, default=20_000); ap.add_argument("--appareils", type=float, default=4)
+    ap.add_argument("--mois", type=int, default=12); ap.add_argument("--seed", type=int, default=0); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    r = generer(a.base, a.users, a.recharges, a.licences, a.appareils, a.mois, a.seed)
+    if a.json: ecrire_json(a.json, "donnees", vars(a), r)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Licences : débit de génération en masse et activation concurrente sans double emploi.
+
+Génération : `lots` lots de `taille` codes (gen_licences, une transaction par
+lot) contre la même quantité créée code par code (ancien gen_licence : une
+transaction par code), en codes/s.
+
+Activation : P processus × T threads parcourent chacun toute la liste des
+codes d'un lot, dans un ordre aléatoire, et tentent de les activer pour des
+comptes tirés au hasard : chaque code est disputé P × T fois. À la fin, chaque
+code doit être activé exactement une fois et le nombre de succès doit égaler
+le nombre de codes.
+
+--ancien rejoue l'ancienne activation (SELECT puis UPDATE non conditionnel)
+pour comparaison : entre processus, un même code peut être activé deux fois.
+
+`base` peut être une URL postgresql:// (base vide ou déjà migrée).
+
+Usage : python -m benchmarks.licences [--lots 10] [--taille 1000] [--processus 4] [--threads 4]
+        [--codes 500] [--comptes 50] [--ancien] [--json FICHIER]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from benchmarks.commun import afficher, ecrire_json, resume, sel
+from benchmarks.concurrence import preparer
+from wattcheck import core
+from wattcheck.config import FUSEAU
+
+
+def _gen_ancien(admin_id, j=365):
+    # Ancien gen_licence : une connexion et un commit par code
+    code = f"PRO-{datetime.now().year}-{secrets.token_hex(4).upper()}"
+    with core.db_connection() as conn:
+        conn.execute("INSERT INTO licences (code, created_by, created_at, duree_jours) VALUES (?, ?, ?, ?)", (code, admin_id, datetime.now().isoformat(), j))
+        conn.commit(); return code
+
+
+def _act_ancien(uid, code):
+    # Ancienne activation : le SELECT est hors transaction, deux processus peuvent y lire la même licence libre
+    with core.db_connection() as conn:
+        row = conn.execute("SELECT * FROM licences WHERE code=? AND used_by IS NULL", (code,)).fetchone()
+        if row:
+            fin = datetime.now(FUSEAU) + timedelta(days=row['duree_jours'])
+            conn.execute("UPDATE licences SET used_by=?, used_at=? WHERE code=?", (uid, datetime.now().isoformat(), code))
+            conn.execute("UPDATE users SET is_pro=1, pro_expiration_date=? WHERE id=?", (fin.isoformat(), uid))
+            conn.commit(); return True, fin.strftime("%d/%m/%Y")
+        return False, None
+
+
+def generation(lots=10, taille=1000):
+    """Codes/s en lots (gen_licences) et code par code (ancien chemin), sur la base configurée."""
+    durees = []
+    for _ in range(lots):
+        t0 = time.perf_counter(); core.gen_licences(1, {365: taille}); durees.append(time.perf_counter() - t0)
+    n_ancien = min(lots * taille, 2000)
+    t0 = time.perf_counter()
+    for _ in range(n_ancien): _gen_ancien(1)
+    t_ancien = time.perf_counter() - t0
+    return {"lots": {"codes": lots * taille, "codes_par_s": lots * taille / sum(durees), "latence_lot": resume(durees)},
+            "code_par_code": {"codes": n_ancien, "codes_par_s": n_ancien / t_ancien}}
+
+
+def _processus(base, codes, uids, threads, ancien, seed):
+    core.configurer(base, sel(base))
+    fn = _act_ancien if ancien else core.act_licence
+    durees = []; succes = Counter(); erreurs = Counter()
+
+    def travailleur(i):
+        rng = random.Random(seed * 1000 + i); ordre = list(codes); rng.shuffle(ordre); local = []
+        for code in ordre:
+            t0 = time.perf_counter()
+            try:
+                if fn(rng.choice(uids), code)[0]: succes[code] += 1
+            except Exception as e: erreurs[type(e).__name__ + ": " + str(e)[:80]] += 1
+            local.append(time.perf_counter() - t0)
+        durees.extend(local)
+
+    ts = [threading.Thread(target=travailleur, args=(i,)) for i in range(threads)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    core.get_pool().fermer()
+    return durees, dict(succes), dict(erreurs)
+
+
+def activation(base, processus=4, threads=4, codes=500, comptes=50, ancien=False, seed=0):
+    uids = preparer(base, comptes)
+    lot, liste = core.gen_licences(1, {365: codes}); core.get_pool().fermer()
+    ctx = multiprocessing.get_context("spawn")
+    t0 = time.perf_counter()
+    with ctx.Pool(processus) as p:
+        res = p.starmap(_processus, [(base, liste, uids, threads, ancien, seed * 100 + i) for i in range(processus)])
+    ecoule = time.perf_counter() - t0
+    durees = [d for r in res for d in r[0]]; succes = Counter(); erreurs = Counter()
+    for r in res: succes.update(r[1]); erreurs.update(r[2])
+    core.configurer(base, sel(base))
+    with core.db_lecture() as conn:
+        libres = conn.execute("SELECT COUNT(*) FROM licences WHERE lot=? AND used_by IS NULL", (lot,)).fetchone()[0]
+    core.get_pool().fermer()
+    return {"duree_s": ecoule, "tentatives": len(durees), "tentatives_par_s": len(durees) / ecoule, "erreurs": dict(erreurs),
+            "latence": resume(durees),
+            "verification": {"codes": codes, "succes": sum(succes.values()), "codes_actives": len(succes), "restees_libres": libres,
+                             "activees_plusieurs_fois": sum(1 for n in succes.values() if n > 1)}}
+
+
+def lancer(base, lots=10, taille=1000, processus=4, threads=4, codes=500, comptes=50, ancien=False):
+    core.configurer(base, sel(base)); core.initialiser()
+    r = {"generation": generation(lots, taille)}
+    r["activation"] = activation(base, processus, threads, codes, comptes, ancien)
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.licences")
+    ap.add_argument("base", nargs="?"); ap.add_argument("--lots", type=int, default=10); ap.add_argument("--taille", type=int, default=1000)
+    ap.add_argument("--processus", type=int, default=4); ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--codes", type=int, default=500); ap.add_argument("--comptes", type=int, default=50)
+    ap.add_argument("--ancien", action="store_true", help="ancienne activation SELECT puis UPDATE, pour comparaison"); ap.add_argument("--json")
+    a = ap.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        r = lancer(a.base or os.path.join(tmp, "licences.db"), a.lots, a.taille, a.processus, a.threads, a.codes, a.comptes, a.ancien)
+    g = r["generation"]; act = r["activation"]; v = act["verification"]
+    print(f"génération : {g['lots']['codes']:,} codes en lots de {a.taille} : {g['lots']['codes_par_s']:,.0f} codes/s ; "
+          f"code par code : {g['code_par_code']['codes_par_s']:,.0f} codes/s")
+    afficher(f"gen_licences[{a.taille}]", g["lots"]["latence_lot"])
+    print(f"activation{' (ancien chemin)' if a.ancien else ''} : {a.processus} processus × {a.threads} threads, {v['codes']} codes : "
+          f"{act['tentatives']:,} tentatives en {act['duree_s']:.1f} s ({act['tentatives_par_s']:,.0f}/s), {sum(act['erreurs'].values())} erreurs")
+    afficher("act_licence", act["latence"])
+    print(f"{v['succes']} succès pour {v['codes']} codes : {v['codes_actives']} activés, {v['restees_libres']} restés libres, "
+          f"{v['activees_plusieurs_fois']} activés plusieurs fois")
+    if act["erreurs"]: print(act["erreurs"])
+    if a.json: ecrire_json(a.json, "licences", vars(a), r)
+    ok = not act["erreurs"] and v["succes"] == v["codes_actives"] == v["codes"] and not v["restees_libres"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Noyau métier WATT-CHECK, importable sans Streamlit."""
@@ -0,0 +1,72 @@
+"""Requêtes du cockpit admin : KPI agrégés en SQL et grilles paginées par clé (keyset)."""
+import csv
+import io
+from datetime import datetime, timedelta
+
+PRIX_PRO = 5000  # FCFA / an
+TAILLE_PAGE = 50
+
+
+def kpis(conn):
+    row = conn.execute("SELECT COUNT(*) AS inscrits, COUNT(CASE WHEN is_pro = 1 THEN 1 END) AS pro FROM users WHERE username != 'admin'").fetchone()
+    return {"total_inscrits": row['inscrits'], "total_pro": row['pro'], "ca_estime": row['pro'] * PRIX_PRO}
+
+
+def _filtres_users(dialecte, recherche=None, pro=None, expire_sous_jours=None, cree_du=None, cree_au=None):
+    where = ["username != 'admin'"]; params = []
+    if recherche:
+        where.append("(" + " OR ".join(dialecte.contient.format(c) for c in ("username", "first_name", "last_name", "phone")) + ")")
+        params += [f"%{recherche}%"] * 4
+    if pro is not None: where.append("is_pro = ?"); params.append(1 if pro else 0)
+    if expire_sous_jours is not None:
+        now = datetime.now()
+        where.append("pro_expiration_date BETWEEN ? AND ?")
+        params += [now.isoformat(), (now + timedelta(days=expire_sous_jours)).isoformat()]
+    if cree_du: where.append("created_at >= ?"); params.append(cree_du.isoformat())
+    if cree_au: where.append("created_at < ?"); params.append((cree_au + timedelta(days=1)).isoformat())
+    return where, params
+
+
+def page_users(conn, apres_id=None, taille=TAILLE_PAGE, **filtres):
+    """Une page d'utilisateurs, du plus récent au plus ancien.
+
+    Retourne (lignes, curseur_suivant) ; curseur_suivant vaut None sur la dernière page.
+    """
+    where, params = _filtres_users(conn.dialecte, **filtres)
+    if apres_id is not None: where.append("id < ?"); params.append(apres_id)
+    rows = conn.execute(f"""SELECT id, username, first_name, last_name, phone, is_pro, pro_expiration_date, created_at
+                            FROM users WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?""", params + [taille + 1]).fetchall()
+    rows = [dict(r) for r in rows]
+    suivant = rows[taille - 1]['id'] if len(rows) > taille else None
+    return rows[:taille], suivant
+
+
+def page_licences(conn, apres=None, taille=TAILLE_PAGE, recherche=None, utilisee=None, lot=None):
+    """Une page de licences, de la plus récente à la plus ancienne (curseur = rowid)."""
+    where = ["1=1"]; params = []
+    if recherche: where.append(conn.dialecte.contient.format("code")); params.append(f"%{recherche}%")
+    if utilisee is not None: where.append("used_by IS NOT NULL" if utilisee else "used_by IS NULL")
+    if lot: where.append("lot = ?"); params.append(lot)
+    if apres is not None: where.append("rowid < ?"); params.append(apres)
+    rows = conn.execute(f"""SELECT rowid AS rid, code, lot, created_by, used_by, created_at, used_at, duree_jours
+                            FROM licences WHERE {' AND '.join(where)} ORDER BY rowid DESC LIMIT ?""", params + [taille + 1]).fetchall()
+    rows = [dict(r) for r in rows]
+    suivant = rows[taille - 1]['rid'] if len(rows) > taille else None
+    return rows[:taille], suivant
+
+
+def lots_licences(conn, limite=20):
+    """Derniers lots de licences générés : {lot, created_at, codes, libres, durees}."""
+    rows = conn.execute(f"""SELECT lot, MIN(created_at) AS created_at, COUNT(*) AS codes, COUNT(*) - COUNT(used_by) AS libres,
+                                   {conn.dialecte.concat.format("DISTINCT duree_jours")} AS durees
+                            FROM licences WHERE lot IS NOT NULL GROUP BY lot ORDER BY MAX(rowid) DESC LIMIT ?""", (limite,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def csv_lot(conn, lot):
+    """CSV (;) des codes d'un lot, écrit au fil du curseur (index licences(lot))."""
+    f = io.StringIO(); w = csv.writer(f, delimiter=";")
+    w.writerow(["code", "duree_jours", "created_at", "utilisee"])
+    w.writerows((r[0], r[1], r[2], int(r[3])) for r in conn.execute(
+        "SELECT code, duree_jours, created_at, used_by IS NOT NULL FROM licences WHERE lot=? ORDER BY rowid", (lot,)))
+    return f.getvalue()
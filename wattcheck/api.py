@@ -0,0 +1,258 @@
+"""API HTTP/JSON locale : tarification, enregistrement de recharges et historique.
+
+Pour les kiosques partenaires et la passerelle SMS, sans rerun Streamlit.
+La boucle asynchrone (Starlette/uvicorn) ne touche jamais la base : chaque
+requête est traitée par le noyau dans un thread, au plus `max_lecteurs + 2`
+à la fois, sur le même pool SQLite que la page.
+
+Authentification : « Authorization: Bearer <jeton> », jeton obtenu par
+POST /v1/jetons (identifiant + mot de passe). Un jeton admin peut agir pour
+un autre compte via « user_id ». Les corps POST acceptent un objet ou une
+liste d'objets (lot, MAX_LOT au plus ; une erreur par élément). POST /v1/tarif
+accepte « date » (AAAA-MM-JJ) pour tarifer selon la grille en vigueur ce jour-là.
+
+GET /v1/historique accepte « mois=N » (N derniers mois, mois courant compris) ;
+GET /v1/historique/mensuel donne les totaux par mois, recharges compactées
+comprises. GET /metrics expose les métriques du processus au format Prometheus.
+
+Plusieurs processus derrière le même port : --workers N (uvicorn). Ils se
+partagent la base (SQLite : verrou de fichier d'écriture ; ou URL
+postgresql://) ; /metrics ne reflète que le processus qui répond.
+
+Usage : python -m wattcheck.api [--host 127.0.0.1] [--port 8600] [--base FICHIER|URL] [--workers 1]
+"""
+import argparse
+import json
+import math
+import os
+import time
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from functools import partial
+
+import anyio
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from wattcheck import core, metriques, retention
+from wattcheck.tarifs import calcul_kwh, determiner_cat, grille
+
+VERSION = "1"
+MAX_LOT = 1000
+MONTANT_MIN, MONTANT_MAX = 500, 500_000  # bornes du formulaire Oracle
+HISTO_MAX = 100
+HISTO_GRATUIT = 3  # comme l'onglet historique hors PRO
+MOIS_MAX = 120
+
+_limiteur = None
+Requete = namedtuple("Requete", "u corps params jeton")  # u : ligne users du porteur du jeton
+
+
+class ErreurApi(Exception):
+    def __init__(self, statut, message):
+        super().__init__(message); self.statut = statut
+
+
+# --- 1. VALIDATION ---
+def _nombre(item, cle, defaut=None):
+    v = item.get(cle, defaut)
+    if v is None: return None
+    try: v = float(v)
+    except (TypeError, ValueError): raise ErreurApi(422, f"{cle} doit être numérique")
+    if not math.isfinite(v): raise ErreurApi(422, f"{cle} doit être fini")
+    return v
+
+
+def _montant(item):
+    m = _nombre(item, "montant")
+    if m is None: raise ErreurApi(422, "montant manquant")
+    if not MONTANT_MIN <= m <= MONTANT_MAX: raise ErreurApi(422, f"montant hors bornes [{MONTANT_MIN}, {MONTANT_MAX}]")
+    return m
+
+
+def _mois(params, defaut=1):
+    """Paramètre `mois` : nombre de mois jusqu'au mois courant compris (1 = ce mois)."""
+    try: n = int(params.get("mois", defaut))
+    except (TypeError, ValueError): raise ErreurApi(422, "mois doit être entier")
+    if not 1 <= n <= MOIS_MAX: raise ErreurApi(422, f"mois hors bornes [1, {MOIS_MAX}]")
+    return n
+
+
+def _grille(item):
+    """Grille tarifaire en vigueur à `date` (AAAA-MM-JJ), aujourd'hui par défaut."""
+    d = item.get("date")
+    if d is not None and not isinstance(d, str): raise ErreurApi(422, "date attendue au format AAAA-MM-JJ")
+    try: return grille(d)
+    except (TypeError, ValueError): raise ErreurApi(422, "date attendue au format AAAA-MM-JJ")
+    except LookupError as e: raise ErreurApi(422, str(e))
+
+
+def _cible(u, item):
+    """Compte visé : le porteur du jeton, ou `user_id` pour un admin."""
+    uid = item.get("user_id")
+    if uid is None: return u['id']
+    try: uid = int(uid)
+    except (TypeError, ValueError): raise ErreurApi(422, "user_id doit être entier")
+    if uid != u['id'] and not u['is_admin']: raise ErreurApi(403, "user_id réservé aux jetons admin")
+    return uid
+
+
+def _lot(corps, traiter):
+    """Objet -> résultat (erreur = statut HTTP) ; liste -> résultats, erreurs en ligne."""
+    if isinstance(corps, dict): return traiter(corps)
+    if not isinstance(corps, list) or not all(isinstance(x, dict) for x in corps): raise ErreurApi(400, "corps attendu : objet JSON ou liste d'objets")
+    if len(corps) > MAX_LOT: raise ErreurApi(413, f"lot limité à {MAX_LOT} éléments")
+    res = []
+    for item in corps:
+        try: res.append(traiter(item))
+        except ErreurApi as e: res.append({"erreur": str(e), "statut": e.statut})
+    return res
+
+
+# --- 2. TRAITEMENTS (synchrones, exécutés hors de la boucle) ---
+def _sante(r): return {"ok": True, "version": VERSION}
+
+
+def _creer_jeton(r):
+    c = r.corps
+    if not isinstance(c, dict) or not c.get("username") or not c.get("password"): raise ErreurApi(422, "username et password requis")
+    usr = core.login_user(c["username"], c["password"])
+    if not usr: raise ErreurApi(401, "Identifiants incorrects")
+    return 201, {"jeton": core.creer_jeton(usr['id'], c.get("libelle")), "user_id": usr['id']}
+
+
+def _revoquer_jeton(r): return {"revoque": core.revoquer_jeton(r.jeton)}
+
+
+def _categorie(r):
+    cj = _nombre(r.params, "conso_jour")
+    if cj is None or cj < 0: raise ErreurApi(422, "conso_jour (kWh/jour) requis")
+    return {"conso_jour": cj, "categorie": determiner_cat(cj)}
+
+
+def _tarif(r):
+    etats = {}
+
+    def etat(uid):
+        if uid not in etats: etats[uid] = core.etat_compteur(uid)
+        return etats[uid]
+
+    def traiter(item):
+        m = _montant(item); cumul = _nombre(item, "cumul"); cat = item.get("categorie"); cj = _nombre(item, "conso_jour")
+        g = _grille(item)
+        if cat is not None and (not isinstance(cat, str) or cat not in g.tranches): raise ErreurApi(422, f"categorie inconnue : {cat}")
+        if cumul is None or (cat is None and cj is None):
+            # Valeurs manquantes : état courant du compte visé
+            c0, cj0 = etat(_cible(r.u, item))
+            cumul = c0 if cumul is None else cumul
+            if cat is None and cj is None: cj = cj0 or 0.0
+        if cumul < 0: raise ErreurApi(422, "cumul négatif")
+        if cj is not None and cj < 0: raise ErreurApi(422, "conso_jour négative")
+        cat = cat or determiner_cat(cj)
+        kwh, tva, prix = calcul_kwh(m, cumul, cat, g.depuis)
+        return {"montant": m, "cumul": cumul, "categorie": cat, "kwh": float(kwh), "tva": tva, "prix_unitaire": float(prix), "cumul_apres": cumul + float(kwh),
+                "grille": g.depuis.isoformat()}
+    return _lot(r.corps, traiter)
+
+
+def _recharger(r):
+    def traiter(item):
+        uid = _cible(r.u, item); m = _montant(item); token = item.get("token") or None
+        try: kwh, tva, prix, new_c = core.recharger(uid, m, token)
+        except LookupError as e: raise ErreurApi(409, str(e))
+        return {"user_id": uid, "montant": m, "kwh": float(kwh), "tva": tva, "prix_unitaire": float(prix), "cumul_apres": new_c,
+                "ref": core.ref_token(token) if token else "N/A"}
+    return 201, _lot(r.corps, traiter)
+
+
+def _historique(r):
+    uid = _cible(r.u, r.params)
+    pro = bool(r.u['is_admin']) or core.check_pro_status(r.u)[0]
+    try: limite = int(r.params.get("limite", HISTO_MAX))
+    except ValueError: raise ErreurApi(422, "limite doit être entier")
+    limite = max(1, min(limite, HISTO_MAX if pro else HISTO_GRATUIT))
+    debut, fin = retention.periode(_mois(r.params)) if "mois" in r.params else (None, None)
+    return {"user_id": uid, "limite": limite, "debut": debut, "fin": fin, "recharges": core.lire_historique(uid, limite, debut, fin)}
+
+
+def _synthese(r):
+    uid = _cible(r.u, r.params)
+    n = _mois(r.params, 12)
+    return {"user_id": uid, "mois": n, "synthese": core.synthese_mensuelle(uid, n)}
+
+
+# --- 3. ROUTAGE ASYNCHRONE ---
+def _appel(fn, auth, entete, corps, params):
+    u = None; jeton = None
+    if auth:
+        if not entete or not entete.lower().startswith("bearer "): raise ErreurApi(401, "Jeton manquant (Authorization: Bearer ...)")
+        jeton = entete[7:].strip()
+        u = core.utilisateur_jeton(jeton)
+        if u is None: raise ErreurApi(401, "Jeton invalide ou révoqué")
+    res = fn(Requete(u, corps, params, jeton))
+    return res if isinstance(res, tuple) else (200, res)
+
+
+def _route(fn, auth=True):
+    async def point(req):
+        t0 = time.perf_counter()
+        try:
+            corps = None
+            if req.method == "POST":
+                try: corps = json.loads(await req.body() or b"null")
+                except ValueError: raise ErreurApi(400, "JSON invalide")
+            statut, res = await anyio.to_thread.run_sync(partial(_appel, fn, auth, req.headers.get("authorization"), corps, dict(req.query_params)), limiter=_limiteur)
+        except ErreurApi as e: statut, res = e.statut, {"erreur": str(e)}
+        route = f"{req.method} {req.url.path}"
+        metriques.observer("wattcheck_api_secondes", time.perf_counter() - t0, route=route)
+        metriques.incrementer("wattcheck_api_requetes_total", route=route, statut=statut)
+        return JSONResponse(res, status_code=statut)
+    return point
+
+
+async def _prometheus(req):
+    return PlainTextResponse(metriques.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def creer_app(db_file=None):
+    """Application ASGI ; `db_file` remplace la base de config (sinon WATTCHECK_DB)."""
+    @asynccontextmanager
+    async def cycle(app):
+        global _limiteur
+        if db_file: core.configurer(db_file)
+        await anyio.to_thread.run_sync(core.initialiser)
+        _limiteur = anyio.CapacityLimiter(core.get_pool().max_lecteurs + 2)
+        yield
+        core.get_pool().fermer()
+
+    return Starlette(lifespan=cycle, routes=[
+        Route("/v1/sante", _route(_sante, auth=False), methods=["GET"]),
+        Route("/v1/jetons", _route(_creer_jeton, auth=False), methods=["POST"]),
+        Route("/v1/jetons", _route(_revoquer_jeton), methods=["DELETE"]),
+        Route("/v1/categorie", _route(_categorie), methods=["GET"]),
+        Route("/v1/tarif", _route(_tarif), methods=["POST"]),
+        Route("/v1/recharges", _route(_recharger), methods=["POST"]),
+        Route("/v1/historique", _route(_historique), methods=["GET"]),
+        Route("/v1/historique/mensuel", _route(_synthese), methods=["GET"]),
+        Route("/metrics", _prometheus, methods=["GET"]),  # texte Prometheus, sans jeton (écoute locale)
+    ])
+
+
+def main(argv=None):
+    import uvicorn
+    ap = argparse.ArgumentParser(prog="python -m wattcheck.api")
+    ap.add_argument("--host", default="127.0.0.1"); ap.add_argument("--port", type=int, default=8600)
+    ap.add_argument("--base", help="fichier SQLite ou URL postgresql://"); ap.add_argument("--journal", action="store_true", help="journal d'accès uvicorn")
+    ap.add_argument("--workers", type=int, default=1, help="processus servant le même port")
+    a = ap.parse_args(argv)
+    journal = dict(access_log=a.journal, log_level="info" if a.journal else "warning")
+    if a.workers > 1:
+        # Chaque worker importe l'application : la base passe par l'environnement
+        if a.base: os.environ["WATTCHECK_DB"] = a.base
+        uvicorn.run("wattcheck.api:creer_app", factory=True, host=a.host, port=a.port, workers=a.workers, **journal)
+    else: uvicorn.run(creer_app(a.base), host=a.host, port=a.port, **journal)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Sauvegardes à chaud (API backup de SQLite), rotation planifiée et restauration atomique."""
+import glob
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+from wattcheck.db import VerrouFichier
+from wattcheck.migrations import migrer
+
+ENTETE_SQLITE = b"SQLite format 3\x00"
+TABLES_REQUISES = ("users", "profils", "etats_mensuels", "historique", "licences")
+
+
+def sauvegarder(db_file, dest):
+    """Copie cohérente de `db_file` vers `dest`, en un seul pas de l'API backup.
+
+    La source est lue via sa propre connexion en lecture seule, dans un seul
+    instantané de lecture : en WAL les écrivains ne sont pas bloqués. Une copie
+    par pas serait recommencée à chaque écriture d'une autre connexion et
+    n'aboutirait jamais sous charge continue. Le fichier final est autonome
+    (journal DELETE) et n'apparaît sous son nom qu'une fois complet.
+    """
+    part = f"{dest}.part"
+    src = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, timeout=30.0)
+    try:
+        dst = sqlite3.connect(part)
+        try:
+            src.backup(dst, pages=-1)  # un pas : pas de reprise quand la base change
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally: dst.close()
+    except Exception:
+        if os.path.exists(part): os.remove(part)
+        raise
+    finally: src.close()
+    os.replace(part, dest)
+    return dest
+
+
+def nom_instantane(dossier, prefixe="wattcheck"):
+    return os.path.join(dossier, f"{prefixe}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+
+
+def instantanes(dossier, prefixe="wattcheck"):
+    """Instantanés présents dans `dossier`, du plus récent au plus ancien."""
+    return sorted(glob.glob(os.path.join(dossier, f"{prefixe}_*.db")), reverse=True)
+
+
+def purger(dossier, garder, prefixe="wattcheck"):
+    for f in instantanes(dossier, prefixe)[garder:]: os.remove(f)
+
+
+class SauvegardeAuto(threading.Thread):
+    """Instantané toutes les `intervalle` secondes dans `dossier`, en gardant les `garder` derniers.
+
+    Avec plusieurs processus sur la même base, seul celui qui tient le verrou
+    du dossier (`meneur`) fait les instantanés planifiés ; un autre prend le
+    relais à l'échéance suivante s'il disparaît.
+    """
+
+    def __init__(self, db_file, dossier, intervalle=6 * 3600, garder=14):
+        super().__init__(name="wattcheck-sauvegarde", daemon=True)
+        self.db_file = db_file; self.dossier = dossier; self.intervalle = intervalle; self.garder = garder
+        self.derniere = None; self.erreur = None; self.meneur = False
+        self._arret = threading.Event(); self._verrou = VerrouFichier(os.path.join(dossier, ".sauvegarde.verrou"))
+
+    def instantane(self):
+        os.makedirs(self.dossier, exist_ok=True)
+        self.derniere = sauvegarder(self.db_file, nom_instantane(self.dossier))
+        purger(self.dossier, self.garder)
+        return self.derniere
+
+    def run(self):
+        while not self._arret.wait(self.intervalle):
+            if not self.meneur:
+                os.makedirs(self.dossier, exist_ok=True)
+                self.meneur = self._verrou.acquerir(0)  # gardé jusqu'à la fin du processus
+                if not self.meneur: continue
+            try: self.instantane(); self.erreur = None
+            except Exception as e: self.erreur = e
+
+    def arreter(self): self._arret.set()
+
+
+def valider(fichier):
+    """Lève ValueError si `fichier` n'est pas une base WATT-CHECK saine."""
+    with open(fichier, "rb") as f:
+        if f.read(16) != ENTETE_SQLITE: raise ValueError("Ce fichier n'est pas une base SQLite.")
+    conn = sqlite3.connect(fichier)
+    try:
+        res = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if res != "ok": raise ValueError(f"Base corrompue : {res}")
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        manquantes = [t for t in TABLES_REQUISES if t not in tables]
+        if manquantes: raise ValueError(f"Tables manquantes : {', '.join(manquantes)}")
+    except sqlite3.DatabaseError as e: raise ValueError(f"Base illisible : {e}")
+    finally: conn.close()
+
+
+def restaurer(pool, source, dossier_sauvegardes=None):
+    """Remplace la base du pool par `source` (chemin ou fichier ouvert en binaire).
+
+    La sauvegarde est copiée à côté de la base, validée (integrity_check,
+    tables), migrée au schéma courant, puis recopiée dans la base en place
+    (API backup) une fois les connexions du pool drainées, sous le verrou
+    d'écriture partagé entre processus. La base courante est d'abord
+    sauvegardée dans `dossier_sauvegardes` si fourni. Retourne ce chemin.
+    ValueError si le pool n'a pas de sauvegardes fichier (PostgreSQL).
+    """
+    if not pool.sauvegardes_fichier: raise ValueError("base PostgreSQL : restauration par pg_restore, côté serveur")
+    db_file = pool.db_file
+    fd, tmp = tempfile.mkstemp(prefix=".restauration_", suffix=".db", dir=os.path.dirname(os.path.abspath(db_file)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, "rb") as s: shutil.copyfileobj(s, f, 1 << 20)
+            else: shutil.copyfileobj(source, f, 1 << 20)
+            f.flush(); os.fsync(f.fileno())
+        valider(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            migrer(conn); conn.execute("PRAGMA journal_mode=DELETE")
+        finally: conn.close()
+
+        avant = None
+        if dossier_sauvegardes and os.path.exists(db_file):
+            os.makedirs(dossier_sauvegardes, exist_ok=True)
+            avant = sauvegarder(db_file, nom_instantane(dossier_sauvegardes, "avant_restauration"))
+        with pool.exclusif():
+            # Copie page à page dans le fichier en place plutôt qu'un os.replace : les autres
+            # processus gardent leurs connexions et voient la base restaurée, pas l'ancien inode
+            src = sqlite3.connect(tmp); dst = sqlite3.connect(db_file, timeout=pool.timeout)
+            try: src.backup(dst)
+            finally: dst.close(); src.close()
+        return avant
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
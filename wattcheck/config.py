@@ -0,0 +1,18 @@
+"""Constantes partagées par le noyau et l'interface (surchargeables par variables d'environnement)."""
+import os
+
+import pytz
+
+FUSEAU = pytz.timezone('Africa/Douala')
+FORMAT_DATE_HISTO = "%d/%m %H:%M"  # format d'affichage de historique.date (sans année)
+
+DB_FILE = os.environ.get("WATTCHECK_DB", "watt_check_saas.db")  # ou URL postgresql:// (wattcheck.db_postgres)
+SALT_FILE = os.environ.get("WATTCHECK_SALT", ".watt_salt")
+BACKUP_DIR = os.environ.get("WATTCHECK_BACKUPS", "backups")
+EXPORT_DIR = os.environ.get("WATTCHECK_EXPORTS", "exports")
+TARIFS_FILE = os.environ.get("WATTCHECK_TARIFS", os.path.join(os.path.dirname(__file__), "tarifs.json"))  # grilles datées (wattcheck.tarifs)
+
+# Instrumentation (wattcheck.metriques)
+SEUIL_LENT_MS = float(os.environ.get("WATTCHECK_SEUIL_LENT_MS", "100"))
+ECHANTILLON_LENT = float(os.environ.get("WATTCHECK_ECHANTILLON_LENT", "0.2"))  # part des requêtes lentes journalisées
+METRIQUES_FILE = os.environ.get("WATTCHECK_METRIQUES")  # fichier Prometheus (textfile collector), désactivé si absent
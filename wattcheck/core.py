@@ -0,0 +1,337 @@
+"""Noyau WATT-CHECK sans Streamlit : sécurité, stockage, comptes, licences et recharges.
+
+Aucun effet de bord à l'import : le sel, le pool et le schéma sont créés à la
+première utilisation (ou par initialiser()).
+"""
+import hashlib
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from wattcheck import config, inventaire, retention
+from wattcheck.config import FORMAT_DATE_HISTO, FUSEAU
+from wattcheck.db import ouvrir_pool
+from wattcheck.metriques import chronometre
+from wattcheck.migrations import migrer
+from wattcheck.tarifs import calcul_kwh, determiner_cat, registre
+
+MAX_LOT_LICENCES = 10_000
+DUREES_LICENCE = {30: "1 mois", 90: "3 mois", 180: "6 mois", 365: "1 an"}  # durées proposées (jours)
+ESSAIS_CODES = 5  # tirages en cas de collision de codes
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def configurer(db_file=None, salt_file=None):
+    """Change la base et/ou le fichier de sel (workers, tests) ; ferme le pool courant."""
+    global _POOL
+    with _POOL_LOCK:
+        if db_file: config.DB_FILE = db_file
+        if salt_file: config.SALT_FILE = salt_file
+        if _POOL is not None: _POOL.fermer(); _POOL = None
+    get_salt.cache_clear()
+
+
+# --- 1. SÉCURITÉ ---
+@lru_cache(maxsize=None)
+def get_salt():
+    try:
+        with open(config.SALT_FILE, "x") as f: f.write(secrets.token_hex(32))
+    except FileExistsError: pass
+    with open(config.SALT_FILE, "r") as f: return f.read().strip()
+
+
+def hash_pass(password): return hashlib.sha256(f"{get_salt()}{password}".encode()).hexdigest()
+
+
+def ref_token(t): return "REF-" + hashlib.sha256(f"{get_salt()}{t}".encode()).hexdigest()[:8]
+
+
+def _empreinte_jeton(j): return hashlib.sha256(f"{get_salt()}api:{j}".encode()).hexdigest()
+
+
+# --- 2. STOCKAGE ---
+def get_pool():
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None: _POOL = ouvrir_pool(config.DB_FILE)  # fichier SQLite ou URL postgresql://
+    return _POOL
+
+
+@contextmanager
+def db_connection():
+    # Chemin d'écriture unique (sérialisé)
+    with get_pool().ecriture() as conn: yield conn
+
+
+@contextmanager
+def db_lecture():
+    # Lecteurs parallèles (WAL), sans verrou global
+    with get_pool().lecture() as conn: yield conn
+
+
+def init_schema():
+    # Crée ou met à niveau la base (y compris une sauvegarde restaurée)
+    with db_connection() as conn: return migrer(conn)
+
+
+def create_admin():
+    h_pass = hash_pass("admin123")
+    with db_connection() as conn:
+        if not conn.execute("SELECT 1 FROM users WHERE username='admin'").fetchone():
+            conn.execute("INSERT INTO users (username, password, is_pro, is_admin, created_at) VALUES (?, ?, 1, 1, ?)", ("admin", h_pass, datetime.now().isoformat()))
+            conn.commit()
+
+
+def initialiser():
+    # Grilles tarifaires chargées (et validées) dès le démarrage, pas à la première recharge
+    init_schema(); create_admin(); registre()
+
+
+# --- 3. COMPTES ---
+@chronometre()
+def login_user(u, p):
+    h = hash_pass(p)
+    with db_lecture() as conn: return conn.execute("SELECT * FROM users WHERE username=? AND password=?", (u, h)).fetchone()
+
+
+@chronometre()
+def create_user(u, p):
+    h = hash_pass(p)
+    try:
+        with db_connection() as conn:
+            conn.execute("INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)", (u, h, datetime.now().isoformat()))
+            conn.commit(); return True
+    except Exception: return False
+
+
+@chronometre()
+def update_profile(uid, fname, lname, phone, meter):
+    with db_connection() as conn:
+        conn.execute("UPDATE users SET first_name=?, last_name=?, phone=?, meter_number=? WHERE id=?",
+                     (fname, lname, phone, meter, uid))
+        conn.commit()
+    return True
+
+
+@chronometre()
+def change_password(uid, old_p, new_p):
+    h_old = hash_pass(old_p)
+    with db_connection() as conn:
+        user = conn.execute("SELECT * FROM users WHERE id=? AND password=?", (uid, h_old)).fetchone()
+        if user:
+            h_new = hash_pass(new_p)
+            conn.execute("UPDATE users SET password=? WHERE id=?", (h_new, uid))
+            conn.commit()
+            return True
+    return False
+
+
+# --- 4. LICENCES ---
+def check_pro_status(user):
+    if not user['is_pro']: return False, None
+    if user['is_admin'] or not user['pro_expiration_date']: return True, "Illimité"
+    exp = datetime.fromisoformat(user['pro_expiration_date'])
+    if datetime.now(FUSEAU).replace(tzinfo=None) > exp.replace(tzinfo=None): return False, "Expiré"
+    return True, exp.strftime("%d/%m/%Y")
+
+
+@chronometre()
+def act_licence(uid, code):
+    """Active `code` pour `uid` : un seul UPDATE conditionnel (used_by IS NULL) sur la clé primaire.
+
+    Entre deux comptes qui saisissent le même code (threads ou processus), le
+    premier arrivé l'emporte, l'autre reçoit (False, None).
+    """
+    debut = datetime.now(FUSEAU)
+    with db_connection() as conn:
+        conn.execute(conn.dialecte.debut_ecriture)
+        row = conn.execute("UPDATE licences SET used_by=?, used_at=? WHERE code=? AND used_by IS NULL RETURNING duree_jours",
+                           (uid, datetime.now().isoformat(), code)).fetchone()
+        if row is None: return False, None
+        fin = debut + timedelta(days=row['duree_jours'])
+        conn.execute("UPDATE users SET is_pro=1, pro_expiration_date=? WHERE id=?", (fin.isoformat(), uid))
+        conn.commit()
+    return True, fin.strftime("%d/%m/%Y")
+
+
+def _code_licence(annee): return f"PRO-{annee}-{secrets.token_hex(4).upper()}"
+
+
+@chronometre()
+def gen_licences(admin_id, quantites, essais=ESSAIS_CODES):
+    """Crée un lot de codes, {duree_jours: nombre}, en une transaction (executemany).
+
+    Les codes tirés déjà pris (ou en double dans le lot) sont ignorés par
+    l'INSERT puis retirés, au plus `essais` fois. Retourne (lot, [codes]).
+    """
+    quantites = {int(j): int(n) for j, n in quantites.items() if n > 0}
+    total = sum(quantites.values())
+    if not 0 < total <= MAX_LOT_LICENCES: raise ValueError(f"de 1 à {MAX_LOT_LICENCES} codes par lot")
+    maintenant = datetime.now(); cree = maintenant.isoformat()
+    sql = "INSERT INTO licences (code, created_by, created_at, duree_jours, lot) VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING"
+    with db_connection() as conn:
+        conn.execute(conn.dialecte.debut_ecriture)
+        lot = f"L{maintenant:%Y%m%d-%H%M%S}-{secrets.token_hex(2).upper()}"
+        while conn.execute("SELECT 1 FROM licences WHERE lot=?", (lot,)).fetchone(): lot = lot[:-4] + secrets.token_hex(2).upper()
+        manque = quantites
+        for _ in range(essais):
+            n = sum(manque.values())
+            cur = conn.executemany(sql, ((_code_licence(maintenant.year), admin_id, cree, j, lot) for j, k in manque.items() for _ in range(k)))
+            if cur.rowcount == n: manque = {}; break
+            faits = dict(conn.execute("SELECT duree_jours, COUNT(*) FROM licences WHERE lot=? GROUP BY 1", (lot,)).fetchall())
+            manque = {j: k - faits.get(j, 0) for j, k in quantites.items() if k > faits.get(j, 0)}
+        if manque: raise RuntimeError(f"{sum(manque.values())} codes encore en collision après {essais} tirages")
+        codes = [r[0] for r in conn.execute("SELECT code FROM licences WHERE lot=? ORDER BY rowid", (lot,))]
+        conn.commit()
+    return lot, codes
+
+
+def gen_licence(admin_id, j=365): return gen_licences(admin_id, {j: 1})[1][0]
+
+
+# --- 5. DONNÉES UTILISATEUR & RECHARGES ---
+def mois_courant(): return datetime.now(FUSEAU).strftime("%Y-%m")
+
+
+@chronometre()
+def charger_utilisateur(uid, mois=None):
+    """Ligne users, profil, inventaire, cumul du mois et dernière recharge, en une lecture."""
+    mois = mois or mois_courant()
+    with db_lecture() as conn:
+        u = conn.execute("SELECT * FROM users WHERE id=?", (uid,)).fetchone()
+        prof = dict(conn.execute("SELECT * FROM profils WHERE user_id=?", (uid,)).fetchone() or {})
+        inv = inventaire.lister(conn, uid)
+        d = {'uid': uid, 'mois': mois, 'user': dict(u) if u else None, 'prof': prof, 'inv': inv}
+        d.update(_recharges(conn, uid, mois))
+    return d
+
+
+def _recharges(conn, uid, mois):
+    cumul = conn.execute("SELECT cumul FROM etats_mensuels WHERE user_id=? AND mois=?", (uid, mois)).fetchone()
+    derniere = conn.execute("SELECT date, montant, kwh, ts FROM historique WHERE user_id=? ORDER BY ts DESC NULLS LAST, id DESC LIMIT 1", (uid,)).fetchone()
+    return {'cumul': cumul['cumul'] if cumul else 0.0, 'derniere': dict(derniere) if derniere else None}
+
+
+@chronometre()
+def etat_recharges(uid, mois=None):
+    """Cumul du mois et dernière recharge : la part de charger_utilisateur que l'API ou un autre appareil modifie."""
+    with db_lecture() as conn: return _recharges(conn, uid, mois or mois_courant())
+
+
+@chronometre()
+def etat_compteur(uid, mois=None):
+    """(cumul du mois en kWh, conso_jour du profil ou None si pas d'audit)."""
+    with db_lecture() as conn:
+        cumul = conn.execute("SELECT cumul FROM etats_mensuels WHERE user_id=? AND mois=?", (uid, mois or mois_courant())).fetchone()
+        prof = conn.execute("SELECT conso_jour FROM profils WHERE user_id=?", (uid,)).fetchone()
+    return (cumul['cumul'] if cumul else 0.0), ((prof['conso_jour'] or 0.0) if prof else None)
+
+
+@chronometre()
+def recharger(uid, montant, token=None, mois=None):
+    """Enregistre une recharge en une transaction (BEGIN IMMEDIATE) : relit cumul et
+    conso, tarifie (grille en vigueur à l'instant de la recharge), incrémente
+    etats_mensuels (UPSERT) et insère l'historique.
+
+    Pas de mise à jour perdue entre écrivains concurrents (threads ou processus).
+    Retourne (kwh, tva, prix, nouveau_cumul). Lève LookupError si le compte n'a
+    pas encore de profil (audit non fait).
+    """
+    mois = mois or mois_courant()
+    # Tout ce qui ne dépend pas du cumul est préparé avant de prendre le verrou
+    ref = ref_token(token) if token else "N/A"
+    date = datetime.now(FUSEAU).strftime(FORMAT_DATE_HISTO); ts = int(time.time())
+    with db_connection() as conn:
+        conn.execute(conn.dialecte.debut_ecriture)
+        row = conn.execute("SELECT p.conso_jour, e.cumul FROM profils p LEFT JOIN etats_mensuels e ON e.user_id = p.user_id AND e.mois = ? "
+                           "WHERE p.user_id = ?", (mois, uid)).fetchone()
+        if row is None: raise LookupError("Profil absent : faire d'abord l'audit énergétique.")
+        kwh, tva, prix = calcul_kwh(montant, row['cumul'] or 0.0, determiner_cat(row['conso_jour'] or 0), ts)  # grille en vigueur à ts
+        new_c = float(conn.execute("INSERT INTO etats_mensuels (user_id, mois, cumul) VALUES (?, ?, ?) "
+                                   "ON CONFLICT (user_id, mois) DO UPDATE SET cumul = etats_mensuels.cumul + excluded.cumul RETURNING cumul",
+                                   (uid, mois, float(kwh))).fetchone()[0])  # RETURNING rend la valeur avant affinité REAL
+        conn.execute("INSERT INTO historique (user_id, date, montant, kwh, token_ref, cumul_apres, ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (uid, date, montant, float(kwh), ref, new_c, ts))
+        conn.commit()
+    return kwh, tva, prix, new_c
+
+
+@chronometre()
+def lire_historique(uid, limite, debut=None, fin=None):
+    """Recharges de `uid`, plus récentes d'abord (ts puis id) ; `debut` / `fin` : bornes epoch [debut, fin)."""
+    sql = "SELECT date, montant, kwh, token_ref, ts FROM historique WHERE user_id=?"; params = [uid]
+    if debut is not None: sql += " AND ts >= ?"; params.append(debut)
+    if fin is not None: sql += " AND ts < ?"; params.append(fin)
+    with db_lecture() as conn:
+        rows = conn.execute(sql + " ORDER BY ts DESC NULLS LAST, id DESC LIMIT ?", params + [limite]).fetchall()
+    return [dict(r) for r in rows]
+
+
+@chronometre()
+def synthese_mensuelle(uid, n_mois=12):
+    """Totaux par mois des `n_mois` derniers mois (mois courant compris), recharges compactées comprises.
+
+    Liste de {mois, nb, montant, kwh}, mois le plus récent d'abord.
+    """
+    premier = retention.decaler_mois(mois_courant(), 1 - n_mois)
+    debut = retention.bornes_mois(premier)[0]; dec = retention.decalage_utc()
+    with db_lecture() as conn:
+        rows = conn.execute(f"""SELECT mois, CAST(SUM(nb) AS INTEGER) AS nb, SUM(montant) AS montant, SUM(kwh) AS kwh FROM (
+                                    SELECT mois, nb, montant, kwh FROM historique_mensuel WHERE user_id = ? AND mois >= ?
+                                    UNION ALL
+                                    SELECT {conn.dialecte.mois_epoch.format("ts + ?")}, COUNT(*), SUM(montant), COALESCE(SUM(kwh), 0)
+                                    FROM historique WHERE user_id = ? AND ts >= ? GROUP BY 1) t
+                                GROUP BY mois ORDER BY mois DESC""", (uid, premier, dec, uid, debut)).fetchall()
+    return [dict(r) for r in rows]
+
+
+@chronometre()
+def ajouter_appareil(uid, nom, watts, qty, heures=5.0):
+    with db_connection() as conn:
+        aid = inventaire.ajouter(conn, uid, nom, watts, qty, heures); conn.commit()
+    return aid
+
+
+@chronometre()
+def supprimer_appareil(uid, aid):
+    with db_connection() as conn: inventaire.supprimer(conn, uid, aid); conn.commit()
+
+
+@chronometre()
+def maj_heures_appareils(uid, changements):
+    if not changements: return
+    with db_connection() as conn: inventaire.maj_heures(conn, uid, changements); conn.commit()
+
+
+# --- 6. JETONS D'API ---
+@chronometre()
+def creer_jeton(uid, libelle=None):
+    """Crée un jeton pour `uid` et le retourne en clair (une seule fois)."""
+    jeton = "wc_" + secrets.token_urlsafe(32)
+    with db_connection() as conn:
+        conn.execute("INSERT INTO api_jetons (empreinte, user_id, libelle, created_at) VALUES (?, ?, ?, ?)", (_empreinte_jeton(jeton), uid, libelle, datetime.now().isoformat()))
+        conn.commit()
+    return jeton
+
+
+@chronometre()
+def utilisateur_jeton(jeton):
+    """Ligne users du porteur d'un jeton valide, sinon None."""
+    if not jeton: return None
+    with db_lecture() as conn:
+        u = conn.execute("""SELECT u.* FROM api_jetons j JOIN users u ON u.id = j.user_id
+                            WHERE j.empreinte=? AND j.revoque=0""", (_empreinte_jeton(jeton),)).fetchone()
+    return dict(u) if u else None
+
+
+@chronometre()
+def revoquer_jeton(jeton):
+    with db_connection() as conn:
+        n = conn.execute("UPDATE api_jetons SET revoque=1 WHERE empreinte=?", (_empreinte_jeton(jeton),)).rowcount; conn.commit()
+    return n > 0
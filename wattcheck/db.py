@@ -0,0 +1,255 @@
+"""Stockage : pool SQLite (lecteurs concurrents en WAL, écrivain unique sérialisé) et choix du moteur.
+
+ouvrir_pool(cible) rend un ConnectionPool pour un chemin de fichier, ou un
+db_postgres.PoolPostgres pour une URL postgresql:// ; les deux exposent
+lecture(), ecriture(), fermer(), stats() et leur `dialecte`. Seul le pool SQLite
+a `sauvegardes_fichier` (instantanés, restauration, exclusif()).
+
+Plusieurs processus peuvent partager la même base SQLite : les écritures du
+pool passent en plus par un verrou de fichier (<base>.verrou), file
+d'attente entre processus qui évite les pauses du gestionnaire « busy » de
+SQLite ; le busy_timeout (`timeout`) reste le filet pour les autres écrivains.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from wattcheck import metriques
+
+try: import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",      # ~16 Mo de cache de pages par connexion
+    "PRAGMA mmap_size=134217728",    # 128 Mo mappés en mémoire
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+# Les instructions et expressions SQL propres à chaque moteur (gabarits str.format) :
+# debut_ecriture ouvre une transaction sérialisée entre tous les écrivains, tous processus confondus ;
+# contient : recherche de sous-chaîne insensible à la casse (LIKE de SQLite, ILIKE de PostgreSQL)
+Dialecte = namedtuple("Dialecte", "nom debut_ecriture optimiser mois_epoch concat contient")
+SQLITE = Dialecte("sqlite", "BEGIN IMMEDIATE", "PRAGMA optimize", "strftime('%Y-%m', {}, 'unixepoch')", "GROUP_CONCAT({})", "{} LIKE ?")
+POSTGRES = Dialecte("postgresql", "SELECT pg_advisory_xact_lock(1463899220)",  # clé 0x57415454, « WATT »
+                    "ANALYZE", "to_char(to_timestamp({}) AT TIME ZONE 'UTC', 'YYYY-MM')", "string_agg({}::text, ',')", "{} ILIKE ?")
+
+
+def ouvrir_pool(cible, **options):
+    """Pool pour `cible` : URL postgresql:// (psycopg requis) ou chemin de base SQLite."""
+    if cible.startswith(("postgresql://", "postgres://")):
+        from wattcheck.db_postgres import PoolPostgres
+        return PoolPostgres(cible, **options)
+    return ConnectionPool(cible, **options)
+
+
+class VerrouFichier:
+    """Verrou exclusif entre processus sur un fichier (flock ; msvcrt sous Windows).
+
+    En attente, réessaie par pas de 0,1 à 2 ms : le suivant repart dès la
+    libération, là où le gestionnaire « busy » de SQLite dort jusqu'à 100 ms.
+    Libéré par le système si le processus meurt.
+    """
+    PAS_MAX = 0.002
+
+    def __init__(self, chemin):
+        self.chemin = chemin; self._fd = None; self._pid = None
+
+    def _essayer(self):
+        # Un processus fils (fork) rouvre le fichier : flock est partagé par les descripteurs hérités
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.chemin, os.O_RDWR | os.O_CREAT, 0o644); self._pid = os.getpid()
+        try:
+            if fcntl: fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else: msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError: return False
+
+    def acquerir(self, timeout):
+        fin = time.monotonic() + timeout; pas = 0.0001
+        while not self._essayer():
+            if time.monotonic() >= fin: return False
+            time.sleep(pas); pas = min(pas * 2, self.PAS_MAX)
+        return True
+
+    def liberer(self):
+        if fcntl: fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else: msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def fermer(self):
+        if self._fd is not None and self._pid == os.getpid(): os.close(self._fd)
+        self._fd = None
+
+
+class Chrono:
+    """Accumulateur thread-safe de durées (nombre, total, max)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.n = 0; self.total = 0.0; self.max = 0.0
+
+    def ajouter(self, d):
+        with self._lock:
+            self.n += 1; self.total += d
+            if d > self.max: self.max = d
+
+    def snapshot(self):
+        with self._lock:
+            return {"n": self.n, "total_s": self.total, "moy_ms": (self.total / self.n * 1000) if self.n else 0.0, "max_ms": self.max * 1000}
+
+
+class ConnexionMesuree(sqlite3.Connection):
+    """Connexion qui chronomètre chaque execute/executemany dans le registre de métriques."""
+    dialecte = SQLITE
+
+    def execute(self, sql, *params):
+        t0 = time.perf_counter()
+        try: return super().execute(sql, *params)
+        finally: metriques.REGISTRE.requete(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, params):
+        t0 = time.perf_counter()
+        try: return super().executemany(sql, params)
+        finally: metriques.REGISTRE.requete(sql, time.perf_counter() - t0)
+
+
+class ConnectionPool:
+    """Connexions longues durées : `lecture()` pour les SELECT, `ecriture()` pour tout le reste.
+
+    Les lecteurs sont empruntés dans une file (LIFO) et rendus après usage ;
+    en mode WAL ils lisent en parallèle sans prendre le verrou d'écriture.
+    L'écrivain est une connexion unique protégée par un verrou, doublé d'un
+    verrou de fichier entre processus si `multi_processus`.
+    """
+    dialecte = SQLITE
+    sauvegardes_fichier = True
+
+    def __init__(self, db_file, max_lecteurs=8, timeout=30.0, multi_processus=True):
+        self.db_file = db_file; self.timeout = timeout; self.max_lecteurs = max_lecteurs
+        self._verrou_fichier = VerrouFichier(db_file + ".verrou") if multi_processus else None
+        self._lecteurs = queue.LifoQueue()
+        self._ouverts = 0; self._ouverts_lock = threading.Lock()
+        self._verrou_ecriture = threading.Lock()
+        self._ecrivain = None
+        self._ouvert = threading.Event(); self._ouvert.set()  # fermé pendant exclusif()
+        self.attente_ecriture = Chrono(); self.tenue_ecriture = Chrono(); self.attente_lecture = Chrono()
+
+    def _ouvrir(self, lecteur):
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, check_same_thread=False, factory=ConnexionMesuree)
+        conn.row_factory = sqlite3.Row
+        if not lecteur: conn.execute("PRAGMA journal_mode=WAL")
+        for p in PRAGMAS: conn.execute(p)
+        if lecteur: conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def lecture(self):
+        t0 = time.perf_counter()
+        if not self._ouvert.wait(self.timeout): raise sqlite3.OperationalError("database is locked (pool drained)")
+        try: conn = self._lecteurs.get_nowait()
+        except queue.Empty:
+            with self._ouverts_lock:
+                creer = self._ouverts < self.max_lecteurs
+                if creer: self._ouverts += 1
+            if creer:
+                # Garantit le mode WAL avant la première lecture sur une base neuve
+                try:
+                    if self._ecrivain is None:
+                        with self.ecriture(): pass
+                    conn = self._ouvrir(lecteur=True)
+                except Exception:
+                    with self._ouverts_lock: self._ouverts -= 1
+                    raise
+            else: conn = self._lecteurs.get(timeout=self.timeout)
+        t1 = time.perf_counter(); self.attente_lecture.ajouter(t1 - t0)
+        metriques.observer("wattcheck_pool_attente_secondes", t1 - t0, mode="lecture")
+        try: yield conn
+        finally:
+            if conn.in_transaction: conn.rollback()
+            self._lecteurs.put(conn)
+            metriques.observer("wattcheck_pool_tenue_secondes", time.perf_counter() - t1, mode="lecture")
+
+    def _prendre(self):
+        # Verrou du processus puis verrou de fichier partagé avec les autres processus, dans le même délai
+        fin = time.monotonic() + self.timeout
+        if not self._verrou_ecriture.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("database is locked (pool writer timeout)")
+        if self._verrou_fichier is not None and not self._verrou_fichier.acquerir(max(0.0, fin - time.monotonic())):
+            self._verrou_ecriture.release(); raise sqlite3.OperationalError("database is locked (file lock timeout)")
+
+    def _rendre(self):
+        if self._verrou_fichier is not None: self._verrou_fichier.liberer()
+        self._verrou_ecriture.release()
+
+    @contextmanager
+    def ecriture(self):
+        t0 = time.perf_counter()
+        self._prendre()
+        t1 = time.perf_counter(); self.attente_ecriture.ajouter(t1 - t0)
+        metriques.observer("wattcheck_pool_attente_secondes", t1 - t0, mode="ecriture")
+        try:
+            if self._ecrivain is None: self._ecrivain = self._ouvrir(lecteur=False)
+            conn = self._ecrivain
+            try: yield conn
+            except Exception: conn.rollback(); raise
+            finally:
+                if conn.in_transaction: conn.rollback()  # comme l'ancien close() sans commit
+        finally:
+            d = time.perf_counter() - t1
+            self._rendre()
+            self.tenue_ecriture.ajouter(d); metriques.observer("wattcheck_pool_tenue_secondes", d, mode="ecriture")
+
+    @contextmanager
+    def exclusif(self):
+        """Draine le pool : attend le retour des lecteurs, ferme toutes les connexions
+        (checkpoint du WAL compris) et bloque lectures et écritures pendant le bloc.
+        Les écrivains des autres processus attendent sur le verrou de fichier."""
+        self._ouvert.clear()
+        try: self._prendre()
+        except sqlite3.OperationalError: self._ouvert.set(); raise
+        try:
+            rendus = []
+            try:
+                while True:
+                    with self._ouverts_lock:
+                        if len(rendus) >= self._ouverts: break
+                    rendus.append(self._lecteurs.get(timeout=self.timeout))
+            except queue.Empty:
+                for c in rendus: self._lecteurs.put(c)
+                raise sqlite3.OperationalError("database is locked (readers still busy)")
+            for c in rendus: c.close()
+            with self._ouverts_lock: self._ouverts -= len(rendus)
+            if self._ecrivain is not None:
+                self._ecrivain.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._ecrivain.close(); self._ecrivain = None
+            yield
+        finally:
+            self._rendre()
+            self._ouvert.set()
+
+    def fermer(self):
+        """Ferme toutes les connexions inactives (les suivantes seront rouvertes à la demande)."""
+        with self._verrou_ecriture:
+            if self._ecrivain is not None: self._ecrivain.close(); self._ecrivain = None
+            if self._verrou_fichier is not None: self._verrou_fichier.fermer()
+        while True:
+            try: conn = self._lecteurs.get_nowait()
+            except queue.Empty: break
+            conn.close()
+            with self._ouverts_lock: self._ouverts -= 1
+
+    def stats(self):
+        return {
+            "lecteurs_ouverts": self._ouverts,
+            "lecteurs_libres": self._lecteurs.qsize(),
+            "attente_lecture": self.attente_lecture.snapshot(),
+            "attente_ecriture": self.attente_ecriture.snapshot(),
+            "tenue_ecriture": self.tenue_ecriture.snapshot(),
+        }
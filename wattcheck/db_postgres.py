@@ -0,0 +1,188 @@
+"""Stockage PostgreSQL (psycopg 3) : même interface que db.ConnectionPool, partagé par N processus ou serveurs.
+
+Les requêtes du noyau sont communes aux deux moteurs ; ce qui diffère
+(transaction d'écriture sérialisée, optimisation, recherche insensible à la
+casse, mois d'un epoch, agrégation de chaînes) est écrit pour chaque moteur
+dans `conn.dialecte` (db.POSTGRES). ConnexionPostgres ne fait que passer les
+paramètres « ? » au style psycopg, hors littéraux et commentaires, et rend
+des lignes lisibles par index ou par nom, comme sqlite3.Row.
+
+POSTGRES.debut_ecriture prend un verrou consultatif de transaction : les
+transactions qui le demandent (recharges, licences, migrations) restent
+sérialisées entre tous les processus, les autres écritures se font en
+parallèle. lock_timeout borne l'attente comme le busy_timeout de SQLite.
+Pas de sauvegardes fichier (`sauvegardes_fichier` faux) : pg_dump / pg_restore.
+
+Dépendance optionnelle : pip install "psycopg[binary]".
+"""
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import psycopg
+from psycopg.pq import TransactionStatus
+from psycopg.types.numeric import FloatLoader
+
+from wattcheck import metriques
+from wattcheck.db import POSTGRES, Chrono
+
+# Littéral 'chaîne', identifiant "entre guillemets", commentaire, ou caractère à traduire
+_JETONS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|[?%]", re.S)
+
+
+def _jeton(m):
+    t = m.group()
+    if t == "?": return "%s"
+    return t.replace("%", "%%")  # psycopg lit les % partout, littéraux compris, dès qu'il y a des paramètres
+
+
+@lru_cache(maxsize=1024)
+def traduire(sql):
+    """Paramètres « ? » (sqlite3) -> « %s » (psycopg) ; les « ? » des littéraux et commentaires restent tels quels."""
+    return _JETONS.sub(_jeton, sql)
+
+
+class Ligne(tuple):
+    """Ligne accessible par index ou par nom de colonne, comme sqlite3.Row."""
+    __slots__ = ()
+    _index = {}
+
+    def __getitem__(self, k): return tuple.__getitem__(self, self._index[k] if isinstance(k, str) else k)
+
+    def keys(self): return list(self._index)
+
+
+@lru_cache(maxsize=512)
+def _classe_ligne(noms): return type("Ligne", (Ligne,), {"__slots__": (), "_index": {n: i for i, n in enumerate(noms)}})
+
+
+def _lignes(cur):
+    # row_factory psycopg : une classe par jeu de colonnes, mise en cache
+    return _classe_ligne(tuple(c.name for c in cur.description)) if cur.description else tuple
+
+
+class ConnexionPostgres:
+    """Connexion psycopg présentée comme une connexion sqlite3 (execute, executemany, commit, rollback)."""
+    dialecte = POSTGRES
+
+    def __init__(self, conn): self._conn = conn
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        try:
+            cur = self._conn.cursor()
+            if params: cur.execute(traduire(sql), params)
+            else: cur.execute(sql)  # sans paramètres, psycopg envoie le texte tel quel
+            return cur
+        finally: metriques.REGISTRE.requete(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, params):
+        t0 = time.perf_counter()
+        try:
+            cur = self._conn.cursor(); cur.executemany(traduire(sql), params)
+            return cur
+        finally: metriques.REGISTRE.requete(sql, time.perf_counter() - t0)
+
+    def commit(self): self._conn.commit()
+
+    def rollback(self): self._conn.rollback()
+
+    @property
+    def in_transaction(self): return self._conn.info.transaction_status != TransactionStatus.IDLE
+
+    @property
+    def hors_service(self): return self._conn.closed or self._conn.broken
+
+    def close(self): self._conn.close()
+
+
+class _Reserve:
+    """Au plus `taille` connexions ouvertes à la demande, empruntées en LIFO."""
+
+    def __init__(self, ouvrir, taille, timeout):
+        self._ouvrir = ouvrir; self.taille = taille; self.timeout = timeout
+        self._libres = queue.LifoQueue(); self.ouverts = 0; self._lock = threading.Lock()
+
+    def prendre(self):
+        try: return self._libres.get_nowait()
+        except queue.Empty: pass
+        with self._lock:
+            creer = self.ouverts < self.taille
+            if creer: self.ouverts += 1
+        if not creer:
+            try: return self._libres.get(timeout=self.timeout)
+            except queue.Empty: raise psycopg.OperationalError("pool PostgreSQL épuisé (timeout)")
+        try: return self._ouvrir()
+        except Exception:
+            with self._lock: self.ouverts -= 1
+            raise
+
+    def rendre(self, conn):
+        if not conn.hors_service and conn.in_transaction:
+            try: conn.rollback()  # comme l'ancien close() sans commit
+            except psycopg.Error: pass
+        if conn.hors_service:
+            conn.close()
+            with self._lock: self.ouverts -= 1
+        else: self._libres.put(conn)
+
+    def vider(self):
+        while True:
+            try: conn = self._libres.get_nowait()
+            except queue.Empty: break
+            conn.close()
+            with self._lock: self.ouverts -= 1
+
+    def libres(self): return self._libres.qsize()
+
+
+class PoolPostgres:
+    """`lecture()` : connexions en lecture seule, autocommit (comme les lecteurs SQLite hors transaction) ;
+    `ecriture()` : jusqu'à `max_ecrivains` transactions en parallèle, annulées si le bloc ne valide pas."""
+    dialecte = POSTGRES
+    sauvegardes_fichier = False  # pas d'exclusif() : pg_dump / pg_restore côté serveur
+
+    def __init__(self, url, max_lecteurs=8, timeout=30.0, max_ecrivains=4):
+        self.url = url; self.timeout = timeout; self.max_lecteurs = max_lecteurs
+        self._lecteurs = _Reserve(lambda: self._ouvrir(lecteur=True), max_lecteurs, timeout)
+        self._ecrivains = _Reserve(lambda: self._ouvrir(lecteur=False), max_ecrivains, timeout)
+        self.attente_ecriture = Chrono(); self.tenue_ecriture = Chrono(); self.attente_lecture = Chrono()
+
+    def _ouvrir(self, lecteur):
+        options = f"-c lock_timeout={int(self.timeout * 1000)}" + (" -c default_transaction_read_only=on" if lecteur else "")
+        conn = psycopg.connect(self.url, autocommit=lecteur, connect_timeout=max(1, int(self.timeout)), options=options, row_factory=_lignes)
+        conn.adapters.register_loader("numeric", FloatLoader)  # SUM() d'entiers : float comme SQLite, pas Decimal
+        return ConnexionPostgres(conn)
+
+    @contextmanager
+    def _emprunt(self, reserve, attente, tenue, mode):
+        t0 = time.perf_counter(); conn = reserve.prendre()
+        t1 = time.perf_counter(); attente.ajouter(t1 - t0)
+        metriques.observer("wattcheck_pool_attente_secondes", t1 - t0, mode=mode)
+        try: yield conn
+        finally:
+            reserve.rendre(conn)
+            d = time.perf_counter() - t1
+            if tenue is not None: tenue.ajouter(d)
+            metriques.observer("wattcheck_pool_tenue_secondes", d, mode=mode)
+
+    def lecture(self): return self._emprunt(self._lecteurs, self.attente_lecture, None, "lecture")
+
+    def ecriture(self): return self._emprunt(self._ecrivains, self.attente_ecriture, self.tenue_ecriture, "ecriture")
+
+    def fermer(self):
+        """Ferme toutes les connexions inactives (les suivantes seront rouvertes à la demande)."""
+        self._lecteurs.vider(); self._ecrivains.vider()
+
+    def stats(self):
+        return {
+            "lecteurs_ouverts": self._lecteurs.ouverts,
+            "lecteurs_libres": self._lecteurs.libres(),
+            "ecrivains_ouverts": self._ecrivains.ouverts,
+            "attente_lecture": self.attente_lecture.snapshot(),
+            "attente_ecriture": self.attente_ecriture.snapshot(),
+            "tenue_ecriture": self.tenue_ecriture.snapshot(),
+        }
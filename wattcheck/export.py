@@ -0,0 +1,132 @@
+"""Export de l'historique en flux (CSV / XLSX / Parquet), exécuté hors du thread de la page."""
+import csv
+import glob
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from wattcheck.config import FUSEAU
+
+TAILLE_LOT = 10000
+LIGNES_PAR_FEUILLE = 1_000_000  # Excel plafonne à 1 048 576 lignes par feuille
+FORMATS = {"csv": "text/csv", "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "parquet": "application/vnd.apache.parquet"}
+COLONNES = ["date", "horodatage", "montant", "kwh", "ref", "cumul_apres"]
+COLONNES_ADMIN = ["user_id", "utilisateur"] + COLONNES
+
+
+def lots(pool, uid=None, taille=TAILLE_LOT):
+    """Itère l'historique (d'un utilisateur ou de tous) par lots de `taille`, pagination sur id.
+
+    Chaque lot emprunte un lecteur puis le rend : aucun curseur ni
+    transaction de lecture ne reste ouvert pendant l'écriture du fichier.
+    """
+    dernier = 0
+    while True:
+        with pool.lecture() as conn:
+            if uid is None:
+                rows = conn.execute("""SELECT h.id, h.user_id, u.username, h.date, h.ts, h.montant, h.kwh, h.token_ref, h.cumul_apres
+                                       FROM historique h LEFT JOIN users u ON u.id = h.user_id
+                                       WHERE h.id > ? ORDER BY h.id LIMIT ?""", (dernier, taille)).fetchall()
+            else:
+                rows = conn.execute("""SELECT id, user_id, NULL AS username, date, ts, montant, kwh, token_ref, cumul_apres
+                                       FROM historique WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?""", (uid, dernier, taille)).fetchall()
+        if not rows: return
+        dernier = rows[-1]['id']
+        yield [_ligne(r, uid is None) for r in rows]
+        if len(rows) < taille: return
+
+
+def _ligne(r, admin):
+    horo = datetime.fromtimestamp(r['ts'], FUSEAU).strftime("%Y-%m-%d %H:%M") if r['ts'] is not None else None
+    base = [r['date'], horo, r['montant'], r['kwh'], r['token_ref'], r['cumul_apres']]
+    return [r['user_id'], r['username']] + base if admin else base
+
+
+# --- ÉCRIVAINS ---
+def _csv(chemin, entetes, source, progres):
+    with open(chemin, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(entetes)
+        for lot in source: w.writerows(lot); progres(len(lot))
+
+
+def _xlsx(chemin, entetes, source, progres):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)  # lignes écrites au fil de l'eau
+    ws = None; n = 0
+    for lot in source:
+        for ligne in lot:
+            if ws is None or n >= LIGNES_PAR_FEUILLE:
+                ws = wb.create_sheet(f"Historique {len(wb.worksheets) + 1}"); ws.append(entetes); n = 0
+            ws.append(ligne); n += 1
+        progres(len(lot))
+    if ws is None: wb.create_sheet("Historique 1").append(entetes)
+    wb.save(chemin)
+
+
+def _parquet(chemin, entetes, source, progres):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {"user_id": pa.int64(), "utilisateur": pa.string(), "date": pa.string(), "horodatage": pa.string(),
+             "montant": pa.float64(), "kwh": pa.float64(), "ref": pa.string(), "cumul_apres": pa.float64()}
+    schema = pa.schema([(c, types[c]) for c in entetes])
+    with pq.ParquetWriter(chemin, schema, compression="zstd") as w:
+        for lot in source:
+            cols = list(zip(*lot))
+            w.write_table(pa.table([pa.array(c, type=schema.field(i).type) for i, c in enumerate(cols)], schema=schema))
+            progres(len(lot))
+
+
+ECRIVAINS = {"csv": _csv, "xlsx": _xlsx, "parquet": _parquet}
+
+
+def exporter(pool, chemin, fmt, uid=None, progres=lambda n: None):
+    """Écrit l'historique dans `chemin` au format `fmt` ; mémoire bornée à un lot."""
+    entetes = COLONNES_ADMIN if uid is None else COLONNES
+    ECRIVAINS[fmt](chemin, entetes, lots(pool, uid), progres)
+    return chemin
+
+
+# --- TÂCHES EN ARRIÈRE-PLAN ---
+class Exports:
+    """File de tâches d'export : la page soumet, puis interroge l'état sans attendre."""
+
+    def __init__(self, pool, dossier, workers=2, duree_vie=3600):
+        self.pool = pool; self.dossier = dossier; self.duree_vie = duree_vie
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wattcheck-export")
+        self._taches = {}; self._lock = threading.Lock()
+        os.makedirs(dossier, exist_ok=True)
+
+    def soumettre(self, fmt, uid=None, prefixe="historique"):
+        if fmt not in ECRIVAINS: raise ValueError(f"Format inconnu : {fmt}")
+        self.purger()
+        tid = uuid.uuid4().hex[:12]
+        nom = f"{prefixe}_{datetime.now(FUSEAU).strftime('%Y%m%d_%H%M')}.{fmt}"
+        t = {"id": tid, "fmt": fmt, "nom": nom, "chemin": os.path.join(self.dossier, f"{tid}.{fmt}"), "etat": "en attente",
+             "lignes": 0, "erreur": None, "debut": time.time(), "fin": None}
+        with self._lock: self._taches[tid] = t
+
+        def progres(n): t["lignes"] += n
+
+        def run():
+            t["etat"] = "en cours"
+            try: exporter(self.pool, t["chemin"] + ".part", fmt, uid, progres); os.replace(t["chemin"] + ".part", t["chemin"]); t["etat"] = "terminé"
+            except Exception as e: t["etat"] = "échec"; t["erreur"] = str(e)
+            finally: t["fin"] = time.time()
+        self._executor.submit(run)
+        return tid
+
+    def tache(self, tid):
+        with self._lock: return dict(self._taches[tid]) if tid in self._taches else None
+
+    def purger(self):
+        """Supprime fichiers et tâches terminés depuis plus de `duree_vie` secondes."""
+        limite = time.time() - self.duree_vie
+        with self._lock:
+            for tid, t in list(self._taches.items()):
+                if t["fin"] and t["fin"] < limite: del self._taches[tid]
+        for f in glob.glob(os.path.join(self.dossier, "*")):
+            if os.path.getmtime(f) < limite: os.remove(f)
@@ -0,0 +1,174 @@
+"""Import en masse de recharges historiques (CSV / Excel) et reconstruction des cumuls."""
+import csv
+import io
+import os
+import re
+from datetime import datetime
+
+from wattcheck.config import FORMAT_DATE_HISTO, FUSEAU
+from wattcheck.retention import bornes_mois
+from wattcheck.tarifs import calcul_kwh, determiner_cat
+
+TAILLE_LOT = 5000
+MAX_ERREURS = 100
+MONTANT_MAX = 10_000_000
+FORMATS_DATE = ("%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%d-%m-%Y")
+ALIAS = {
+    "date": "date", "date recharge": "date",
+    "montant": "montant", "montant (fcfa)": "montant", "fcfa": "montant",
+    "token": "token", "code token": "token", "ref": "ref", "reference": "ref", "référence": "ref",
+    "utilisateur": "utilisateur", "username": "utilisateur", "identifiant": "utilisateur",
+}
+
+
+# --- 1. LECTURE EN FLUX ---
+def _entetes(ligne):
+    return [ALIAS.get(str(h or "").strip().lower(), str(h or "").strip().lower()) for h in ligne]
+
+
+def lignes_csv(flux):
+    """Itère (n° de ligne, dict) sur un CSV binaire ou texte, séparateur ; ou , détecté."""
+    texte = io.TextIOWrapper(flux, encoding="utf-8-sig", newline="") if not isinstance(flux, io.TextIOBase) else flux
+    debut = texte.readline()
+    sep = ";" if debut.count(";") > debut.count(",") else ","
+    entetes = _entetes(next(csv.reader([debut], delimiter=sep)))
+    for n, ligne in enumerate(csv.reader(texte, delimiter=sep), start=2):
+        if any(c.strip() for c in ligne): yield n, dict(zip(entetes, ligne))
+
+
+def lignes_excel(flux):
+    """Itère (n° de ligne, dict) sur la première feuille, en mode lecture seule (sans tout charger)."""
+    from openpyxl import load_workbook
+    wb = load_workbook(flux, read_only=True, data_only=True)
+    try:
+        lignes = wb.worksheets[0].iter_rows(values_only=True)
+        entetes = _entetes(next(lignes, ()))
+        for n, ligne in enumerate(lignes, start=2):
+            if any(c not in (None, "") for c in ligne): yield n, dict(zip(entetes, ligne))
+    finally: wb.close()
+
+
+def lire(flux, nom_fichier):
+    ext = os.path.splitext(nom_fichier.lower())[1]
+    if ext in (".xlsx", ".xlsm"): return lignes_excel(flux)
+    if ext in (".csv", ".txt"): return lignes_csv(flux)
+    raise ValueError(f"Format non supporté : {ext or nom_fichier}")
+
+
+# --- 2. VALIDATION ---
+def _date(v):
+    if isinstance(v, datetime): dt = v
+    else:
+        v = str(v or "").strip()
+        for fmt in FORMATS_DATE:
+            try: dt = datetime.strptime(v, fmt); break
+            except ValueError: continue
+        else: raise ValueError(f"date illisible « {v} »")
+    dt = FUSEAU.localize(dt) if dt.tzinfo is None else dt.astimezone(FUSEAU)
+    if dt > datetime.now(FUSEAU): raise ValueError("date dans le futur")
+    return dt
+
+
+def _montant(v):
+    if isinstance(v, (int, float)): m = float(v)
+    else:
+        s = re.sub(r"[\s  ]|FCFA|F$", "", str(v or ""), flags=re.I).replace(",", ".")
+        try: m = float(s)
+        except ValueError: raise ValueError(f"montant illisible « {v} »")
+    if not 0 < m <= MONTANT_MAX: raise ValueError(f"montant hors bornes ({m:g})")
+    return m
+
+
+def valider(brut):
+    """dict brut -> (datetime locale, montant, ref, token, utilisateur) ; lève ValueError."""
+    dt = _date(brut.get("date")); m = _montant(brut.get("montant"))
+    return dt, m, brut.get("ref") or None, brut.get("token") or None, (str(brut.get("utilisateur") or "").strip() or None)
+
+
+# --- 3. IMPORT ---
+def _mois(dt): return dt.strftime("%Y-%m")
+
+
+def importer(pool, flux, nom_fichier, uid=None, multi_utilisateurs=False, hash_token=None, taille_lot=TAILLE_LOT, max_erreurs=MAX_ERREURS):
+    """Importe les recharges de `flux` dans historique puis reconstruit les cumuls.
+
+    Les lignes sont lues en flux, validées, puis insérées par lots de
+    `taille_lot` (une transaction par lot, le verrou d'écriture est relâché
+    entre deux lots). Une ligne identique (utilisateur, horodatage, montant)
+    déjà présente est ignorée. `multi_utilisateurs` (admin) lit la colonne
+    « utilisateur » ; sinon tout est rattaché à `uid`. Retourne un rapport.
+    """
+    rapport = {"lues": 0, "importees": 0, "doublons": 0, "erreurs": [], "nb_erreurs": 0, "mois": 0}
+    ids_users = {}; touches = {}  # uid -> ensemble des mois importés
+    lot = []
+
+    def uid_de(nom):
+        if nom not in ids_users:
+            with pool.lecture() as conn:
+                r = conn.execute("SELECT id FROM users WHERE username=?", (nom,)).fetchone()
+            ids_users[nom] = r['id'] if r else None
+        return ids_users[nom]
+
+    def vider():
+        with pool.ecriture() as conn:
+            cur = conn.executemany("""INSERT INTO historique (user_id, date, montant, kwh, token_ref, cumul_apres, ts)
+                                SELECT ?, ?, ?, NULL, ?, NULL, ?
+                                WHERE NOT EXISTS (SELECT 1 FROM historique WHERE user_id=? AND ts=? AND montant=?)""", lot)
+            conn.commit()
+            n = cur.rowcount  # lignes réellement insérées, sommées sur le lot
+        rapport["importees"] += n; rapport["doublons"] += len(lot) - n
+        lot.clear()
+
+    for n, brut in lire(flux, nom_fichier):
+        rapport["lues"] += 1
+        try:
+            dt, m, ref, token, nom = valider(brut)
+            cible = uid
+            if multi_utilisateurs:
+                if not nom: raise ValueError("colonne utilisateur vide")
+                cible = uid_de(nom)
+                if cible is None: raise ValueError(f"utilisateur inconnu « {nom} »")
+        except ValueError as e:
+            rapport["nb_erreurs"] += 1
+            if len(rapport["erreurs"]) < max_erreurs: rapport["erreurs"].append((n, str(e)))
+            continue
+        ts = int(dt.timestamp())
+        ref = ref or (hash_token(token) if token and hash_token else "IMPORT")
+        lot.append((cible, dt.strftime(FORMAT_DATE_HISTO), m, ref, ts, cible, ts, m))
+        touches.setdefault(cible, set()).add(_mois(dt))
+        if len(lot) >= taille_lot: vider()
+    if lot: vider()
+
+    for u, mois in touches.items(): rapport["mois"] += reconstruire_cumuls(pool, u, mois, taille_lot)
+    return rapport
+
+
+def reconstruire_cumuls(pool, uid, mois, taille_lot=TAILLE_LOT):
+    """Re-tarifie dans l'ordre chronologique les recharges datées (ts) des `mois` de `uid`.
+
+    Une transaction BEGIN IMMEDIATE par mois : lecture du cumul, re-tarification,
+    mise à jour de kwh / cumul_apres (par lots de `taille_lot`) et de
+    etats_mensuels, sans recharge concurrente intercalée (comme core.recharger).
+    Les kWh de recharges plus anciennes sans horodatage, déjà comptés dans
+    etats_mensuels, sont conservés comme consommés en début de mois.
+    """
+    for mo in sorted(mois):
+        debut, fin = bornes_mois(mo)
+        with pool.ecriture() as conn:
+            conn.execute(conn.dialecte.debut_ecriture)
+            prof = conn.execute("SELECT conso_jour FROM profils WHERE user_id=?", (uid,)).fetchone()
+            cat = determiner_cat((prof['conso_jour'] or 0) if prof else 0)
+            em = conn.execute("SELECT cumul FROM etats_mensuels WHERE user_id=? AND mois=?", (uid, mo)).fetchone()
+            dates = conn.execute("SELECT COALESCE(SUM(kwh), 0) FROM historique WHERE user_id=? AND ts >= ? AND ts < ? AND kwh IS NOT NULL", (uid, debut, fin)).fetchone()[0]
+            cumul = max(0.0, (em['cumul'] if em else 0.0) - dates)
+            lignes = conn.execute("SELECT id, montant, ts FROM historique WHERE user_id=? AND ts >= ? AND ts < ? ORDER BY ts, id", (uid, debut, fin)).fetchall()
+            maj = []
+            for row in lignes:
+                kwh = float(calcul_kwh(row['montant'], cumul, cat, row['ts'])[0]); cumul += kwh  # grille du jour de la recharge
+                maj.append((kwh, cumul, row['id']))
+            for k in range(0, len(maj), taille_lot):
+                conn.executemany("UPDATE historique SET kwh=?, cumul_apres=? WHERE id=?", maj[k:k + taille_lot])
+            conn.execute("INSERT INTO etats_mensuels (user_id, mois, cumul) VALUES (?, ?, ?) "
+                         "ON CONFLICT (user_id, mois) DO UPDATE SET cumul = excluded.cumul", (uid, mo, cumul))
+            conn.commit()
+    return len(mois)
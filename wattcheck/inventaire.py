@@ -0,0 +1,26 @@
+"""Parc d'appareils normalisé (table appareils) : une ligne par appareil, totaux tenus par triggers."""
+
+
+def lister(conn, uid):
+    """Inventaire au format historique {id, nom, p, q, h}, dans l'ordre d'ajout."""
+    rows = conn.execute("SELECT id, nom, watts AS p, qty AS q, heures AS h FROM appareils WHERE user_id=? ORDER BY id", (uid,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def ajouter(conn, uid, nom, watts, qty, heures=5.0):
+    return conn.execute("INSERT INTO appareils (user_id, nom, watts, qty, heures) VALUES (?, ?, ?, ?, ?) RETURNING id", (uid, nom, watts, qty, heures)).fetchone()[0]
+
+
+def supprimer(conn, uid, aid):
+    conn.execute("DELETE FROM appareils WHERE id=? AND user_id=?", (aid, uid))
+
+
+def maj_heures(conn, uid, changements):
+    """`changements` : {id_appareil: heures}. Seules ces lignes sont réécrites."""
+    conn.executemany("UPDATE appareils SET heures=? WHERE id=? AND user_id=?", [(h, aid, uid) for aid, h in changements.items()])
+
+
+def totaux(conn, uid):
+    """(puissance installée en W, conso en kWh/jour) tenus à jour par les triggers."""
+    row = conn.execute("SELECT puissance_w, conso_jour FROM profils WHERE user_id=?", (uid,)).fetchone()
+    return (row['puissance_w'] or 0.0, row['conso_jour'] or 0.0) if row else (0.0, 0.0)
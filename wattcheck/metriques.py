@@ -0,0 +1,180 @@
+"""Instrumentation en mémoire : compteurs, histogrammes de durées, requêtes lentes, export Prometheus.
+
+Un registre par processus (page Streamlit, API). Les durées sont en secondes,
+rangées dans des seaux fixes (BORNES) ; les quantiles affichés en sont
+interpolés. Les requêtes au-delà du seuil lent sont toutes comptées et, avec
+la probabilité `echantillon`, journalisées (logger « wattcheck.lent ») et
+gardées dans un tampon circulaire pour le cockpit admin.
+"""
+import functools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+from wattcheck import config
+
+BORNES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DESCRIPTIONS = {
+    "wattcheck_requete_secondes": "Durée d'exécution SQL (execute/executemany) par requête normalisée",
+    "wattcheck_requetes_lentes_total": "Requêtes SQL au-delà du seuil lent",
+    "wattcheck_pool_attente_secondes": "Attente pour obtenir une connexion (lecture) ou le verrou d'écriture",
+    "wattcheck_pool_tenue_secondes": "Durée d'emprunt d'une connexion / de tenue du verrou d'écriture",
+    "wattcheck_core_secondes": "Durée des fonctions du noyau (wattcheck.core)",
+    "wattcheck_page_secondes": "Durée d'exécution du script Streamlit, par rerun et par section",
+    "wattcheck_api_secondes": "Durée de traitement des requêtes HTTP, par route",
+    "wattcheck_api_requetes_total": "Requêtes HTTP par route et statut",
+}
+_journal = logging.getLogger("wattcheck.lent")
+
+
+class Histogramme:
+    __slots__ = ("compte", "somme", "max", "seaux")
+
+    def __init__(self):
+        self.compte = 0; self.somme = 0.0; self.max = 0.0; self.seaux = [0] * (len(BORNES) + 1)
+
+    def observer(self, v):
+        self.seaux[bisect_left(BORNES, v)] += 1
+        self.compte += 1; self.somme += v
+        if v > self.max: self.max = v
+
+    def quantile(self, q):
+        """Quantile estimé par interpolation linéaire dans le seau concerné."""
+        if not self.compte: return 0.0
+        rang = q * self.compte; cumul = 0
+        for i, n in enumerate(self.seaux):
+            if n and cumul + n >= rang:
+                bas = BORNES[i - 1] if i else 0.0
+                haut = BORNES[i] if i < len(BORNES) else self.max
+                return min(bas + (haut - bas) * (rang - cumul) / n, self.max)
+            cumul += n
+        return self.max
+
+
+class Registre:
+    def __init__(self, seuil_lent=0.1, echantillon=0.2, taille_journal=200):
+        self.seuil_lent = seuil_lent; self.echantillon = echantillon
+        self._lock = threading.Lock()
+        self.compteurs = {}; self.histos = {}; self.lentes = deque(maxlen=taille_journal)
+        self.debut = time.time()
+
+    def incrementer(self, nom, valeur=1, **etiquettes):
+        cle = (nom, tuple(sorted(etiquettes.items())))
+        with self._lock: self.compteurs[cle] = self.compteurs.get(cle, 0) + valeur
+
+    def observer(self, nom, duree, **etiquettes):
+        cle = (nom, tuple(sorted(etiquettes.items())))
+        with self._lock:
+            h = self.histos.get(cle)
+            if h is None: h = self.histos[cle] = Histogramme()
+            h.observer(duree)
+
+    def requete(self, sql, duree):
+        req = normaliser(sql)
+        self.observer("wattcheck_requete_secondes", duree, requete=req)
+        if duree >= self.seuil_lent:
+            self.incrementer("wattcheck_requetes_lentes_total")
+            if random.random() < self.echantillon:
+                self.lentes.append({"ts": time.time(), "duree_ms": duree * 1000, "requete": req, "thread": threading.current_thread().name})
+                _journal.warning("requête lente (%.0f ms) : %s", duree * 1000, req)
+
+    def lignes(self):
+        """Histogrammes aplatis [{nom, etiquettes, n, total_s, moy_ms, p50_ms, p95_ms, p99_ms, max_ms}]."""
+        with self._lock: histos = [(n, dict(e), h) for (n, e), h in self.histos.items()]
+        return [{"nom": n, "etiquettes": e, "n": h.compte, "total_s": h.somme, "moy_ms": h.somme / h.compte * 1000 if h.compte else 0.0,
+                 "p50_ms": h.quantile(0.5) * 1000, "p95_ms": h.quantile(0.95) * 1000, "p99_ms": h.quantile(0.99) * 1000, "max_ms": h.max * 1000}
+                for n, e, h in histos]
+
+    def reinitialiser(self):
+        with self._lock: self.compteurs.clear(); self.histos.clear(); self.lentes.clear(); self.debut = time.time()
+
+    def prometheus(self):
+        """Format texte d'exposition Prometheus 0.0.4."""
+        with self._lock:
+            compteurs = sorted(self.compteurs.items()); histos = sorted(self.histos.items(), key=lambda x: x[0])
+            histos = [(cle, list(h.seaux), h.compte, h.somme) for cle, h in histos]
+        out = []; vus = set()
+
+        def entete(nom, type_):
+            if nom in vus: return
+            vus.add(nom)
+            if nom in DESCRIPTIONS: out.append(f"# HELP {nom} {DESCRIPTIONS[nom]}")
+            out.append(f"# TYPE {nom} {type_}")
+        for (nom, et), v in compteurs:
+            entete(nom, "counter"); out.append(f"{nom}{_etiquettes(et)} {v}")
+        for (nom, et), seaux, compte, somme in histos:
+            entete(nom, "histogram"); cumul = 0
+            for borne, n in zip(BORNES + ("+Inf",), seaux):
+                cumul += n; out.append(f"{nom}_bucket{_etiquettes(et + (('le', str(borne)),))} {cumul}")
+            out.append(f"{nom}_sum{_etiquettes(et)} {somme}"); out.append(f"{nom}_count{_etiquettes(et)} {compte}")
+        out.append("# TYPE wattcheck_demarrage_secondes gauge"); out.append(f"wattcheck_demarrage_secondes {self.debut}")
+        return "\n".join(out) + "\n"
+
+
+def _echapper(v): return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquettes(et): return "{" + ",".join(f'{k}="{_echapper(v)}"' for k, v in et) + "}" if et else ""
+
+
+@functools.lru_cache(maxsize=1024)
+def normaliser(sql):
+    """Empreinte d'une requête : espaces réduits, littéraux remplacés par ?, tronquée à 120 caractères."""
+    s = re.sub(r"\s+", " ", sql).strip()
+    s = re.sub(r"'(?:[^']|'')*'", "?", s); s = re.sub(r"\b\d+(\.\d+)?\b", "?", s)
+    return s[:120]
+
+
+REGISTRE = Registre(config.SEUIL_LENT_MS / 1000, config.ECHANTILLON_LENT)
+incrementer = REGISTRE.incrementer
+observer = REGISTRE.observer
+prometheus = REGISTRE.prometheus
+
+
+@contextmanager
+def chrono(nom, **etiquettes):
+    """Chronomètre le bloc dans l'histogramme `nom` (même en cas d'exception)."""
+    t0 = time.perf_counter()
+    try: yield
+    finally: REGISTRE.observer(nom, time.perf_counter() - t0, **etiquettes)
+
+
+def chronometre(nom="wattcheck_core_secondes"):
+    """Décorateur : chronomètre chaque appel, étiqueté par le nom de la fonction."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def f(*a, **kw):
+            t0 = time.perf_counter()
+            try: return fn(*a, **kw)
+            finally: REGISTRE.observer(nom, time.perf_counter() - t0, fonction=fn.__name__)
+        return f
+    return deco
+
+
+def ecrire_fichier(chemin):
+    """Écrit le texte Prometheus dans `chemin` (remplacement atomique, pour le textfile collector)."""
+    tmp = f"{chemin}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(prometheus())
+    os.replace(tmp, chemin)
+
+
+class Exportateur(threading.Thread):
+    """Réécrit le fichier Prometheus toutes les `intervalle` secondes."""
+
+    def __init__(self, chemin, intervalle=15):
+        super().__init__(name="wattcheck-metriques", daemon=True)
+        self.chemin = chemin; self.intervalle = intervalle; self.erreur = None
+        self._arret = threading.Event()
+
+    def run(self):
+        while not self._arret.wait(self.intervalle):
+            try: ecrire_fichier(self.chemin); self.erreur = None
+            except OSError as e: self.erreur = e
+
+    def arreter(self): self._arret.set()
@@ -0,0 +1,213 @@
+"""Migrations de schéma versionnées (table schema_migrations)."""
+import functools
+import json
+import os
+import time
+from datetime import datetime
+
+from wattcheck.config import FUSEAU
+
+MIGRATIONS = []
+SCHEMA_POSTGRES = os.path.join(os.path.dirname(__file__), "schema_postgres.sql")
+
+
+def migration(version, description):
+    def deco(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return deco
+
+
+@migration(1, "schéma initial")
+def _m001_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  username TEXT UNIQUE, password TEXT,
+                  first_name TEXT, last_name TEXT, phone TEXT, meter_number TEXT,
+                  is_pro BOOLEAN DEFAULT 0, is_admin BOOLEAN DEFAULT 0,
+                  pro_expiration_date TEXT, created_at TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS profils (user_id INTEGER PRIMARY KEY, budget REAL, conso_jour REAL, label TEXT, config_json TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS etats_mensuels (user_id INTEGER, mois TEXT, cumul REAL, PRIMARY KEY (user_id, mois))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS historique (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, date TEXT, montant REAL, kwh REAL, token_ref TEXT, cumul_apres REAL)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS licences (code TEXT PRIMARY KEY, created_by INTEGER, used_by INTEGER, created_at TEXT, used_at TEXT, duree_jours INTEGER DEFAULT 365)''')
+
+
+@migration(2, "index historique(user_id, id), licences(used_by), licences(created_by)")
+def _m002_index(conn):
+    # Onglet historique : WHERE user_id=? ORDER BY id DESC LIMIT ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historique_user_id ON historique(user_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_licences_used_by ON licences(used_by)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_licences_created_by ON licences(created_by)")
+    conn.execute("ANALYZE")
+
+
+@migration(3, "index des filtres admin sur users")
+def _m003_index_admin(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_pro_expiration ON users(is_pro, pro_expiration_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)")
+    conn.execute("ANALYZE users")
+
+
+def _appareil_json(uid, it):
+    # Valeurs numériques pour les totaux tenus par trigger ; entrée ignorée si p / q / h ne sont pas des nombres
+    try: return uid, it.get("nom"), float(it.get("p", 0)), int(float(it.get("q", 1))), float(it.get("h", 5.0))
+    except (TypeError, ValueError): return None
+
+
+@migration(4, "table appareils (depuis profils.config_json) et totaux par triggers")
+def _m004_appareils(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS appareils (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                    nom TEXT, watts REAL, qty INTEGER, heures REAL DEFAULT 5.0)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appareils_user ON appareils(user_id, id)")
+    conn.execute("ALTER TABLE profils ADD COLUMN puissance_w REAL DEFAULT 0")
+    # config_json est conservé tel quel (retour arrière possible) mais n'est plus écrit
+    for row in conn.execute("SELECT user_id, config_json FROM profils WHERE config_json IS NOT NULL").fetchall():
+        try: inv = json.loads(row[1] or "[]")
+        except ValueError: inv = []
+        inv = inv if isinstance(inv, list) else []  # JSON valide mais pas une liste : ignoré comme un JSON illisible
+        lignes = [a for a in (_appareil_json(row[0], it) for it in inv if isinstance(it, dict)) if a]
+        conn.executemany("INSERT INTO appareils (user_id, nom, watts, qty, heures) VALUES (?, ?, ?, ?, ?)", lignes)
+    conn.execute("""UPDATE profils SET
+                    puissance_w = COALESCE((SELECT SUM(watts * qty) FROM appareils a WHERE a.user_id = profils.user_id), 0),
+                    conso_jour = COALESCE((SELECT SUM(watts * qty * heures) / 1000.0 FROM appareils a WHERE a.user_id = profils.user_id), 0)""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS appareils_ai AFTER INSERT ON appareils BEGIN
+                    INSERT OR IGNORE INTO profils (user_id, budget, conso_jour, label, puissance_w) VALUES (NEW.user_id, 0, 0, 'Auto', 0);
+                    UPDATE profils SET puissance_w = COALESCE(puissance_w, 0) + NEW.watts * NEW.qty,
+                                       conso_jour = COALESCE(conso_jour, 0) + NEW.watts * NEW.qty * NEW.heures / 1000.0
+                    WHERE user_id = NEW.user_id; END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS appareils_ad AFTER DELETE ON appareils BEGIN
+                    UPDATE profils SET puissance_w = puissance_w - OLD.watts * OLD.qty,
+                                       conso_jour = conso_jour - OLD.watts * OLD.qty * OLD.heures / 1000.0
+                    WHERE user_id = OLD.user_id; END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS appareils_au AFTER UPDATE OF watts, qty, heures, user_id ON appareils BEGIN
+                    UPDATE profils SET puissance_w = puissance_w - OLD.watts * OLD.qty,
+                                       conso_jour = conso_jour - OLD.watts * OLD.qty * OLD.heures / 1000.0
+                    WHERE user_id = OLD.user_id;
+                    UPDATE profils SET puissance_w = puissance_w + NEW.watts * NEW.qty,
+                                       conso_jour = conso_jour + NEW.watts * NEW.qty * NEW.heures / 1000.0
+                    WHERE user_id = NEW.user_id; END""")
+
+
+@migration(5, "historique.ts (epoch UTC) pour les recharges datées")
+def _m005_historique_ts(conn):
+    # Rempli par les nouvelles écritures et les imports ; les lignes antérieures restent NULL
+    conn.execute("ALTER TABLE historique ADD COLUMN ts INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historique_user_ts ON historique(user_id, ts)")
+
+
+@migration(6, "api_jetons : jetons d'accès à l'API HTTP")
+def _m006_api_jetons(conn):
+    # Seule l'empreinte (sha256 salé) est stockée ; le jeton n'est montré qu'à sa création
+    conn.execute("""CREATE TABLE IF NOT EXISTS api_jetons (empreinte TEXT PRIMARY KEY, user_id INTEGER NOT NULL, libelle TEXT,
+                    created_at TEXT, revoque INTEGER DEFAULT 0)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_api_jetons_user ON api_jetons(user_id)")
+
+
+
+@functools.lru_cache(maxsize=4096)
+def _minuit(a, m, j):
+    # Epoch du début de journée locale (lève ValueError pour une date invalide)
+    return int(FUSEAU.localize(datetime(a, m, j)).timestamp())
+
+
+def _dater(date, prec, annees, maintenant):
+    """(epoch, année) d'une date « jj/mm HH:MM » sans année, ou None.
+
+    Années candidates : celles où etats_mensuels connaît ce mois pour le compte,
+    puis à défaut celle de la recharge précédente (`prec` = (epoch, année)) et la
+    suivante (sans précédente : l'occurrence passée la plus récente). On garde la
+    première qui ne place la recharge ni avant la précédente ni dans le futur.
+    """
+    try:
+        jm, hm = date.split(" "); j, m = map(int, jm.split("/")); h, mi = map(int, hm.split(":"))
+    except (AttributeError, ValueError): return None
+    if prec is None: candidates = sorted(annees.get(m, ())) + [datetime.now(FUSEAU).year, datetime.now(FUSEAU).year - 1]
+    else: candidates = sorted(y for y in annees.get(m, ()) if y >= prec[1]) + [prec[1], prec[1] + 1]
+    for y in candidates:
+        try: t = _minuit(y, m, j) + h * 3600 + mi * 60  # pas d'heure d'été à Douala
+        except ValueError: continue  # 29/02 d'une année non bissextile, date invalide
+        if (prec is None or t >= prec[0]) and t <= maintenant: return t, y
+    return None
+
+
+@migration(7, "historique.ts rattrapé pour les lignes sans horodatage (année déduite d'etats_mensuels)")
+def _m007_rattrapage_ts(conn):
+    # Par lots de comptes ; dans un compte, l'ordre des id est l'ordre chronologique des saisies
+    # L'index (user_id, ts) est reconstruit d'un bloc à la fin : bien plus rapide que ligne à ligne
+    conn.execute("DROP INDEX IF EXISTS idx_historique_user_ts")
+    maintenant = int(time.time())
+    uids = [r[0] for r in conn.execute("SELECT DISTINCT user_id FROM historique WHERE ts IS NULL").fetchall()]
+    for i in range(0, len(uids), 1000):
+        lot = uids[i:i + 1000]; marques = ",".join("?" * len(lot))
+        annees = {}
+        for uid, mois in conn.execute(f"SELECT user_id, mois FROM etats_mensuels WHERE user_id IN ({marques})", lot):
+            try: a, m = map(int, mois.split("-"))
+            except (AttributeError, ValueError): continue
+            annees.setdefault(uid, {}).setdefault(m, set()).add(a)
+        maj = []; prec = {}
+        for id_, uid, date in conn.execute(f"SELECT id, user_id, date FROM historique WHERE ts IS NULL AND user_id IN ({marques}) ORDER BY user_id, id", lot).fetchall():
+            d = _dater(date, prec.get(uid), annees.get(uid, {}), maintenant)
+            if d is not None: maj.append((d[0], id_)); prec[uid] = d
+        conn.executemany("UPDATE historique SET ts=? WHERE id=?", maj)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historique_user_ts ON historique(user_id, ts)")
+
+
+@migration(8, "historique_mensuel : résumés par compte et par mois des recharges compactées")
+def _m008_historique_mensuel(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS historique_mensuel (user_id INTEGER NOT NULL, mois TEXT NOT NULL, nb INTEGER NOT NULL,
+                    montant REAL, kwh REAL, premier_ts INTEGER, dernier_ts INTEGER, PRIMARY KEY (user_id, mois))""")
+
+
+@migration(9, "licences.lot : numéro du lot de génération (export CSV par lot)")
+def _m009_licences_lot(conn):
+    conn.execute("ALTER TABLE licences ADD COLUMN lot TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_licences_lot ON licences(lot)")
+
+
+def version_actuelle(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT)")
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrer(conn):
+    """Applique les migrations en attente, chacune dans sa propre transaction.
+
+    Idempotent : une base déjà à jour (ou une sauvegarde restaurée plus
+    ancienne) ne rejoue que ce qui manque. Retourne les versions appliquées.
+    """
+    if getattr(conn, "dialecte", None) is not None and conn.dialecte.nom == "postgresql": return _migrer_postgres(conn)
+    faites = []
+    for version, description, fn in MIGRATIONS:
+        if version <= version_actuelle(conn): continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Relu sous verrou : un autre processus a pu migrer entre-temps
+            if version <= version_actuelle(conn): conn.rollback(); continue
+            fn(conn)
+            conn.execute("INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)", (version, description, datetime.now().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback(); raise
+        faites.append(version)
+    if faites: conn.execute("PRAGMA optimize")
+    return faites
+
+
+def _migrer_postgres(conn):
+    """PostgreSQL : schéma courant créé d'un bloc (SCHEMA_POSTGRES) sur une base vide, sous verrou entre processus."""
+    derniere = MIGRATIONS[-1][0]
+    conn.execute(conn.dialecte.debut_ecriture)
+    try:
+        v = version_actuelle(conn)
+        if v >= derniere: conn.rollback(); return []
+        if v: raise RuntimeError(f"schéma PostgreSQL en version {v} : reporter les migrations {v + 1} à {derniere} dans {os.path.basename(SCHEMA_POSTGRES)}")
+        with open(SCHEMA_POSTGRES, encoding="utf-8") as f: conn.execute(f.read())
+        maintenant = datetime.now().isoformat()
+        conn.executemany("INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                         [(version, description, maintenant) for version, description, _ in MIGRATIONS])
+        conn.commit()
+    except Exception:
+        conn.rollback(); raise
+    return [version for version, _, _ in MIGRATIONS]
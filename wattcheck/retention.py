@@ -0,0 +1,94 @@
+"""Périodes de l'historique et rétention : bornes de mois en epoch, compactage mensuel.
+
+Les recharges datées (ts) d'avant les `garder` derniers mois sont repliées
+par compte et par mois dans historique_mensuel (nombre, montants, kWh), puis
+supprimées de historique, par lots de comptes (le verrou d'écriture est
+relâché entre deux lots). Les exports et l'onglet historique ne voient plus
+que les mois conservés ; synthese_mensuelle (core) réunit les deux tables.
+
+Usage : python -m wattcheck.retention [--base FICHIER] [--garder 12] [--lot 1000] [--simuler]
+"""
+import argparse
+from datetime import datetime
+
+from wattcheck.config import FUSEAU
+
+GARDER_MOIS = 12
+TAILLE_LOT = 1000  # comptes par transaction
+
+
+def bornes_mois(mois):
+    """« AAAA-MM » -> (debut, fin) en epoch, fin exclue, minuit heure locale."""
+    a, m = map(int, mois.split("-"))
+    debut = FUSEAU.localize(datetime(a, m, 1))
+    fin = FUSEAU.localize(datetime(a + (m == 12), m % 12 + 1, 1))
+    return int(debut.timestamp()), int(fin.timestamp())
+
+
+def decaler_mois(mois, n):
+    """« AAAA-MM » décalé de n mois (n négatif : vers le passé)."""
+    a, m = map(int, mois.split("-"))
+    i = a * 12 + m - 1 + n
+    return f"{i // 12:04d}-{i % 12 + 1:02d}"
+
+
+def periode(n_mois=1, mois=None):
+    """(debut, fin) epoch des `n_mois` mois se terminant par `mois` (défaut : le mois courant)."""
+    mois = mois or datetime.now(FUSEAU).strftime("%Y-%m")
+    return bornes_mois(decaler_mois(mois, 1 - n_mois))[0], bornes_mois(mois)[1]
+
+
+def decalage_utc():
+    # Pour strftime('%Y-%m', ts + ?, 'unixepoch') en SQL ; Douala est à UTC+1 toute l'année
+    return int(datetime.now(FUSEAU).utcoffset().total_seconds())
+
+
+def compacter(pool, garder=GARDER_MOIS, taille_lot=TAILLE_LOT, simuler=False, mois=None):
+    """Replie puis supprime les recharges d'avant les `garder` derniers mois.
+
+    Retourne {avant (epoch), lignes, resumes}. Avec `simuler`, ne fait que compter.
+    """
+    avant = periode(garder, mois)[0]; dec = decalage_utc()
+    mois_sql = pool.dialecte.mois_epoch.format("ts + ?")
+    with pool.lecture() as conn:
+        lo, hi = conn.execute("SELECT MIN(user_id), MAX(user_id) FROM historique").fetchone()
+        if simuler:
+            n, r = conn.execute(f"SELECT COUNT(*), COUNT(DISTINCT user_id || {mois_sql}) FROM historique WHERE ts < ?", (dec, avant)).fetchone()
+            return {"avant": avant, "lignes": n, "resumes": r}
+    lignes = resumes = 0
+    for u in range(lo or 0, (hi or -1) + 1, taille_lot):
+        with pool.ecriture() as conn:
+            conn.execute(conn.dialecte.debut_ecriture)
+            # Colonnes qualifiées et CASE plutôt que MIN/MAX à deux arguments : accepté par SQLite et PostgreSQL
+            cur = conn.execute(f"""INSERT INTO historique_mensuel AS hm (user_id, mois, nb, montant, kwh, premier_ts, dernier_ts)
+                                   SELECT user_id, {mois_sql}, COUNT(*), SUM(montant), COALESCE(SUM(kwh), 0), MIN(ts), MAX(ts)
+                                   FROM historique WHERE user_id BETWEEN ? AND ? AND ts < ? GROUP BY 1, 2
+                                   ON CONFLICT (user_id, mois) DO UPDATE SET nb = hm.nb + excluded.nb, montant = hm.montant + excluded.montant,
+                                       kwh = hm.kwh + excluded.kwh,
+                                       premier_ts = CASE WHEN excluded.premier_ts < hm.premier_ts THEN excluded.premier_ts ELSE hm.premier_ts END,
+                                       dernier_ts = CASE WHEN excluded.dernier_ts > hm.dernier_ts THEN excluded.dernier_ts ELSE hm.dernier_ts END""",
+                               (dec, u, u + taille_lot - 1, avant))
+            resumes += cur.rowcount
+            lignes += conn.execute("DELETE FROM historique WHERE user_id BETWEEN ? AND ? AND ts < ?", (u, u + taille_lot - 1, avant)).rowcount
+            conn.commit()
+    if lignes:
+        with pool.ecriture() as conn: conn.execute(pool.dialecte.optimiser)
+    return {"avant": avant, "lignes": lignes, "resumes": resumes}
+
+
+def main(argv=None):
+    from wattcheck import core
+    ap = argparse.ArgumentParser(prog="python -m wattcheck.retention")
+    ap.add_argument("--base"); ap.add_argument("--garder", type=int, default=GARDER_MOIS, help="mois conservés en détail (mois courant compris)")
+    ap.add_argument("--lot", type=int, default=TAILLE_LOT); ap.add_argument("--simuler", action="store_true", help="compter sans modifier")
+    a = ap.parse_args(argv)
+    if a.base: core.configurer(a.base)
+    core.initialiser()
+    r = compacter(core.get_pool(), a.garder, a.lot, a.simuler)
+    print(f"avant le {datetime.fromtimestamp(r['avant'], FUSEAU):%d/%m/%Y} : {r['lignes']:,} recharges "
+          f"{'à replier' if a.simuler else 'repliées'} en {r['resumes']:,} résumés mensuels")
+    core.get_pool().fermer()
+
+
+if __name__ == "__main__":
+    main()
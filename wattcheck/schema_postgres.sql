@@ -0,0 +1,72 @@
+-- Schéma WATT-CHECK pour PostgreSQL, équivalent des migrations SQLite 1 à 9 (wattcheck.migrations).
+-- Appliqué d'un bloc par migrer() sur une base vide ; toute nouvelle migration SQLite doit être reportée ici.
+-- Types alignés sur l'usage SQLite : booléens en INTEGER (0/1), dates en TEXT ISO, montants et kWh en DOUBLE PRECISION.
+
+CREATE TABLE IF NOT EXISTS users (
+    id BIGSERIAL PRIMARY KEY,
+    username TEXT UNIQUE, password TEXT,
+    first_name TEXT, last_name TEXT, phone TEXT, meter_number TEXT,
+    is_pro INTEGER DEFAULT 0, is_admin INTEGER DEFAULT 0,
+    pro_expiration_date TEXT, created_at TEXT);
+CREATE INDEX IF NOT EXISTS idx_users_pro_expiration ON users(is_pro, pro_expiration_date);
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
+
+CREATE TABLE IF NOT EXISTS profils (
+    user_id BIGINT PRIMARY KEY, budget DOUBLE PRECISION, conso_jour DOUBLE PRECISION, label TEXT, config_json TEXT,
+    puissance_w DOUBLE PRECISION DEFAULT 0);
+
+CREATE TABLE IF NOT EXISTS etats_mensuels (user_id BIGINT, mois TEXT, cumul DOUBLE PRECISION, PRIMARY KEY (user_id, mois));
+
+CREATE TABLE IF NOT EXISTS historique (
+    id BIGSERIAL PRIMARY KEY, user_id BIGINT, date TEXT, montant DOUBLE PRECISION, kwh DOUBLE PRECISION,
+    token_ref TEXT, cumul_apres DOUBLE PRECISION, ts BIGINT);
+CREATE INDEX IF NOT EXISTS idx_historique_user_id ON historique(user_id, id);
+-- Ordre de lire_historique (ts DESC NULLS LAST, comme SQLite) : parcours direct de l'index
+CREATE INDEX IF NOT EXISTS idx_historique_user_ts ON historique(user_id, ts DESC NULLS LAST, id DESC);
+
+CREATE TABLE IF NOT EXISTS historique_mensuel (
+    user_id BIGINT NOT NULL, mois TEXT NOT NULL, nb INTEGER NOT NULL, montant DOUBLE PRECISION, kwh DOUBLE PRECISION,
+    premier_ts BIGINT, dernier_ts BIGINT, PRIMARY KEY (user_id, mois));
+
+-- rowid : ordre d'insertion, comme le rowid implicite de SQLite (pagination admin, lots)
+CREATE TABLE IF NOT EXISTS licences (
+    code TEXT PRIMARY KEY, created_by BIGINT, used_by BIGINT, created_at TEXT, used_at TEXT, duree_jours INTEGER DEFAULT 365,
+    lot TEXT, rowid BIGSERIAL UNIQUE);
+CREATE INDEX IF NOT EXISTS idx_licences_used_by ON licences(used_by);
+CREATE INDEX IF NOT EXISTS idx_licences_created_by ON licences(created_by);
+CREATE INDEX IF NOT EXISTS idx_licences_lot ON licences(lot);
+
+CREATE TABLE IF NOT EXISTS api_jetons (
+    empreinte TEXT PRIMARY KEY, user_id BIGINT NOT NULL, libelle TEXT, created_at TEXT, revoque INTEGER DEFAULT 0);
+CREATE INDEX IF NOT EXISTS idx_api_jetons_user ON api_jetons(user_id);
+
+-- Parc d'appareils : totaux de profils tenus par trigger (migration 4)
+CREATE TABLE IF NOT EXISTS appareils (
+    id BIGSERIAL PRIMARY KEY, user_id BIGINT NOT NULL, nom TEXT, watts DOUBLE PRECISION, qty INTEGER, heures DOUBLE PRECISION DEFAULT 5.0);
+CREATE INDEX IF NOT EXISTS idx_appareils_user ON appareils(user_id, id);
+
+CREATE OR REPLACE FUNCTION appareils_totaux() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE profils SET puissance_w = puissance_w - OLD.watts * OLD.qty,
+                           conso_jour = conso_jour - OLD.watts * OLD.qty * OLD.heures / 1000.0
+        WHERE user_id = OLD.user_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO profils (user_id, budget, conso_jour, label, puissance_w) VALUES (NEW.user_id, 0, 0, 'Auto', 0)
+            ON CONFLICT (user_id) DO NOTHING;
+        END IF;
+        UPDATE profils SET puissance_w = COALESCE(puissance_w, 0) + NEW.watts * NEW.qty,
+                           conso_jour = COALESCE(conso_jour, 0) + NEW.watts * NEW.qty * NEW.heures / 1000.0
+        WHERE user_id = NEW.user_id;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appareils_ai ON appareils;
+CREATE TRIGGER appareils_ai AFTER INSERT ON appareils FOR EACH ROW EXECUTE FUNCTION appareils_totaux();
+DROP TRIGGER IF EXISTS appareils_ad ON appareils;
+CREATE TRIGGER appareils_ad AFTER DELETE ON appareils FOR EACH ROW EXECUTE FUNCTION appareils_totaux();
+DROP TRIGGER IF EXISTS appareils_au ON appareils;
+CREATE TRIGGER appareils_au AFTER UPDATE OF watts, qty, heures, user_id ON appareils FOR EACH ROW EXECUTE FUNCTION appareils_totaux();
@@ -0,0 +1,115 @@
+"""Plusieurs serveurs Streamlit pour la même page, derrière un seul port.
+
+Une session Streamlit vit dans le processus qui a ouvert son websocket, avec
+ses fichiers téléversés et ses téléchargements : le proxy doit renvoyer un
+même navigateur vers le même serveur. Ce module lance N serveurs sur des
+ports consécutifs (127.0.0.1), les surveille, et écrit la configuration
+nginx correspondante (upstream ip_hash, websocket /_stcore/stream).
+
+La base est partagée via WATTCHECK_DB : fichier SQLite (verrou de fichier
+d'écriture, un seul processus fait les sauvegardes planifiées) ou URL
+postgresql://. Avec WATTCHECK_METRIQUES, chaque serveur écrit son propre
+fichier (<nom>_<port>.prom) pour le textfile collector.
+
+Usage : python -m wattcheck.serveurs [--processus 4] [--port 8501] [--nginx FICHIER] [--ecoute 80]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from wattcheck.config import METRIQUES_FILE
+
+PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Watt_Check.py")
+DEMARRAGE_MAX = 60  # secondes pour que chaque serveur réponde sur /_stcore/health
+
+
+def config_nginx(ports, ecoute=80):
+    """Bloc nginx (contexte http) : un upstream à affinité par IP et le passage du websocket."""
+    serveurs = "".join(f"    server 127.0.0.1:{p};\n" for p in ports)
+    return f"""upstream wattcheck {{
+    ip_hash;  # un navigateur reste sur le serveur qui tient sa session
+{serveurs}}}
+
+server {{
+    listen {ecoute};
+    client_max_body_size 200m;  # restauration de sauvegarde, imports
+
+    location / {{
+        proxy_pass http://wattcheck;
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    }}
+
+    location /_stcore/stream {{
+        proxy_pass http://wattcheck;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+        proxy_set_header Host $host;
+        proxy_read_timeout 86400;
+    }}
+}}
+"""
+
+
+def _env(port):
+    env = dict(os.environ)
+    if METRIQUES_FILE:
+        racine, ext = os.path.splitext(METRIQUES_FILE)
+        env["WATTCHECK_METRIQUES"] = f"{racine}_{port}{ext or '.prom'}"
+    return env
+
+
+def lancer(ports):
+    """Démarre un serveur Streamlit par port ; retourne les processus."""
+    return [subprocess.Popen([sys.executable, "-m", "streamlit", "run", PAGE, "--server.port", str(p), "--server.address", "127.0.0.1",
+                              "--server.headless", "true", "--browser.gatherUsageStats", "false"], env=_env(p)) for p in ports]
+
+
+def pret(port, timeout=DEMARRAGE_MAX):
+    """Attend que le serveur de `port` réponde « ok » sur /_stcore/health."""
+    fin = time.monotonic() + timeout
+    while time.monotonic() < fin:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2) as r:
+                if r.status == 200: return True
+        except OSError: pass
+        time.sleep(0.5)
+    return False
+
+
+def arreter(procs, delai=10):
+    for p in procs:
+        if p.poll() is None: p.terminate()
+    fin = time.monotonic() + delai
+    for p in procs:
+        try: p.wait(max(0.1, fin - time.monotonic()))
+        except subprocess.TimeoutExpired: p.kill()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m wattcheck.serveurs")
+    ap.add_argument("--processus", type=int, default=4); ap.add_argument("--port", type=int, default=8501, help="premier port, puis les suivants")
+    ap.add_argument("--nginx", help="écrit la configuration nginx dans ce fichier"); ap.add_argument("--ecoute", type=int, default=80, help="port public (nginx)")
+    a = ap.parse_args(argv)
+    ports = list(range(a.port, a.port + a.processus))
+    if a.nginx:
+        with open(a.nginx, "w", encoding="utf-8") as f: f.write(config_nginx(ports, a.ecoute))
+    procs = lancer(ports)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for p in ports:
+            if not pret(p): print(f"serveur {p} : pas de réponse après {DEMARRAGE_MAX} s", file=sys.stderr); return 1
+        print(f"{len(ports)} serveurs prêts sur 127.0.0.1:{ports[0]}-{ports[-1]}" + (f", configuration nginx : {a.nginx}" if a.nginx else ""))
+        # Un serveur qui s'arrête arrête les autres : le superviseur (systemd, docker) relance l'ensemble
+        while all(p.poll() is None for p in procs): time.sleep(1)
+        return max(next(p.returncode for p in procs if p.poll() is not None), 1)  # tué par un signal : code négatif
+    finally: arreter(procs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Simulateur de facture mensuelle à partir de l'inventaire (moteur « what-if » vectorisé)."""
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+from wattcheck.tarifs_batch import calcul_kwh_batch, compiler_tranches, cout_kwh_batch, determiner_cat_batch, indices_cat
+
+
+def get_coeff_simultaneite(p):
+    if p < 3000: return 0.8
+    if p < 6000: return 0.7
+    if p < 12000: return 0.6
+    return 0.5
+
+
+def coeff_simultaneite_batch(p):
+    return np.select([p < 3000, p < 6000, p < 12000], [0.8, 0.7, 0.6], 0.5)
+
+
+def puissances(inventaire):
+    """Puissance installée par ligne d'inventaire (W), p * q."""
+    return np.array([it['p'] * it['q'] for it in inventaire], dtype=np.float64)
+
+
+def simuler(inventaire, heures=None, montants=0.0, cumuls=0.0, ks=None, cats=None, debut=None):
+    """Évalue S scénarios d'un coup ; tous les paramètres se diffusent (broadcast) sur S.
+
+    heures   : (S, A) heures/jour par appareil (défaut : heures de l'inventaire)
+    montants : recharge (FCFA) achetée au début de la simulation
+    cumuls   : kWh déjà consommés dans le mois à `debut`
+    ks       : coefficient de simultanéité (défaut : get_coeff_simultaneite de la puissance installée)
+    cats     : catégorie tarifaire (défaut : determiner_cat sur la conso simulée)
+    debut    : datetime de départ (défaut : maintenant) ; coûts selon la grille en vigueur à cette date
+
+    Retourne un dict de tableaux (S,) : conso_jour, kwh_mois, cout_mois,
+    cout_restant, kwh_recharge, prix, autonomie_jours, coupure_jour (jour
+    du mois, nan si le mois est couvert), puissance_appelee, et
+    franchissements (S, T) : jour du mois où chaque borne de tranche est
+    atteinte (nan sinon).
+    """
+    debut = debut or datetime.now()
+    P = puissances(inventaire)
+    H = np.atleast_2d(np.asarray([it['h'] for it in inventaire] if heures is None else heures, dtype=np.float64))
+    conso = H @ P / 1000 if P.size else np.zeros(H.shape[0])
+    conso, montants, cumuls = np.broadcast_arrays(conso, np.asarray(montants, dtype=np.float64), np.asarray(cumuls, dtype=np.float64))
+    n = conso.shape
+
+    p_inst = P.sum()
+    ks = np.broadcast_to(coeff_simultaneite_batch(p_inst) if ks is None else np.asarray(ks, dtype=np.float64), n)
+    ci = determiner_cat_batch(conso) if cats is None else indices_cat(cats, n)
+
+    jours_mois = calendar.monthrange(debut.year, debut.month)[1]
+    jour = debut.day - 1 + (debut.hour * 60 + debut.minute) / 1440
+    restants = jours_mois - jour
+    kwh_mois = cumuls + conso * restants
+    cout_mois = cout_kwh_batch(kwh_mois, 0.0, ci, debut)
+    cout_restant = cout_kwh_batch(conso * restants, cumuls, ci, debut)
+
+    kwh_recharge, _, prix = calcul_kwh_batch(montants, cumuls, ci, debut)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        autonomie = np.where(conso > 0, kwh_recharge / conso, np.inf)
+        coupure = np.where(autonomie < restants, jour + autonomie + 1, np.nan)
+        _, K, _, _, _ = compiler_tranches(debut)
+        bornes = K[ci][..., 1:]
+        jours_bornes = (bornes - cumuls[..., None]) / conso[..., None]
+        franchis = np.where((bornes > cumuls[..., None]) & (jours_bornes <= restants), jour + jours_bornes + 1, np.nan)
+
+    return {
+        "conso_jour": conso, "kwh_mois": kwh_mois, "cout_mois": cout_mois, "cout_restant": cout_restant,
+        "kwh_recharge": kwh_recharge, "prix": prix, "autonomie_jours": autonomie, "coupure_jour": coupure,
+        "puissance_appelee": p_inst * ks, "franchissements": franchis, "categorie": ci,
+    }
+
+
+def grille_facteurs(inventaire, facteurs, **kw):
+    """Scénarios « toutes les heures × facteur » : une ligne par facteur."""
+    h = np.array([it['h'] for it in inventaire], dtype=np.float64)
+    H = np.clip(np.asarray(facteurs, dtype=np.float64)[:, None] * h[None, :], 0, 24)
+    return simuler(inventaire, heures=H, **kw)
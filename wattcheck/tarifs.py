@@ -0,0 +1,133 @@
+"""Moteur tarifaire ENEO (Decimal). La version vectorisée est dans tarifs_batch.
+
+Les grilles sont datées (entrée en vigueur) et lues une fois dans le fichier
+config.TARIFS_FILE (JSON). Chaque grille est précompilée par catégorie :
+bornes des tranches, coût cumulé TTC à chaque borne et prix unitaire TTC,
+ce qui ramène calcul_kwh à deux recherches dichotomiques.
+"""
+import json
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from types import MappingProxyType
+
+from wattcheck import config
+
+# En dessous de 0.1 FCFA restant, calcul_kwh s'arrête. Decimal(0.1) est la valeur exacte du flottant 0.1
+# (0.1000000000000000055...) auquel l'ancienne boucle comparait : un reliquat de 0.1 tout juste reste sous le seuil
+SEUIL_RELIQUAT = Decimal(0.1)
+SEUILS_CAT = (110, 220, 400)  # kWh / mois, bornes de determiner_cat
+CATEGORIES = ("0-110", "111-220", "221-400", "401+")
+_ZERO = Decimal('0')
+
+Tranche = namedtuple("Tranche", "bi bs px at")  # bornes kWh [bi, bs), prix HT, soumise à TVA
+# Par catégorie : débuts et fins des tranches, coût TTC cumulé à chaque début, prix TTC,
+# nombre de tranches taxées avant chaque tranche (taxees[j + 1] - taxees[i] > 0 : TVA entre i et j)
+Compilee = namedtuple("Compilee", "bornes fins couts prix taxees")
+Grille = namedtuple("Grille", "depuis libelle tva tranches compilees")
+
+
+# --- 1. REGISTRE DES GRILLES ---
+def compiler(tranches, tva):
+    bornes, fins, couts, prix, taxees = [], [], [], [], [0]; cout = Decimal('0')
+    for t in tranches:
+        ck = t.px * (tva if t.at else Decimal('1'))
+        bornes.append(t.bi); fins.append(t.bs); couts.append(cout); prix.append(ck); taxees.append(taxees[-1] + t.at)
+        if not t.bs.is_infinite(): cout += (t.bs - t.bi) * ck
+    return Compilee(tuple(bornes), tuple(fins), tuple(couts), tuple(prix), tuple(taxees))
+
+
+def _grille(brut):
+    depuis = date.fromisoformat(brut["depuis"]); tva = Decimal('1') + Decimal(str(brut["tva"]))
+    tables = {}
+    for cat, lignes in brut["categories"].items():
+        tranches = tuple(Tranche(Decimal(str(bi)), Decimal('Infinity') if bs is None else Decimal(str(bs)), Decimal(str(px)), bool(at))
+                         for bi, bs, px, at in lignes)
+        if not tranches or tranches[0].bi != 0 or not tranches[-1].bs.is_infinite():
+            raise ValueError(f"grille du {depuis}, {cat} : les tranches doivent couvrir [0, ∞[")
+        if any(a.bs != b.bi for a, b in zip(tranches, tranches[1:])) or any(t.bs <= t.bi or t.px <= 0 for t in tranches):
+            raise ValueError(f"grille du {depuis}, {cat} : tranches non contiguës ou prix invalide")
+        tables[cat] = tranches
+    if set(tables) != set(CATEGORIES): raise ValueError(f"grille du {depuis} : catégories attendues {', '.join(CATEGORIES)}")
+    tables = {cat: tables[cat] for cat in CATEGORIES}
+    return Grille(depuis, brut.get("libelle", ""), tva, MappingProxyType(tables),
+                  MappingProxyType({cat: compiler(t, tva) for cat, t in tables.items()}))
+
+
+def _jour(quand):
+    """date, datetime (naïve = heure locale), epoch ou « AAAA-MM-JJ » -> date locale ; None = aujourd'hui."""
+    if quand is None: return datetime.now(config.FUSEAU).date()
+    if isinstance(quand, datetime): return quand.astimezone(config.FUSEAU).date() if quand.tzinfo else quand.date()
+    if isinstance(quand, date): return quand
+    if isinstance(quand, (int, float)): return datetime.fromtimestamp(quand, config.FUSEAU).date()
+    return date.fromisoformat(str(quand)[:10])
+
+
+class RegistreTarifs:
+    """Grilles triées par date d'entrée en vigueur ; grille(quand) par dichotomie."""
+
+    def __init__(self, grilles):
+        self.grilles = tuple(sorted(grilles, key=lambda g: g.depuis))
+        self.dates = tuple(g.depuis for g in self.grilles)
+        # Minuit local de chaque entrée en vigueur, en epoch : recherche sans conversion de fuseau
+        self.debuts = tuple(config.FUSEAU.localize(datetime(d.year, d.month, d.day)).timestamp() for d in self.dates)
+        if not self.grilles: raise ValueError("aucune grille tarifaire")
+        if len(set(self.dates)) != len(self.dates): raise ValueError("deux grilles avec la même date d'entrée en vigueur")
+
+    def grille(self, quand=None):
+        if quand is None or isinstance(quand, (int, float)): i = bisect_right(self.debuts, time.time() if quand is None else quand) - 1
+        else: i = bisect_right(self.dates, _jour(quand)) - 1
+        if i < 0: raise LookupError(f"aucune grille tarifaire en vigueur le {_jour(quand)}")
+        return self.grilles[i]
+
+    @classmethod
+    def depuis_fichier(cls, chemin):
+        with open(chemin, encoding="utf-8") as f: doc = json.load(f)
+        return cls(_grille(g) for g in doc["grilles"])
+
+
+@lru_cache(maxsize=1)
+def registre():
+    """Registre chargé une fois depuis config.TARIFS_FILE (registre.cache_clear() pour relire)."""
+    return RegistreTarifs.depuis_fichier(config.TARIFS_FILE)
+
+
+def grille(quand=None): return registre().grille(quand)
+
+
+def get_tranches_decimal(quand=None):
+    """{catégorie: (Tranche, ...)} de la grille en vigueur à `quand` (lecture seule)."""
+    return grille(quand).tranches
+
+
+def determiner_cat(cj):
+    k = cj * 30
+    if k <= 110: return "0-110"
+    elif k <= 220: return "111-220"
+    elif k <= 400: return "221-400"
+    else: return "401+"
+
+
+# --- 2. CALCUL SCALAIRE (RÉFÉRENCE) ---
+def calcul_kwh(m, c, cat, quand=None):
+    """kWh achetés avec `m` FCFA à partir d'un cumul mensuel de `c` kWh, selon la grille en vigueur à `quand`.
+
+    Retourne (kwh, tva appliquée, prix unitaire TTC de la dernière tranche entamée).
+    Une tranche n'est entamée que s'il reste au moins SEUIL_RELIQUAT FCFA en y entrant.
+    """
+    if m <= 0: return _ZERO, False, _ZERO
+    arg = Decimal(str(m))
+    if arg < SEUIL_RELIQUAT: return _ZERO, False, _ZERO
+    g = grille(quand).compilees[cat]
+    curs = Decimal(str(c)) if c > 0 else _ZERO
+    s = bisect_right(g.bornes, curs) - 1
+    cible = g.couts[s] + (curs - g.bornes[s]) * g.prix[s] + arg
+    e = bisect_right(g.couts, cible) - 1
+    if e > s and cible - g.couts[e] < SEUIL_RELIQUAT: e -= 1  # dernière tranche entamée (comparaison exacte au seuil)
+    if e + 1 < len(g.couts) and cible >= g.couts[e + 1]: k_tot = g.fins[e] - curs  # reliquat < seuil : arrêt en fin de tranche
+    elif e == s: k_tot = arg / g.prix[s]
+    else: k_tot = g.fins[e - 1] - curs + (cible - g.couts[e]) / g.prix[e]
+    return k_tot, g.taxees[e + 1] > g.taxees[s], g.prix[e]
@@ -0,0 +1,103 @@
+"""Moteur tarifaire vectorisé (numpy) : mêmes résultats que calcul_kwh sur des tableaux."""
+from functools import lru_cache
+
+import numpy as np
+
+from wattcheck.tarifs import CATEGORIES, SEUIL_RELIQUAT, SEUILS_CAT, grille, registre
+
+TOLERANCE_KWH = 1e-6  # écart max (kWh) entre calcul_kwh_batch et calcul_kwh
+BRUIT_FCFA = 1e-7  # bruit flottant sur un reliquat ; un reliquat de 0.1 FCFA tout juste reste sous le seuil, comme dans calcul_kwh
+
+
+def compiler_tranches(quand=None):
+    """Tables numpy de la grille en vigueur à `quand` (voir tarifs.grille), par catégorie.
+
+    Retourne (cats, K, CC, CK, NAT) : K[i, j] borne basse de la tranche j,
+    CC[i, j] coût pour aller de 0 à K[i, j], CK[i, j] prix unitaire TTC,
+    NAT[i, j] nombre de tranches taxées avant j. Les tables sont complétées
+    par +inf pour que toutes les catégories aient la même largeur.
+    """
+    return _compiler(registre(), grille(quand).depuis)
+
+
+@lru_cache(maxsize=None)
+def _compiler(reg, depuis):
+    tables = reg.grille(depuis).compilees
+    cats = tuple(tables)
+    n = max(len(t.bornes) for t in tables.values())
+    K = np.full((len(cats), n + 1), np.inf); CC = np.full((len(cats), n + 1), np.inf)
+    CK = np.full((len(cats), n), np.inf); NAT = np.zeros((len(cats), n + 1))
+    for i, cat in enumerate(cats):
+        t = tables[cat]; j = len(t.bornes)
+        K[i, :j] = [float(x) for x in t.bornes]; K[i, j] = float(t.fins[-1])
+        CC[i, :j] = [float(x) for x in t.couts]; CK[i, :j] = [float(x) for x in t.prix]
+        NAT[i, :j + 1] = t.taxees; NAT[i, j + 1:] = t.taxees[-1]
+    for arr in (K, CC, CK, NAT): arr.setflags(write=False)
+    return cats, K, CC, CK, NAT
+
+
+def _pick(a, i): return np.take_along_axis(a, i[..., None], -1)[..., 0]
+
+
+def indices_cat(cats, shape):
+    """Catégorie(s) -> indices de ligne dans compiler_tranches() (noms ou entiers)."""
+    noms = CATEGORIES  # même ordre dans toutes les grilles
+    if isinstance(cats, str): return np.full(shape, noms.index(cats), dtype=np.intp)
+    arr = np.asarray(cats)
+    if arr.dtype.kind in "iu": return np.broadcast_to(arr.astype(np.intp), shape)
+    idx = {nom: i for i, nom in enumerate(noms)}
+    return np.array([idx[x] for x in arr.astype(object).ravel()], dtype=np.intp).reshape(shape)
+
+
+def _cout_cumule(x, k, cc, ck):
+    """Coût TTC pour consommer de 0 à x kWh dans le mois (fonction linéaire par morceaux)."""
+    s = (k[..., 1:] <= x[..., None]).sum(axis=-1)
+    return _pick(cc, s) + (x - _pick(k, s)) * _pick(ck, s), s
+
+
+def determiner_cat_batch(conso_jour):
+    """Version vectorisée de determiner_cat ; retourne des indices utilisables par les fonctions batch."""
+    return np.searchsorted(SEUILS_CAT, np.asarray(conso_jour, dtype=np.float64) * 30, side="left").astype(np.intp)
+
+
+def calcul_kwh_batch(montants, cumuls, cats, quand=None):
+    """Équivalent vectorisé de calcul_kwh sur des tableaux (montant, cumul, catégorie).
+
+    `cats` accepte une catégorie unique, un tableau de noms ou d'indices.
+    `quand` choisit la grille (voir tarifs.grille), une seule pour tout le tableau.
+    Retourne (kwh, tva, prix) en float64/bool. Les kWh concordent avec
+    calcul_kwh à TOLERANCE_KWH près ; tva et prix sont identiques sauf si le
+    reliquat dépasse le seuil de 0.1 FCFA de moins de BRUIT_FCFA.
+    """
+    _, K, CC, CK, NAT = compiler_tranches(quand)
+    m = np.asarray(montants, dtype=np.float64)
+    c = np.clip(np.asarray(cumuls, dtype=np.float64), 0.0, None)
+    m, c = np.broadcast_arrays(m, c)
+    ci = indices_cat(cats, m.shape)
+    k, cc, ck, nat = K[ci], CC[ci], CK[ci], NAT[ci]
+
+    # Tranche de départ s et coût cumulé déjà consommé C(c)
+    cout_c, s = _cout_cumule(c, k, cc, ck)
+    cible = cout_c + m
+
+    # Dernière tranche entamée e : celle où il restait plus de 0.1 FCFA en entrant
+    # (float(SEUIL_RELIQUAT) == 0.1 ; « >= Decimal(0.1) » revient à « > 0.1 » pour des montants décimaux courts)
+    seuil = float(SEUIL_RELIQUAT)
+    e = np.maximum((cc[..., 1:-1] < (cible - seuil - BRUIT_FCFA)[..., None]).sum(axis=-1), s)
+    ck_e = _pick(ck, e)
+    kwh = np.minimum(_pick(k, e) + (cible - _pick(cc, e)) / ck_e, _pick(k, e + 1)) - c
+    tva = (_pick(nat, e + 1) - _pick(nat, s)) > 0
+
+    actif = m > seuil
+    return np.where(actif, kwh, 0.0), actif & tva, np.where(actif, ck_e, 0.0)
+
+
+def cout_kwh_batch(kwh, cumuls, cats, quand=None):
+    """Inverse de calcul_kwh_batch : coût TTC (FCFA) de `kwh` consommés à partir de `cumuls`."""
+    _, K, CC, CK, _ = compiler_tranches(quand)
+    q = np.clip(np.asarray(kwh, dtype=np.float64), 0.0, None)
+    c = np.clip(np.asarray(cumuls, dtype=np.float64), 0.0, None)
+    q, c = np.broadcast_arrays(q, c)
+    ci = indices_cat(cats, q.shape)
+    k, cc, ck = K[ci], CC[ci], CK[ci]
+    return _cout_cumule(c + q, k, cc, ck)[0] - _cout_cumule(c, k, cc, ck)[0]